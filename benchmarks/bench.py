@@ -0,0 +1,681 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Benchmark suite of lambdabio
+
+Time the public functions of calculators, site scanning and protocol
+rendering on deterministic synthetic workloads (random plasmids and
+genomes, sample sheets and all enzyme pairs). Each benchmark runs in a
+child process so that the peak memory (max RSS) is measured per
+benchmark.
+
+Usage:
+    python benchmarks/bench.py [options] [name ...]
+
+    python benchmarks/bench.py --output bench_output.txt
+    python benchmarks/bench.py --rows 1000000 --genome 100000000
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json
+
+The results are written as JSON and compared with the baseline. A
+benchmark which throughput is lower than the baseline by more than the
+tolerance is reported as a regression and the exit status is 1. A
+benchmark which has no baseline is reported as well, thus the baseline
+has to be regenerated when a benchmark is added.
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import os
+import sys
+import json
+import random
+import shutil
+import resource
+import tempfile
+import traceback
+import multiprocessing
+from Queue import Empty
+from timeit import default_timer
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from lambdabio.DNA.ligation import calculator as ligation
+from lambdabio.DNA.ligation import protocol as ligation_protocol
+from lambdabio.DNA.ligation import ends as ligation_ends
+from lambdabio.DNA.ligation import goldengate
+from lambdabio.DNA.gel_extraction import calculator as gel_extraction
+from lambdabio.DNA.restriction_digest import calculator as restriction_digest
+from lambdabio.DNA.restriction_digest import protocol as digest_protocol
+from lambdabio.DNA.restriction_digest import enzyme
+from lambdabio.DNA.restriction_digest.scanner import SiteScanner
+from lambdabio.DNA.restriction_digest.registry import REGISTRY
+from lambdabio.DNA.restriction_digest.incremental import \
+        IncrementalSiteIndex
+from lambdabio.DNA.restriction_digest.digest import virtual_digest, \
+        predict_recovered_weights
+from lambdabio.DNA.restriction_digest.genome import digest_fasta
+from lambdabio.DNA.restriction_digest.bgzf import write_bgzf
+from lambdabio.DNA.restriction_digest.parallel import digest_many
+
+# The seed of synthetic workloads
+SEED = 20110516
+
+# The default tolerance of throughput regression
+DEFAULT_TOLERANCE = 0.3
+
+# The minimum duration of a measurement in [sec]
+MIN_DURATION = 0.2
+
+# The time budgets of benchmarks in [sec] which are checked in addition
+# to the baseline
+BUDGETS = {
+    'startup_list_enzymes': 0.05,
+}
+
+# The interval to check whether the benchmark process is alive in [sec]
+POLL_INTERVAL = 0.5
+
+def random_sequence(size, seed=SEED):
+    """Return deterministic random DNA sequence"""
+    rng = np.random.RandomState(seed)
+    return np.array(list('ACGT'))[rng.randint(0, 4, size)].tostring()
+
+def random_sheet(rows, seed=SEED):
+    """Return deterministic random restriction digest sample sheet"""
+    rng = random.Random(seed)
+    names = [name for name, e in enzyme.AVARIABLE_ENZYME_LIST]
+    lines = ['size,sites,weight,enzyme,enzyme2']
+    for i in xrange(rows):
+        e1, e2 = rng.sample(names, 2)
+        lines.append('%d,%d,%d,%s,%s' % (rng.randint(2000, 10000),
+            rng.randint(1, 5), rng.randint(100, 2000), e1,
+            e2 if rng.random() < 0.5 else ''))
+    return '\n'.join(lines) + '\n'
+
+class Workload(object):
+    """Deterministic synthetic workload"""
+    def __init__(self, rows=1000, plasmid=10000, genome=1000000):
+        self.rows = rows
+        self.plasmid_size = plasmid
+        self.genome_size = genome
+        rng = np.random.RandomState(SEED)
+        self.sizes = rng.randint(2000, 10000, rows)
+        self.inserts = rng.randint(100, 5000, rows)
+        self.sites = rng.randint(1, 10, rows)
+        self.weights = rng.uniform(0.1, 2.0, rows)
+        self.enzymes = [e() for name, e in enzyme.AVARIABLE_ENZYME_LIST]
+
+    @property
+    def plasmid(self):
+        return random_sequence(self.plasmid_size)
+
+    @property
+    def genome(self):
+        return random_sequence(self.genome_size, SEED + 1)
+
+BENCHMARKS = []
+def benchmark(func):
+    """Register benchmark function
+
+    The function is called with workload and returns a tuple of the
+    number of operations and the callable timed. An optional third item
+    is a callable to cleanup.
+    """
+    BENCHMARKS.append(func)
+    return func
+
+def _scalar_benchmark(name, func, arguments):
+    """Register benchmark which calls scalar function for each row
+
+    Args:
+        name - the name of benchmark
+        func - the function benchmarked
+        arguments - the function which returns a list of argument tuples
+            from workload
+    """
+    def bench(w):
+        rows = arguments(w)
+        def run():
+            for args in rows:
+                func(*args)
+        return len(rows), run
+    bench.__name__ = name
+    return benchmark(bench)
+
+def _array_benchmark(name, func, arguments):
+    """Register benchmark which calls vectorized function once"""
+    def bench(w):
+        args = arguments(w)
+        def run():
+            func(*args)
+        return w.rows, run
+    bench.__name__ = name
+    return benchmark(bench)
+
+# ligation
+_scalar_benchmark('ligation_calculate_required_vector_weight',
+    ligation.calculate_required_vector_weight,
+    lambda w: zip(w.sizes.tolist()))
+_scalar_benchmark('ligation_calculate_required_insert_weight',
+    ligation.calculate_required_insert_weight,
+    lambda w: zip((w.weights * 50).tolist(), w.sizes.tolist(),
+                  w.inserts.tolist()))
+_scalar_benchmark('ligation_calculate_required_weights',
+    ligation.calculate_required_weights,
+    lambda w: zip(w.sizes.tolist(), w.inserts.tolist()))
+_array_benchmark('ligation_calculate_required_vector_weight_array',
+    ligation.calculate_required_vector_weight_array,
+    lambda w: (w.sizes,))
+_array_benchmark('ligation_calculate_required_insert_weight_array',
+    ligation.calculate_required_insert_weight_array,
+    lambda w: (w.weights * 50, w.sizes, w.inserts))
+_array_benchmark('ligation_calculate_required_weights_array',
+    ligation.calculate_required_weights_array,
+    lambda w: (w.sizes, w.inserts))
+
+# restriction digest
+_scalar_benchmark('restriction_convert_weight_to_molar',
+    restriction_digest.convert_weight_to_molar,
+    lambda w: zip((w.sizes * 650).tolist(), w.weights.tolist()))
+_scalar_benchmark('restriction_calculate_molecular_weight',
+    restriction_digest.calculate_molecular_weight,
+    lambda w: zip(w.sizes.tolist()))
+_scalar_benchmark('restriction_calculate_site_molar',
+    restriction_digest.calculate_site_molar,
+    lambda w: zip(w.sites.tolist(), w.weights.tolist(), w.sizes.tolist()))
+_scalar_benchmark('restriction_calculate_unit_activity',
+    restriction_digest.calculate_unit_activity,
+    lambda w: [(e,) for e in w.enzymes] * max(w.rows // len(w.enzymes), 1))
+_scalar_benchmark('restriction_calculate_unit_required',
+    restriction_digest.calculate_unit_required,
+    lambda w: [(sites, size, weight, e) for e in w.enzymes
+               for sites, size, weight in zip(w.sites.tolist(),
+                    w.sizes.tolist(), w.weights.tolist())])
+_array_benchmark('restriction_calculate_unit_required_matrix',
+    restriction_digest.calculate_unit_required_matrix,
+    lambda w: (w.sites, w.sizes, w.weights, w.enzymes))
+
+@benchmark
+def restriction_calculate_fragment_molecular_weights(w):
+    sequence = w.genome
+    rng = np.random.RandomState(SEED)
+    # fragments of ~256 bp in average like a 4 bp cutter digest
+    positions = np.sort(rng.randint(0, len(sequence), len(sequence) // 256))
+    def run():
+        restriction_digest.calculate_fragment_molecular_weights(sequence,
+                                                                positions)
+    return len(positions) + 1, run
+
+# gel extraction
+_scalar_benchmark('gel_extraction_find_recovery_on_size',
+    gel_extraction.find_recovery_on_size,
+    lambda w: zip(w.sizes.tolist()))
+_scalar_benchmark('gel_extraction_find_recovery_on_volume',
+    gel_extraction.find_recovery_on_volume,
+    lambda w: zip((w.weights * 100).tolist()))
+_scalar_benchmark('gel_extraction_calculate_prep_weight',
+    gel_extraction.calculate_prep_weight,
+    lambda w: zip(w.weights.tolist(), w.sizes.tolist()))
+_scalar_benchmark('gel_extraction_calculate_last_weight',
+    gel_extraction.calculate_last_weight,
+    lambda w: zip(w.weights.tolist(), w.sizes.tolist()))
+_array_benchmark('gel_extraction_calculate_last_weight_array',
+    gel_extraction.calculate_last_weight,
+    lambda w: (w.weights, w.sizes, w.weights * 100))
+
+@benchmark
+def double_digestion_all_pairs(w):
+    pairs = [(e1, e2) for e1 in w.enzymes for e2 in w.enzymes if e1 is not e2]
+    repeat = max(w.rows // len(pairs), 1)
+    def run():
+        for i in xrange(repeat):
+            for e1, e2 in pairs:
+                enzyme.double_digestion(e1, e2)
+    return repeat * len(pairs), run
+
+@benchmark
+def scanner_scan_plasmid(w):
+    sequence = w.plasmid
+    scanner = SiteScanner()
+    def run():
+        scanner.scan(sequence)
+    return len(sequence), run
+
+@benchmark
+def scanner_scan_plasmid_catalogue(w):
+    # the catalogue has degenerate sites (e.g. BglI and SfiI)
+    sequence = w.plasmid
+    scanner = SiteScanner(REGISTRY.items())
+    def run():
+        scanner.scan(sequence)
+    return len(sequence), run
+
+@benchmark
+def scanner_scan_genome(w):
+    # a few exact sites are located with str.find
+    sequence = w.genome
+    scanner = SiteScanner()
+    def run():
+        scanner.scan(sequence)
+    return len(sequence), run
+
+@benchmark
+def scanner_scan_genome_automaton(w):
+    # the same scan with the automaton for comparison with
+    # scanner_scan_genome
+    from lambdabio.DNA.restriction_digest import scanner as module
+    sequence = w.genome
+    limit, module.MAX_FIND_PATTERNS = module.MAX_FIND_PATTERNS, 0
+    try:
+        scanner = SiteScanner()
+    finally:
+        module.MAX_FIND_PATTERNS = limit
+    def run():
+        scanner.scan(sequence)
+    return len(sequence), run
+
+@benchmark
+def incremental_index_edit_plasmid(w):
+    sequence = w.plasmid
+    index = IncrementalSiteIndex(sequence, circular=True)
+    rng = random.Random(SEED)
+    positions = [rng.randint(0, len(sequence) - 7) for i in xrange(100)]
+    def run():
+        # a point mutation, an insertion and a deletion at each position
+        for position in positions:
+            index.substitute(position, sequence[position])
+            index.insert(position, 'GAATTC')
+            index.delete(position, 6)
+            index.fragment_sizes(['EcoRI', 'PstI'])
+    return 3 * len(positions), run
+
+@benchmark
+def virtual_digest_predict_recovery(w):
+    sequence = w.genome
+    names = [name for name, e in enzyme.AVARIABLE_ENZYME_LIST]
+    def run():
+        fragments = virtual_digest(sequence, names, 'circular')
+        predict_recovered_weights(fragments, 1e-6, 50)
+    return len(sequence), run
+
+@benchmark
+def ligation_find_ligatable_pairs(w):
+    sequence = w.genome
+    names = [name for name, e in enzyme.AVARIABLE_ENZYME_LIST]
+    pieces = ligation_ends.create_pieces('genome', sequence,
+        virtual_digest(sequence, names))
+    def run():
+        pairs = ligation_ends.find_ligatable_pairs(pieces)
+        ligation_ends.calculate_pair_weights(pieces, pairs)
+    return len(pieces), run
+
+@benchmark
+def goldengate_check_fidelity(w):
+    rng = np.random.RandomState(SEED)
+    designs = rng.randint(0, 256, (w.rows, 10))
+    def run():
+        goldengate.check_fidelity(designs)
+    return w.rows, run
+
+@benchmark
+def genome_digest_fasta(w):
+    fd, filename = tempfile.mkstemp(suffix='.fa')
+    with os.fdopen(fd, 'w') as fo:
+        sequence = w.genome
+        fo.write('>chr1\n')
+        for i in xrange(0, len(sequence), 60):
+            fo.write(sequence[i:i+60] + '\n')
+    def run():
+        for record in digest_fasta(filename):
+            pass
+    return w.genome_size, run, lambda: os.remove(filename)
+
+@benchmark
+def genome_digest_bgzf_region(w):
+    # digest the middle tenth of BGZF compressed genome with .fai/.gzi
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'genome.fa.gz')
+    sequence = w.genome
+    header = '>chr1\n'
+    write_bgzf(filename, [header] + [sequence[i:i+60] + '\n'
+                                     for i in xrange(0, len(sequence), 60)])
+    with open(filename + '.fai', 'w') as fo:
+        fo.write('chr1\t%d\t%d\t60\t61\n' % (len(sequence), len(header)))
+    start, end = len(sequence) * 9 // 20, len(sequence) * 11 // 20
+    regions = ['chr1:%d-%d' % (start + 1, end)]
+    def run():
+        for record in digest_fasta(filename, regions=regions):
+            pass
+    return end - start, run, lambda: shutil.rmtree(directory)
+
+@benchmark
+def parallel_digest_many(w):
+    records = [('plasmid%d' % i, random_sequence(w.plasmid_size, SEED + i))
+               for i in xrange(8)]
+    def run():
+        digest_many(records, chunk_size=w.plasmid_size // 2)
+    return w.plasmid_size * len(records), run
+
+@benchmark
+def render_restriction_digest_rst(w):
+    rows = zip(w.sites.tolist(), w.sizes.tolist(), (w.weights * 1000).tolist())
+    e1, e2 = w.enzymes[0], w.enzymes[1]
+    def run():
+        stream = StringIO()
+        for sites, size, weight in rows:
+            digest_protocol._generate_double_digestion_protocol(
+                sites, size, weight, e1, e2, stream=stream)
+    return len(rows), run
+
+@benchmark
+def render_ligation_csv(w):
+    pairs = zip(w.sizes.tolist(), w.inserts.tolist())
+    def run():
+        stream = StringIO()
+        header = True
+        for v, i in pairs:
+            ligation_protocol.generate_protocol(v, i, 'csv', stream, header)
+            header = False
+    return len(pairs), run
+
+@benchmark
+def batch_restriction_digest_sheet(w):
+    sheet = random_sheet(w.rows)
+    def run():
+        digest_protocol.generate_protocols_from_sheet(StringIO(sheet),
+                stream=StringIO(), errors=StringIO())
+    return w.rows, run
+
+@benchmark
+def startup_list_enzymes(w):
+    # the startup of the restriction digest CLI listing enzymes, which
+    # should not import heavy modules (e.g. numpy)
+    import subprocess
+    directory = tempfile.mkdtemp()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    # startup with byte compiled modules as installed packages
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None,
+        (root, env.get('PYTHONPATH'))))
+    env['LAMBDABIO_CACHE_DIRECTORY'] = directory
+    command = [sys.executable, '-m',
+               'lambdabio.DNA.restriction_digest.protocol', 'enzymes']
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(command, stdout=devnull, env=env)
+    # compile modules and write the precompiled cache before timing
+    run()
+    return 1, run, lambda: shutil.rmtree(directory)
+
+def _measure(func, workload, repeat, queue):
+    # put the result or the traceback thus the parent never waits for a
+    # result of the failed benchmark
+    try:
+        result = _run(func, workload, repeat)
+    except BaseException:
+        result = dict(name=func.__name__, error=traceback.format_exc())
+    queue.put(result)
+
+def _run(func, workload, repeat):
+    prepared = func(workload)
+    ops, run = prepared[:2]
+    try:
+        # loop fast benchmarks until the duration is long enough
+        loops = 1
+        while True:
+            start = default_timer()
+            for i in xrange(loops):
+                run()
+            elapsed = default_timer() - start
+            if elapsed >= MIN_DURATION or loops >= 1 << 20:
+                break
+            loops *= 2
+        times = [elapsed]
+        for i in xrange(repeat - 1):
+            start = default_timer()
+            for j in xrange(loops):
+                run()
+            times.append(default_timer() - start)
+    finally:
+        if len(prepared) > 2:
+            # cleanup
+            prepared[2]()
+    best = min(times) / loops
+    return dict(
+        name=func.__name__,
+        ops=ops,
+        loops=loops,
+        seconds=best,
+        throughput=ops / best if best else float('inf'),
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+
+def _wait(process, queue, name):
+    # wait the result while the process is alive. a process which died
+    # without the result (e.g. killed or crashed) is reported as error
+    while True:
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            if process.is_alive():
+                continue
+            try:
+                return queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                return dict(name=name, error="the benchmark process "
+                            "exited with code %s" % process.exitcode)
+
+def run_benchmarks(workload, names=None, repeat=5):
+    """Run benchmarks in child processes
+
+    Args:
+        workload - the instance of Workload
+        names - a list of benchmark names to run. all benchmarks are run
+            when None is specified.
+        repeat - the number of repeat (the best time is used)
+
+    Return:
+        a list of results. the result of failed benchmark has 'name' and
+        'error' (the traceback or the exit code of process) (list)
+    """
+    results = []
+    for func in BENCHMARKS:
+        if names and func.__name__ not in names:
+            continue
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_measure,
+                args=(func, workload, repeat, queue))
+        process.start()
+        result = _wait(process, queue, func.__name__)
+        process.join()
+        results.append(result)
+    return results
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare results with baseline
+
+    Args:
+        results - a list of results
+        baseline - a list of baseline results
+        tolerance - the allowed ratio of throughput decrease
+
+    Return:
+        a tuple of regressions and unmatched. regressions is a list of
+        tuple(name, ratio) of regressed benchmarks where ratio is the
+        throughput relative to baseline and unmatched is a list of names
+        of benchmarks which have no comparable baseline (the baseline is
+        missing or measured with the different number of operations)
+        (tuple(list, list))
+    """
+    baseline = dict((r['name'], r) for r in baseline)
+    regressions = []
+    unmatched = []
+    for result in results:
+        if 'error' in result:
+            # failed benchmarks are reported by the caller
+            continue
+        base = baseline.get(result['name'])
+        if base is None or result['ops'] != base['ops']:
+            unmatched.append(result['name'])
+            continue
+        ratio = result['throughput'] / base['throughput']
+        if ratio < 1 - tolerance:
+            regressions.append((result['name'], ratio))
+    return regressions, unmatched
+
+def main():
+    from optparse import OptionParser
+    parser = OptionParser(usage="%prog [options] [name ...]")
+    parser.add_option('-r', '--rows', dest='rows', type='int', default=1000,
+            help="the number of rows of synthetic sample sheets")
+    parser.add_option('-p', '--plasmid', dest='plasmid', type='int',
+            default=10000, help="the size of synthetic plasmids in [bp]")
+    parser.add_option('-g', '--genome', dest='genome', type='int',
+            default=1000000, help="the size of synthetic genome in [bp]")
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=5,
+            help="the number of repeat of each benchmark")
+    parser.add_option('-o', '--output', dest='output', default=None,
+            help="the file where results are written as JSON")
+    parser.add_option('-b', '--baseline', dest='baseline', default=None,
+            help="the baseline JSON file to compare with")
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float',
+            default=DEFAULT_TOLERANCE,
+            help="the allowed ratio of throughput decrease")
+    parser.add_option('--save-baseline', dest='save_baseline', default=None,
+            help="write results as a new baseline JSON file")
+    parser.add_option('-l', '--list', dest='list', action='store_true',
+            default=False, help="list benchmarks")
+    opts, args = parser.parse_args()
+
+    if opts.list:
+        for func in BENCHMARKS:
+            print func.__name__
+        return
+    workload = Workload(opts.rows, opts.plasmid, opts.genome)
+    results = run_benchmarks(workload, args, opts.repeat)
+    failed = [r for r in results if 'error' in r]
+    for r in results:
+        if 'error' in r:
+            print "%-45s FAILED" % r['name']
+            continue
+        print "%-45s %12d ops %10.4f s %14.1f ops/s %10d KB" % (
+            r['name'], r['ops'], r['seconds'], r['throughput'],
+            r['peak_rss_kb'])
+    for r in failed:
+        sys.stderr.write("FAILED: %s\n%s\n" % (r['name'], r['error']))
+    over = [r for r in results
+            if r['name'] in BUDGETS and 'error' not in r and
+            r['seconds'] > BUDGETS[r['name']]]
+    for r in over:
+        print "OVER BUDGET: %s %.4f s > %.4f s" % (r['name'], r['seconds'],
+                                                   BUDGETS[r['name']])
+    report = dict(
+        workload=dict(rows=opts.rows, plasmid=opts.plasmid,
+                      genome=opts.genome, repeat=opts.repeat),
+        results=results,
+    )
+    if failed and opts.save_baseline:
+        sys.stderr.write("The baseline is not saved because of the failed "
+                         "benchmarks.\n")
+        opts.save_baseline = None
+    for filename in (opts.output, opts.save_baseline):
+        if filename:
+            with open(filename, 'w') as fo:
+                json.dump(report, fo, indent=2, sort_keys=True,
+                          separators=(',', ': '))
+    if opts.baseline:
+        with open(opts.baseline) as fi:
+            baseline = json.load(fi)['results']
+        regressions, unmatched = compare(results, baseline, opts.tolerance)
+        for name, ratio in regressions:
+            print "REGRESSION: %s %.1f%% of baseline" % (name, ratio * 100)
+        for name in unmatched:
+            print "NO BASELINE: %s (regenerate with --save-baseline)" % name
+        if regressions or unmatched:
+            sys.exit(1)
+    if failed or over:
+        sys.exit(1)
+
+# --- unittest
+import unittest
+class TestCase(unittest.TestCase):
+    def test_random_sequence(self):
+        self.assertEquals(random_sequence(100), random_sequence(100))
+        self.assertEquals(len(random_sequence(100)), 100)
+        self.assertEquals(set(random_sequence(1000)), set('ACGT'))
+    def test_random_sheet(self):
+        sheet = random_sheet(10)
+        self.assertEquals(sheet, random_sheet(10))
+        self.assertEquals(len(sheet.splitlines()), 11)
+    def test_compare(self):
+        baseline = [dict(name='a', ops=10, throughput=100.0),
+                    dict(name='b', ops=10, throughput=100.0),
+                    dict(name='c', ops=20, throughput=100.0)]
+        results = [dict(name='a', ops=10, throughput=90.0),
+                   dict(name='b', ops=10, throughput=50.0),
+                   dict(name='c', ops=10, throughput=10.0)]
+        results.append(dict(name='d', ops=10, throughput=10.0))
+        self.assertEquals(compare(results, baseline, 0.25),
+                          ([('b', 0.5)], ['c', 'd']))
+    def test_baseline(self):
+        # every benchmark has to be recorded in the shipped baseline
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+        with open(filename) as fi:
+            names = [r['name'] for r in json.load(fi)['results']]
+        self.assertEquals(names, [func.__name__ for func in BENCHMARKS])
+    def test_run_benchmarks(self):
+        global MIN_DURATION
+        duration, MIN_DURATION = MIN_DURATION, 0
+        try:
+            workload = Workload(rows=10, plasmid=100, genome=1000)
+            results = run_benchmarks(workload, repeat=1)
+        finally:
+            MIN_DURATION = duration
+        self.assertEquals([r['name'] for r in results],
+                          [func.__name__ for func in BENCHMARKS])
+    def test_failed_benchmark(self):
+        def broken(w):
+            raise RuntimeError("broken benchmark")
+        def crashed(w):
+            os._exit(3)
+        workload = Workload(rows=10, plasmid=100, genome=1000)
+        BENCHMARKS.extend((broken, crashed))
+        try:
+            results = run_benchmarks(workload, ['broken', 'crashed'], 1)
+        finally:
+            del BENCHMARKS[-2:]
+        self.assertEquals([r['name'] for r in results],
+                          ['broken', 'crashed'])
+        self.assertTrue('RuntimeError: broken benchmark' in
+                        results[0]['error'])
+        self.assertTrue('exited with code 3' in results[1]['error'])
+        self.assertEquals(compare(results, []), ([], []))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['test']:
+        del sys.argv[1]
+        unittest.main()
+    else:
+        main()
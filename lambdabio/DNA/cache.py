@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Calculation cache module
+
+An opt-in memoizing cache shared by the calculators. Functions decorated
+with memoize call through when the cache is disabled (the default).
+When enabled with enable_cache, the results are stored in a bounded
+LRU cache keyed by the function and the arguments, where enzymes are
+identified by their name, site and unit data (substrate, concentration
+and so on) and numbers are normalized to float. An optional on-disk tier
+(shelve) keeps the results between invocations.
+
+The key of a function has the digest of its byte code thus results of an
+outdated formula are never returned. The on-disk tier is discarded when
+CACHE_VERSION is changed. numpy arrays are copied when they are stored
+and returned so that callers could not modify cached results.
+
+    enable_cache(maxsize=10000, filename='~/.lambdabio/cache')
+    calculate_unit_required(1, 3000, 0.5, EcoRI())
+    print get_cache().stats()
+
+Command line interfaces enable the on-disk tier with the --cache option
+(see add_cache_options and caching).
+
+Methods:
+    memoize - Decorate function to use the calculation cache
+    enable_cache - Enable the calculation cache
+    disable_cache - Disable the calculation cache
+    get_cache - Return the calculation cache in use
+    add_cache_options - Add --cache option to OptionParser
+    caching - Context manager which enables the cache of options
+
+Classes:
+    CalculationCache - Bounded LRU cache with optional on-disk tier
+
+Data:
+    CACHE_VERSION - the version of cached results
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import os
+import sys
+import hashlib
+from functools import wraps
+from collections import OrderedDict
+from contextlib import contextmanager
+
+CACHE_VERSION = 3
+"""The version of cached results (increment it to discard the on-disk
+tier, e.g. when the layout of keys is changed)"""
+
+# The default number of results kept in memory
+DEFAULT_MAXSIZE = 4096
+
+# The key where CACHE_VERSION is stored in the on-disk tier
+VERSION_KEY = '__version__'
+
+# The fields of enzyme which results depend on
+ENZYME_FIELDS = ('site', 'substrate', 'temperature', 'heat_inactivate',
+                 'concentration', 'buffer')
+
+def _make_key(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, long, float)):
+        # 1 and 1.0 might lead to the different results
+        return (type(value).__name__, value)
+    if isinstance(value, basestring):
+        return value
+    if isinstance(value, (tuple, list)):
+        return tuple(_make_key(v) for v in value)
+    if isinstance(value, dict):
+        # e.g. substrate of hand written enzyme (Attrdict)
+        return tuple(sorted((k, _make_key(v)) for k, v in value.iteritems()))
+    if hasattr(value, 'site'):
+        # enzyme is identified by the name, site and unit data
+        return ('enzyme', str(value)) + tuple(
+            _make_key(getattr(value, field, None))
+            for field in ENZYME_FIELDS)
+    if hasattr(value, '__slots__'):
+        # e.g. substrate of enzyme record in registry
+        return tuple(sorted((k, _make_key(getattr(value, k)))
+                            for k in value.__slots__))
+    raise TypeError("Unhashable argument for cache: %r" % (value,))
+
+def _update_digest(digest, code):
+    # nested code objects are digested recursively since their repr
+    # contains the address
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _update_digest(digest, const)
+        else:
+            digest.update(repr(const))
+
+def _iter_names(code):
+    for name in code.co_names:
+        yield name
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            for name in _iter_names(const):
+                yield name
+
+_VALUE_TYPES = (bool, int, long, float, basestring, tuple, list, dict,
+                frozenset, type(None))
+
+def _update_value_digest(digest, value, seen):
+    if hasattr(value, '__code__'):
+        _update_function_digest(digest, value, seen)
+    elif isinstance(value, _VALUE_TYPES):
+        try:
+            digest.update(repr(_make_key(value)))
+        except TypeError:
+            digest.update(type(value).__name__)
+    else:
+        # modules, classes and instances are identified by the type
+        digest.update(type(value).__name__)
+
+def _update_function_digest(digest, func, seen):
+    # the bytecode, the values of referenced globals (e.g. constants) and
+    # the functions called (recursively) and wrapped (closures) are
+    # digested, thus a change of them leads to a new key
+    if func in seen:
+        return
+    seen.add(func)
+    code = func.__code__
+    _update_digest(digest, code)
+    namespace = func.__globals__
+    for name in sorted(set(_iter_names(code))):
+        if name in namespace:
+            digest.update(name)
+            _update_value_digest(digest, namespace[name], seen)
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # empty cell
+            continue
+        _update_value_digest(digest, value, seen)
+
+def _get_function_key(func):
+    digest = hashlib.sha1()
+    _update_function_digest(digest, func, set())
+    return '%s.%s:%s' % (func.__module__, func.__name__,
+                         digest.hexdigest()[:16])
+
+def _copy(value):
+    # numpy is not imported here. an array could not be returned unless
+    # numpy is imported already
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        return value.copy()
+    return value
+
+class CalculationCache(object):
+    """Bounded LRU cache with optional on-disk tier"""
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, filename=None):
+        """Construct cache
+
+        Args:
+            maxsize - the maximum number of results kept in memory
+            filename - the path of on-disk tier (shelve). no on-disk tier
+                is used when None is specified.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self.hits = self.misses = self.disk_hits = 0
+        self._data = OrderedDict()
+        self._disk = None
+        if filename:
+            import shelve
+            filename = os.path.expanduser(filename)
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._disk = shelve.open(filename, protocol=2)
+            if self._disk.get(VERSION_KEY) != CACHE_VERSION:
+                # results of the other version are discarded (the 'n'
+                # flag is ignored by dumbdbm)
+                self._disk.clear()
+                self._disk[VERSION_KEY] = CACHE_VERSION
+
+    def get(self, key, default=None):
+        """Return cached result of key and count a hit or miss"""
+        data = self._data
+        if key in data:
+            # move the key to the most recently used end
+            value = data.pop(key)
+            data[key] = value
+            self.hits += 1
+            return _copy(value)
+        if self._disk is not None:
+            disk_key = repr(key)
+            if disk_key in self._disk:
+                value = self._disk[disk_key]
+                self._store(key, value)
+                self.disk_hits += 1
+                return _copy(value)
+        self.misses += 1
+        return default
+
+    def _store(self, key, value):
+        data = self._data
+        data[key] = value
+        if len(data) > self.maxsize:
+            # evict the least recently used
+            data.popitem(last=False)
+
+    def set(self, key, value):
+        """Store the result of key"""
+        value = _copy(value)
+        self._store(key, value)
+        if self._disk is not None:
+            self._disk[repr(key)] = value
+
+    def clear(self):
+        """Clear results in memory and statistics"""
+        self._data.clear()
+        self.hits = self.misses = self.disk_hits = 0
+
+    def close(self):
+        """Close the on-disk tier"""
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def stats(self):
+        """Return a dictionary of hit/miss statistics"""
+        return dict(hits=self.hits, misses=self.misses,
+                    disk_hits=self.disk_hits, size=len(self._data),
+                    maxsize=self.maxsize)
+
+    def __len__(self):
+        return len(self._data)
+
+_cache = None
+_missing = object()
+
+def memoize(func):
+    """Decorate function to use the calculation cache when enabled"""
+    # the key of function is made on the first use because the globals it
+    # refers might not be defined yet
+    names = []
+    @wraps(func)
+    def inner(*args, **kwargs):
+        cache = _cache
+        if cache is None:
+            return func(*args, **kwargs)
+        if not names:
+            names.append(_get_function_key(func))
+        try:
+            key = (names[0], _make_key(args),
+                   _make_key(sorted(kwargs.items())))
+        except TypeError:
+            # e.g. numpy arrays could not be a key
+            return func(*args, **kwargs)
+        value = cache.get(key, _missing)
+        if value is _missing:
+            value = func(*args, **kwargs)
+            cache.set(key, value)
+        return value
+    return inner
+
+def enable_cache(maxsize=DEFAULT_MAXSIZE, filename=None):
+    """Enable the calculation cache
+
+    Args:
+        maxsize - the maximum number of results kept in memory
+        filename - the path of on-disk tier (shelve)
+
+    Return:
+        the instance of CalculationCache
+    """
+    global _cache
+    disable_cache()
+    _cache = CalculationCache(maxsize, filename)
+    return _cache
+
+def disable_cache():
+    """Disable the calculation cache (the on-disk tier is closed)"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+def get_cache():
+    """Return the calculation cache in use or None when disabled"""
+    return _cache
+
+def add_cache_options(parser):
+    """Add --cache option to OptionParser"""
+    parser.add_option('--cache', dest='cache', default=None,
+            metavar='FILE',
+            help="keep calculation results in the file (shelve) thus "
+                 "the results are reused by the next invocation")
+
+@contextmanager
+def caching(opts):
+    """Context manager which enables the cache of command line interfaces
+
+    Args:
+        opts - the options parsed with add_cache_options
+
+    Yield:
+        the instance of CalculationCache or None when --cache is not
+        specified
+    """
+    if not opts.cache:
+        yield None
+        return
+    cache = enable_cache(filename=opts.cache)
+    try:
+        yield cache
+    finally:
+        disable_cache()
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def tearDown(self):
+            disable_cache()
+        def test_calculation_cache(self):
+            cache = CalculationCache(maxsize=2)
+            cache.set('a', 1)
+            cache.set('b', 2)
+            self.assertEquals(cache.get('a'), 1)
+            cache.set('c', 3)
+            # 'b' is the least recently used
+            self.assertEquals(cache.get('b'), None)
+            self.assertEquals(cache.get('c'), 3)
+            self.assertEquals(cache.stats(), dict(hits=2, misses=1, disk_hits=0,
+                                                  size=2, maxsize=2))
+        def test_memoize(self):
+            calls = []
+            @memoize
+            def add(a, b):
+                calls.append((a, b))
+                return a + b
+            self.assertEquals(add(1, 2), 3)
+            self.assertEquals(add(1, 2), 3)
+            self.assertEquals(len(calls), 2)
+            cache = enable_cache()
+            self.assertEquals(add(1, 2), 3)
+            self.assertEquals(add(1, 2), 3)
+            # 1.0 is not 1
+            self.assertEquals(add(1.0, 2), 3)
+            self.assertEquals(add(b=2, a=1), 3)
+            self.assertEquals(len(calls), 5)
+            self.assertEquals(cache.hits, 1)
+            self.assertEquals(cache.misses, 3)
+        def test_make_key(self):
+            from lambdabio.DNA.restriction_digest.enzyme import EcoRI
+            from lambdabio.DNA.restriction_digest.registry import \
+                    EnzymeRecord, Substrate, HeatInactivate
+            def create(concentration):
+                e = EcoRI()
+                return EnzymeRecord(e.name, str(e), e.site,
+                    Substrate('lambda', 48502, 5), e.temperature,
+                    HeatInactivate(60, 15), concentration, e.buffer)
+            # the same unit data is the same key
+            self.assertEquals(_make_key(create(14)), _make_key(EcoRI()))
+            self.assertNotEquals(_make_key(create(20)), _make_key(EcoRI()))
+        def test_function_key(self):
+            def f(x):
+                return x * 2
+            key = _get_function_key(f)
+            def f(x):
+                return x * 2
+            self.assertEquals(_get_function_key(f), key)
+            def f(x):
+                return x * 3
+            self.assertNotEquals(_get_function_key(f), key)
+            self.assertNotEquals(_make_key((1, 2)), _make_key((1.0, 2)))
+        def test_function_key_dependencies(self):
+            global FACTOR, scale
+            def f(x):
+                return scale(x) + FACTOR
+            FACTOR = 1
+            scale = lambda x: x * 2
+            key = _get_function_key(f)
+            self.assertEquals(_get_function_key(f), key)
+            # the referenced constant is changed
+            FACTOR = 2
+            self.assertNotEquals(_get_function_key(f), key)
+            FACTOR = 1
+            # the called function is changed
+            scale = lambda x: x * 3
+            self.assertNotEquals(_get_function_key(f), key)
+            scale = lambda x: x * 2
+            self.assertEquals(_get_function_key(f), key)
+            # the decorated function is digested through the closure
+            self.assertNotEquals(_get_function_key(memoize(f)),
+                                 _get_function_key(memoize(scale)))
+        def test_memoize_array(self):
+            import numpy as np
+            @memoize
+            def zeros(n):
+                return np.zeros(n)
+            enable_cache()
+            a = zeros(3)
+            a[0] = 1
+            self.assertEquals(list(zeros(3)), [0, 0, 0])
+            b = zeros(3)
+            b[1] = 1
+            self.assertEquals(list(zeros(3)), [0, 0, 0])
+        def test_memoize_enzyme(self):
+            from lambdabio.DNA.restriction_digest.enzyme import EcoRI, PstI
+            @memoize
+            def name(enzyme):
+                return str(enzyme)
+            cache = enable_cache()
+            self.assertEquals(name(EcoRI()), 'EcoR I')
+            self.assertEquals(name(PstI()), 'Pst I')
+            self.assertEquals(name(EcoRI()), 'EcoR I')
+            self.assertEquals(cache.stats()['hits'], 1)
+        def test_on_disk_tier(self):
+            import shutil
+            import tempfile
+            directory = tempfile.mkdtemp()
+            try:
+                filename = os.path.join(directory, 'cache')
+                @memoize
+                def square(x):
+                    return x * x
+                enable_cache(filename=filename)
+                self.assertEquals(square(3), 9)
+                cache = enable_cache(filename=filename)
+                self.assertEquals(square(3), 9)
+                self.assertEquals(cache.disk_hits, 1)
+                self.assertEquals(cache.misses, 0)
+                # the results of the other version are discarded
+                global CACHE_VERSION
+                version = CACHE_VERSION
+                CACHE_VERSION = -1
+                try:
+                    cache = enable_cache(filename=filename)
+                    self.assertEquals(square(3), 9)
+                    self.assertEquals(cache.disk_hits, 0)
+                finally:
+                    CACHE_VERSION = version
+            finally:
+                disable_cache()
+                shutil.rmtree(directory)
+        def test_caching(self):
+            import shutil
+            import tempfile
+            from optparse import OptionParser
+            directory = tempfile.mkdtemp()
+            try:
+                parser = OptionParser()
+                add_cache_options(parser)
+                opts, args = parser.parse_args([])
+                with caching(opts) as cache:
+                    self.assertEquals(cache, None)
+                filename = os.path.join(directory, 'cache')
+                opts, args = parser.parse_args(['--cache', filename])
+                @memoize
+                def square(x):
+                    return x * x
+                with caching(opts) as cache:
+                    self.assertTrue(get_cache() is cache)
+                    square(3)
+                self.assertEquals(get_cache(), None)
+                with caching(opts) as cache:
+                    square(3)
+                    self.assertEquals(cache.disk_hits, 1)
+            finally:
+                shutil.rmtree(directory)
+        def test_calculators(self):
+            # the calculators refer the package module even if this module is
+            # executed as a script
+            from lambdabio.DNA import cache as module
+            from lambdabio.DNA.restriction_digest import calculator, enzyme
+            from lambdabio.DNA.ligation.calculator import \
+                    calculate_required_weights
+            from lambdabio.DNA.gel_extraction.calculator import \
+                    calculate_prep_weight
+            cache = module.enable_cache()
+            try:
+                for i in xrange(3):
+                    calculator.calculate_unit_required(1, 3000, 0.5,
+                                                       enzyme.EcoRI())
+                    calculate_required_weights(2700, 500)
+                    calculate_prep_weight(1.0, 1000)
+                self.assertEquals(cache.misses, 3)
+                self.assertEquals(cache.hits, 6)
+            finally:
+                module.disable_cache()
+
+    unittest.main()
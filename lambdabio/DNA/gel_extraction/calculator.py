@@ -32,6 +32,11 @@ __author__  = 'Alisue <lambdalisue@hashnote.net>'
 __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
+from bisect import bisect_left
+from numbers import Number
+from lambdabio.DNA.cache import memoize
+from lambdabio.DNA.instrument import instrument
+
 #
 # Recovery Tables below is for Promega Wizard SV Gel and PCR Clean-Up system
 # Ref: http://www.promega.co.jp/Cre_Html.php?pGMPID=0504003
@@ -56,52 +61,171 @@ RECOVERY_ON_VOLUME_TABLE = (
     (100,   1.00),
 )
 
-def _find(value, table):
-    if value < table[0][0]:
-        return table[0][1]
-    elif value > table[-1][0]:
-        return table[-1][1]
+_COMPILED_TABLES = {}
+def _compile(table):
+    # cache keys and values of the table as tuples
+    compiled = _COMPILED_TABLES.get(id(table))
+    if compiled is None:
+        compiled = (tuple(k for k, v in table), tuple(v for k, v in table))
+        _COMPILED_TABLES[id(table)] = compiled
+    return compiled
+
+_COMPILED_ARRAYS = {}
+def _compile_array(table):
+    # cache keys and values of the table as numpy arrays (numpy is
+    # imported only when arrays are used)
+    import numpy as np
+    compiled = _COMPILED_ARRAYS.get(id(table))
+    if compiled is None:
+        compiled = tuple(np.array(x, dtype=np.float64)
+                         for x in _compile(table))
+        _COMPILED_ARRAYS[id(table)] = compiled
+    return compiled
+
+def _find(value, table, interpolate=False):
+    keys, values = _compile(table)
+    if value < keys[0]:
+        return values[0]
+    elif value > keys[-1]:
+        return values[-1]
+    i = bisect_left(keys, value)
+    if keys[i] == value:
+        return values[i]
+    lhs = keys[i-1]
+    rhs = keys[i]
+    if interpolate:
+        return values[i-1] + (values[i] - values[i-1]) * \
+            (value - lhs) / float(rhs - lhs)
+    elif value - lhs < rhs - value:
+        return values[i-1]
     else:
-        for i in xrange(len(table)-1):
-            lhs = table[i][0]
-            rhs = table[i+1][0]
-            if lhs <= value <= rhs:
-                if value - lhs < rhs - value:
-                    return table[i][1]
-                else:
-                    return table[i+1][1]
-
-def find_recovery_on_size(size):
-    """Find recovery depend on size"""
-    return _find(size, RECOVERY_ON_SIZE_TABLE)
-def find_recovery_on_volume(volume):
-    """Find recovery depend on volume"""
-    return _find(volume, RECOVERY_ON_VOLUME_TABLE)
-
-def calculate_prep_weight(weight, size):
+        return values[i]
+
+def _find_array(value, table, interpolate=False):
+    import numpy as np
+    keys, values = _compile_array(table)
+    value = np.asarray(value, dtype=np.float64)
+    if interpolate:
+        return np.interp(value, keys, values)
+    i = np.clip(np.searchsorted(keys, value), 1, len(keys) - 1)
+    lhs = keys[i-1]
+    rhs = keys[i]
+    found = np.where(value - lhs < rhs - value, values[i-1], values[i])
+    found = np.where(value < keys[0], values[0], found)
+    return np.where(value > keys[-1], values[-1], found)
+
+@instrument('recovery_lookup')
+def find_recovery_on_size(size, interpolate=False):
+    """Find recovery depend on size
+
+    Args:
+        size - the size of DNA in bp (number or array like)
+        interpolate - linearly interpolate the table instead of using
+            the nearest neighbour
+
+    Return:
+        a recovery (float or numpy.ndarray)
+    """
+    if isinstance(size, Number):
+        return _find(size, RECOVERY_ON_SIZE_TABLE, interpolate)
+    return _find_array(size, RECOVERY_ON_SIZE_TABLE, interpolate)
+@instrument('recovery_lookup')
+def find_recovery_on_volume(volume, interpolate=False):
+    """Find recovery depend on volume
+
+    Args:
+        volume - the volume of Gel Extraction Mix solution (number or
+            array like)
+        interpolate - linearly interpolate the table instead of using
+            the nearest neighbour
+
+    Return:
+        a recovery (float or numpy.ndarray)
+    """
+    if volume is None or isinstance(volume, Number):
+        return _find(volume, RECOVERY_ON_VOLUME_TABLE, interpolate)
+    return _find_array(volume, RECOVERY_ON_VOLUME_TABLE, interpolate)
+
+@memoize
+def calculate_prep_weight(weight, size, interpolate=False):
     """Calculate prep weight before Gel Extraction
 
     Args:
         weight - the desired weight of DNA in [g]
         size - the size of DNA in bp
+        interpolate - linearly interpolate the recovery table
 
     Return:
-        a prep weight of DNA in [g] (float)
+        a prep weight of DNA in [g] (float or numpy.ndarray when size is
+        an array)
     """
-    r = find_recovery_on_size(size)
+    r = find_recovery_on_size(size, interpolate)
     return weight / r
 
-def calculate_last_weight(weight, size, volume=None):
+def calculate_last_weight(weight, size, volume=None, interpolate=False):
     """Calculate last weight after Gel Extraction
 
     Args:
         weight - the weight of DNA in [g]
         size - the size of DNA in bp
         volume - the volume of Gel Extraction Mix solution
+        interpolate - linearly interpolate the recovery tables
 
     Return:
-        a last weight of DNA in [g] (float)
+        a last weight of DNA in [g] (float or numpy.ndarray when size or
+        volume is an array)
     """
-    size_r = find_recovery_on_size(size)
-    volume_r = find_recovery_on_volume(volume)
+    size_r = find_recovery_on_size(size, interpolate)
+    volume_r = find_recovery_on_volume(volume, interpolate)
     return weight * size_r * volume_r
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    class TestCase(unittest.TestCase):
+        def _find_linear(self, value, table):
+            # the original linear search
+            if value < table[0][0]:
+                return table[0][1]
+            elif value > table[-1][0]:
+                return table[-1][1]
+            for i in xrange(len(table)-1):
+                lhs = table[i][0]
+                rhs = table[i+1][0]
+                if lhs <= value <= rhs:
+                    if value - lhs < rhs - value:
+                        return table[i][1]
+                    else:
+                        return table[i+1][1]
+        def test_find_recovery_on_size(self):
+            sizes = range(0, 30000, 7) + [k for k, v in RECOVERY_ON_SIZE_TABLE]
+            sizes += [77.5, 300, 2099.5]
+            recoveries = find_recovery_on_size(sizes)
+            for size, recovery in zip(sizes, recoveries):
+                expected = self._find_linear(size, RECOVERY_ON_SIZE_TABLE)
+                self.assertEquals(find_recovery_on_size(size), expected)
+                self.assertEquals(recovery, expected)
+        def test_find_recovery_on_volume(self):
+            volumes = range(0, 120)
+            recoveries = find_recovery_on_volume(volumes)
+            for volume, recovery in zip(volumes, recoveries):
+                expected = self._find_linear(volume, RECOVERY_ON_VOLUME_TABLE)
+                self.assertEquals(find_recovery_on_volume(volume), expected)
+                self.assertEquals(recovery, expected)
+            self.assertEquals(find_recovery_on_volume(None), 0.35)
+        def test_interpolate(self):
+            self.assertAlmostEquals(find_recovery_on_size(300, True), 0.865)
+            self.assertAlmostEquals(find_recovery_on_size(10, True), 0.26)
+            recoveries = find_recovery_on_size([300, 10, 30000], True)
+            self.assertTrue(np.allclose(recoveries, [0.865, 0.26, 0.47]))
+        def test_calculate_prep_weight(self):
+            weights = calculate_prep_weight(1.0, [55, 1000])
+            self.assertTrue(np.allclose(weights, [1 / 0.26, 1 / 0.92]))
+        def test_calculate_last_weight(self):
+            weight = calculate_last_weight(1.0, 1000, 50)
+            self.assertAlmostEquals(weight, 0.92)
+            weights = calculate_last_weight(1.0, [55, 1000], [10, 50])
+            self.assertTrue(np.allclose(weights, [0.26 * 0.35, 0.92]))
+
+    unittest.main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Instrumentation module
+
+Lightweight per-stage timers, call counters and peak memory samples of
+hot paths (input parsing, unit calculation, buffer selection, recovery
+lookup and rendering). Instrumentation is disabled by default and
+costs nothing in that case; functions decorated with instrument are
+left untouched and replaced with measuring wrappers in the loaded
+lambdabio modules only while the instrumentation is enabled.
+
+    profiler = enable_profile()
+    generate_protocols_from_sheet(open_sheet('plate.csv'))
+    profiler.write_report(sys.stderr)
+
+The protocol command line interfaces have --profile option (see
+add_profile_options and profiling).
+
+Methods:
+    instrument - Decorate function to be measured as a stage
+    stage - Return context manager which measures a block as a stage
+    count - Increment a counter
+    enable_profile - Enable the instrumentation
+    disable_profile - Disable the instrumentation
+    get_profiler - Return the profiler in use
+    add_profile_options - Add --profile options to OptionParser
+    profiling - Context manager which profiles command line interfaces
+
+Classes:
+    Profiler - Collect stage timers, counters and peak memory samples
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import sys
+import resource
+from functools import wraps
+from timeit import default_timer
+from collections import OrderedDict
+from contextlib import contextmanager
+
+def _peak_memory():
+    # the maximum resident set size in [KB] (linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class Profiler(object):
+    """Collect stage timers, counters and peak memory samples"""
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self.started = default_timer()
+        self._active = set()
+
+    def add(self, name, elapsed):
+        """Add elapsed time in [sec] of a call of stage"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = dict(calls=0, seconds=0.0,
+                                             peak_memory=0)
+        stage['calls'] += 1
+        stage['seconds'] += elapsed
+        stage['peak_memory'] = max(stage['peak_memory'], _peak_memory())
+
+    def count(self, name, n=1):
+        """Increment a counter"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def measure(self, name, func, *args, **kwargs):
+        """Call function and add the elapsed time to stage
+
+        Nested calls of the same stage (e.g. recursion) are measured
+        only once by the outermost call.
+        """
+        if name in self._active:
+            return func(*args, **kwargs)
+        self._active.add(name)
+        start = default_timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.add(name, default_timer() - start)
+            self._active.discard(name)
+
+    def report(self):
+        """Return a dictionary of stages, counters and peak memory"""
+        return OrderedDict((
+            ('seconds', default_timer() - self.started),
+            ('peak_memory', _peak_memory()),
+            ('stages', self.stages),
+            ('counters', self.counters),
+        ))
+
+    def write_report(self, stream):
+        """Write a per-stage breakdown as a table"""
+        report = self.report()
+        total = report['seconds']
+        stream.write("%-20s %10s %12s %7s %12s\n" % (
+            'stage', 'calls', 'time [s]', '%', 'peak [KB]'))
+        for name, stage in report['stages'].iteritems():
+            stream.write("%-20s %10d %12.6f %7.2f %12d\n" % (
+                name, stage['calls'], stage['seconds'],
+                stage['seconds'] / total * 100 if total else 0,
+                stage['peak_memory']))
+        stream.write("%-20s %10s %12.6f %7.2f %12d\n" % (
+            'total', '', total, 100, report['peak_memory']))
+        for name, value in report['counters'].iteritems():
+            stream.write("%-20s %10d\n" % (name, value))
+
+    def write_json(self, stream):
+        """Write the report as JSON"""
+        import json
+        json.dump(self.report(), stream, indent=2, separators=(',', ': '))
+        stream.write('\n')
+
+_profiler = None
+_instrumented = []
+_patched = []
+
+def instrument(name):
+    """Register function to be measured as a stage when enabled
+
+    The function is returned as it is thus it costs nothing while the
+    instrumentation is disabled.
+    """
+    def decorator(func):
+        _instrumented.append((name, func))
+        return func
+    return decorator
+
+def _wrap(name, func, profiler):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        return profiler.measure(name, func, *args, **kwargs)
+    return inner
+
+def _patch(profiler):
+    # replace instrumented functions referred from lambdabio modules
+    # (including the module executed as a script) with wrappers
+    wrappers = dict((id(func), _wrap(name, func, profiler))
+                    for name, func in _instrumented)
+    for modname, module in sys.modules.items():
+        if module is None or not (modname == '__main__' or
+                                  modname.startswith('lambdabio')):
+            continue
+        namespace = vars(module)
+        for attr, value in namespace.items():
+            wrapper = wrappers.get(id(value))
+            if wrapper is not None:
+                namespace[attr] = wrapper
+                _patched.append((namespace, attr, value))
+
+def _unpatch():
+    while _patched:
+        namespace, attr, value = _patched.pop()
+        namespace[attr] = value
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        return False
+_null_stage = _NullStage()
+
+class _Stage(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, default_timer() - self.start)
+        return False
+
+def stage(name):
+    """Return context manager which measures a block as a stage"""
+    if _profiler is None:
+        return _null_stage
+    return _Stage(_profiler, name)
+
+def count(name, n=1):
+    """Increment a counter when enabled"""
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+def enable_profile():
+    """Enable the instrumentation and return a new Profiler"""
+    global _profiler
+    _unpatch()
+    _profiler = Profiler()
+    _patch(_profiler)
+    return _profiler
+
+def disable_profile():
+    """Disable the instrumentation"""
+    global _profiler
+    _unpatch()
+    _profiler = None
+
+def get_profiler():
+    """Return the profiler in use or None when disabled"""
+    return _profiler
+
+def add_profile_options(parser):
+    """Add --profile and --profile-output options to OptionParser"""
+    parser.add_option('--profile', dest='profile', action='store_true',
+            default=False,
+            help="print a per-stage breakdown of time and memory to stderr")
+    parser.add_option('--profile-output', dest='profile_output',
+            default=None,
+            help="dump the profile to the file. a JSON report is written "
+                 "when the filename ends with '.json', cProfile "
+                 "statistics otherwise.")
+
+@contextmanager
+def profiling(opts, stream=sys.stderr):
+    """Context manager which profiles command line interfaces
+
+    Args:
+        opts - the options parsed with add_profile_options
+        stream - the stream where the per-stage breakdown is written
+
+    Yield:
+        the instance of Profiler or None when profile is not requested
+    """
+    filename = opts.profile_output
+    if not opts.profile and not filename:
+        yield None
+        return
+    profiler = enable_profile()
+    cprofile = None
+    if filename and not filename.endswith('.json'):
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    try:
+        yield profiler
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(filename)
+        disable_profile()
+        if filename and filename.endswith('.json'):
+            with open(filename, 'w') as fo:
+                profiler.write_json(fo)
+        if opts.profile:
+            profiler.write_report(stream)
+
+# --- unittest
+if __name__ == '__main__':
+    import json
+    import unittest
+    class TestCase(unittest.TestCase):
+        def tearDown(self):
+            disable_profile()
+        def test_instrument(self):
+            # the instrumented functions are registered to the package module
+            # even if this module is executed as a script
+            from lambdabio.DNA import instrument as module
+            from lambdabio.DNA.restriction_digest import enzyme
+            double_digestion = enzyme.double_digestion
+            pair = (enzyme.EcoRI(), enzyme.PstI())
+            try:
+                profiler = module.enable_profile()
+                self.assertNotEquals(enzyme.double_digestion, double_digestion)
+                enzyme.double_digestion(*pair)
+                enzyme.multi_digestion(pair)
+                stage = profiler.stages['buffer_selection']
+                self.assertEquals(stage['calls'], 2)
+                self.assertTrue(stage['peak_memory'] > 0)
+            finally:
+                module.disable_profile()
+            self.assertEquals(enzyme.double_digestion, double_digestion)
+        def test_measure_nested(self):
+            profiler = Profiler()
+            def square(x):
+                return x * x
+            def nested(x):
+                return profiler.measure('square', square, x)
+            self.assertEquals(profiler.measure('square', nested, 3), 9)
+            self.assertEquals(profiler.stages['square']['calls'], 1)
+        def test_stage_and_count(self):
+            with stage('block'):
+                count('rows')
+            profiler = enable_profile()
+            for i in xrange(3):
+                with stage('block'):
+                    count('rows')
+            self.assertEquals(profiler.stages['block']['calls'], 3)
+            self.assertEquals(profiler.counters['rows'], 3)
+        def test_write_report(self):
+            from StringIO import StringIO
+            profiler = enable_profile()
+            profiler.add('render', 0.5)
+            profiler.count('rows', 2)
+            stream = StringIO()
+            profiler.write_report(stream)
+            lines = stream.getvalue().splitlines()
+            self.assertTrue(lines[0].startswith('stage'))
+            self.assertTrue(lines[1].startswith('render'))
+            self.assertTrue(lines[2].startswith('total'))
+            stream = StringIO()
+            profiler.write_json(stream)
+            report = json.loads(stream.getvalue())
+            self.assertEquals(report['stages']['render']['calls'], 1)
+            self.assertEquals(report['counters'], {'rows': 2})
+        def test_profiling(self):
+            import os
+            import tempfile
+            from StringIO import StringIO
+            from optparse import OptionParser
+            parser = OptionParser()
+            add_profile_options(parser)
+            opts, args = parser.parse_args([])
+            with profiling(opts) as profiler:
+                self.assertEquals(profiler, None)
+            fd, filename = tempfile.mkstemp(suffix='.json')
+            os.close(fd)
+            try:
+                opts, args = parser.parse_args(['--profile',
+                                                '--profile-output', filename])
+                stream = StringIO()
+                with profiling(opts, stream) as profiler:
+                    with stage('parse'):
+                        pass
+                self.assertEquals(get_profiler(), None)
+                self.assertTrue('parse' in stream.getvalue())
+                with open(filename) as fi:
+                    self.assertTrue('parse' in json.load(fi)['stages'])
+            finally:
+                os.remove(filename)
+
+    unittest.main()
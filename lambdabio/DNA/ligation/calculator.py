@@ -6,6 +6,9 @@ Methods:
     calculate_required_vector_weight - Calculate required Vector weight
     calculate_required_insert_weight - Calculate required Insert weight
     calculate_required_weights - Calculate required weights of Vector and Insert
+    calculate_required_vector_weight_array - Vectorized calculate_required_vector_weight
+    calculate_required_insert_weight_array - Vectorized calculate_required_insert_weight
+    calculate_required_weights_array - Vectorized calculate_required_weights
 
 
 Copyright:
@@ -28,7 +31,19 @@ __author__  = 'Alisue <lambdalisue@hashnote.net>'
 __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
-def calculate_required_vector_weight(size):
+from lambdabio.DNA.cache import memoize
+from lambdabio.DNA.instrument import instrument
+
+# The size of reference Vector (pUC) in bp and its best weight in ng
+REFERENCE_VECTOR_SIZE = 2700
+REFERENCE_VECTOR_WEIGHT = 50
+
+# The best molar ratio of Insert to Vector (1:6)
+INSERT_MOLAR_RATIO = 6
+
+def calculate_required_vector_weight(size,
+        reference_size=REFERENCE_VECTOR_SIZE,
+        reference_weight=REFERENCE_VECTOR_WEIGHT):
     """Calculate required weight of Vector for Ligation.
 
     The best weight of ligation for pUC Vector(2,700 bp) is known as 50 ng.
@@ -38,14 +53,16 @@ def calculate_required_vector_weight(size):
 
     Args:
         size - the size of Vector DNA in bp
+        reference_size - the size of reference Vector in bp
+        reference_weight - the best weight of reference Vector in ng
 
     Return:
         a calculated required weight in ng (float)
     """
-    # 50/2,700 = 1/54
-    return size / 54.0
+    return size * reference_weight / float(reference_size)
 
-def calculate_required_insert_weight(weight_vector, size_vector, size_insert):
+def calculate_required_insert_weight(weight_vector, size_vector, size_insert,
+        ratio=INSERT_MOLAR_RATIO):
     """Calculate required weight of Insert for Ligation.
 
     The best molar ratio of Vector and Insert is known as 1:6
@@ -57,50 +74,197 @@ def calculate_required_insert_weight(weight_vector, size_vector, size_insert):
         weight_vector - the weight of Vector DNA in ng
         size_vector - the size of Vector DNA in bp
         size_insert - the size of Insert DNA in bp
+        ratio - the molar ratio of Insert to Vector
 
     Return:
         a calculated required weight of insert in ng (float)
     """
     if not isinstance(size_vector, float):
         size_vector = float(size_vector)
-    return 6 * weight_vector * size_insert / size_vector
+    return ratio * weight_vector * size_insert / size_vector
 
-def calculate_required_weights(size_vector, size_insert):
+@instrument('weight_calculation')
+@memoize
+def calculate_required_weights(size_vector, size_insert,
+        ratio=INSERT_MOLAR_RATIO):
     """Calculate required weights of Vector and Insert for Ligation
 
     Args:
         size_vector - the size of Vector DNA in bp
         size_insert - the size of Insert DNA in bp
+        ratio - the molar ratio of Insert to Vector
 
     Return:
         a tuple of weights of Vector and Insert in ng (tuple(float, float))
     """
     weight_vector = calculate_required_vector_weight(size_vector)
     weight_insert = calculate_required_insert_weight(weight_vector, size_vector,
-            size_insert)
+            size_insert, ratio)
     return weight_vector, weight_insert
 
-# --- unittest
-import unittest
-class TestCase(unittest.TestCase):
-    def test_calculate_required_vector_weight(self):
-        size = 5400
-        weight = calculate_required_vector_weight(size)
-        self.assertEquals(weight, 100)
-    def test_calculate_required_insert_weight(self):
-        weight_vector = 100
-        size_vector = 5400
-        size_insert = 540
-        weight_insert = calculate_required_insert_weight(weight_vector,
-                size_vector, size_insert)
-        self.assertEquals(weight_insert, 60)
-    def test_calculate_required_weights(self):
-        size_vector = 5400
-        size_insert = 540
-        weight_vector, weight_insert = calculate_required_weights(size_vector,
-                size_insert)
-        self.assertEquals(weight_vector, 100)
-        self.assertEquals(weight_insert, 60)
+def calculate_required_vector_weight_array(size,
+        reference_size=REFERENCE_VECTOR_SIZE,
+        reference_weight=REFERENCE_VECTOR_WEIGHT):
+    """Calculate required weights of Vectors for Ligation at once.
+
+    See calculate_required_vector_weight for detail.
+
+    Args:
+        size - the sizes of Vector DNA in bp (array like)
+        reference_size - the size of reference Vector in bp
+        reference_weight - the best weight of reference Vector in ng
+
+    Return:
+        calculated required weights in ng (numpy.ndarray)
+    """
+    import numpy as np
+    return np.asarray(size, dtype=np.float64) * reference_weight / \
+        float(reference_size)
+
+def calculate_required_insert_weight_array(weight_vector, size_vector,
+        size_insert, ratio=INSERT_MOLAR_RATIO):
+    """Calculate required weights of Inserts for Ligation at once.
+
+    The arguments are broadcasted each other, thus one Vector can be
+    paired with many Inserts. See calculate_required_insert_weight for
+    detail.
+
+    Args:
+        weight_vector - the weights of Vector DNA in ng (array like)
+        size_vector - the sizes of Vector DNA in bp (array like)
+        size_insert - the sizes of Insert DNA in bp (array like)
+        ratio - the molar ratios of Insert to Vector (array like)
+
+    Return:
+        calculated required weights of inserts in ng (numpy.ndarray)
+    """
+    import numpy as np
+    weight_vector = np.asarray(weight_vector, dtype=np.float64)
+    size_vector = np.asarray(size_vector, dtype=np.float64)
+    return np.asarray(ratio) * weight_vector * np.asarray(size_insert) / \
+        size_vector
+
+@instrument('weight_calculation')
+def calculate_required_weights_array(size_vector, size_insert,
+        ratio=INSERT_MOLAR_RATIO):
+    """Calculate required weights of Vectors and Inserts at once
 
+    The arguments are broadcasted each other, thus one Vector can be
+    paired with many Inserts.
+
+    Args:
+        size_vector - the sizes of Vector DNA in bp (array like)
+        size_insert - the sizes of Insert DNA in bp (array like)
+        ratio - the molar ratios of Insert to Vector (array like)
+
+    Return:
+        a tuple of weights of Vectors and Inserts in ng which have the
+        broadcasted shape (tuple(numpy.ndarray, numpy.ndarray))
+    """
+    import numpy as np
+    size_vector, size_insert, ratio = np.broadcast_arrays(
+        np.asarray(size_vector, dtype=np.float64), np.asarray(size_insert),
+        np.asarray(ratio))
+    weight_vector = calculate_required_vector_weight_array(size_vector)
+    weight_insert = calculate_required_insert_weight_array(weight_vector,
+            size_vector, size_insert, ratio)
+    return weight_vector, weight_insert
+
+@instrument('weight_calculation')
+def calculate_required_weights_grid(size_vector, size_insert,
+        ratio=INSERT_MOLAR_RATIO, weight_vector=None):
+    """Calculate required weights of Insert on a grid of conditions
+
+    Evaluate every combination of molar ratios, weights of Vector and
+    sizes of Insert for optimization of ligation at once.
+
+    Args:
+        size_vector - the size of Vector DNA in bp
+        size_insert - the sizes of Insert DNA in bp (number or array like)
+        ratio - the molar ratios of Insert to Vector (number or array
+            like)
+        weight_vector - the weights of Vector DNA in ng (number or array
+            like). the weight calculated with
+            calculate_required_vector_weight is used when None is
+            specified.
+
+    Return:
+        a dense cube of weights of Insert in ng which shape is (ratios,
+        weights of Vector, sizes of Insert) (numpy.ndarray)
+    """
+    import numpy as np
+    if weight_vector is None:
+        weight_vector = calculate_required_vector_weight(size_vector)
+    ratio = np.atleast_1d(np.asarray(ratio, dtype=np.float64))
+    weight_vector = np.atleast_1d(np.asarray(weight_vector, dtype=np.float64))
+    size_insert = np.atleast_1d(np.asarray(size_insert, dtype=np.float64))
+    return calculate_required_insert_weight_array(
+        weight_vector[None,:,None], size_vector, size_insert[None,None,:],
+        ratio[:,None,None])
+
+# --- unittest
 if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    class TestCase(unittest.TestCase):
+        def test_calculate_required_vector_weight(self):
+            size = 5400
+            weight = calculate_required_vector_weight(size)
+            self.assertEquals(weight, 100)
+        def test_calculate_required_insert_weight(self):
+            weight_vector = 100
+            size_vector = 5400
+            size_insert = 540
+            weight_insert = calculate_required_insert_weight(weight_vector,
+                    size_vector, size_insert)
+            self.assertEquals(weight_insert, 60)
+        def test_calculate_required_weights(self):
+            size_vector = 5400
+            size_insert = 540
+            weight_vector, weight_insert = calculate_required_weights(size_vector,
+                    size_insert)
+            self.assertEquals(weight_vector, 100)
+            self.assertEquals(weight_insert, 60)
+        def test_calculate_required_vector_weight_array(self):
+            weights = calculate_required_vector_weight_array([5400, 2700])
+            self.assertEquals(weights.tolist(), [100, 50])
+        def test_calculate_required_insert_weight_array(self):
+            weights = calculate_required_insert_weight_array(100, 5400,
+                    [540, 1080])
+            self.assertEquals(weights.tolist(), [60, 120])
+        def test_calculate_required_weights_array(self):
+            size_vector = np.array([[5400], [2700]])
+            size_insert = np.array([540, 1080, 2700])
+            weight_vector, weight_insert = calculate_required_weights_array(
+                    size_vector, size_insert)
+            self.assertEquals(weight_vector.shape, (2, 3))
+            self.assertEquals(weight_insert.shape, (2, 3))
+            for i, v in enumerate(size_vector[:,0]):
+                for j, n in enumerate(size_insert):
+                    expected = calculate_required_weights(v, n)
+                    self.assertAlmostEquals(weight_vector[i,j], expected[0])
+                    self.assertAlmostEquals(weight_insert[i,j], expected[1])
+        def test_ratio(self):
+            self.assertEquals(calculate_required_weights(5400, 540, 3),
+                              (100, 30))
+            self.assertEquals(calculate_required_vector_weight(5400, 2700,
+                                                               25), 50)
+            weight_vector, weight_insert = calculate_required_weights_array(
+                    5400, 540, [1, 3, 6])
+            self.assertEquals(weight_insert.tolist(), [10, 30, 60])
+        def test_calculate_required_weights_grid(self):
+            ratios = [1, 3, 6]
+            weights = [50, 100]
+            sizes = [540, 1080, 2700, 5400]
+            cube = calculate_required_weights_grid(5400, sizes, ratios,
+                                                   weights)
+            self.assertEquals(cube.shape, (3, 2, 4))
+            for i, r in enumerate(ratios):
+                for j, w in enumerate(weights):
+                    for k, n in enumerate(sizes):
+                        self.assertAlmostEquals(cube[i,j,k],
+                            calculate_required_insert_weight(w, 5400, n, r))
+            cube = calculate_required_weights_grid(5400, 540)
+            self.assertEquals(cube.tolist(), [[[60]]])
+
     unittest.main()
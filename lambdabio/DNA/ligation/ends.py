@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Sticky end compatibility module
+
+Find every ligatable pair of fragments from any digests. Each end of a
+fragment is summarized as a key of the type of overhang (5', 3' or
+blunt) and the protruding single strand read from 5' to 3':
+
+    EcoR I (G'AATTC)  -> ("5'", 'AATT')
+    Pst I (CTGCA'G)   -> ("3'", 'TGCA')
+
+Two ends are ligatable when the types are the same and the protruding
+strands are reverse complement each other. The ends are indexed in a
+hash table by the key, thus the compatible ends of an end are found by
+a single lookup of the reverse complement key instead of comparing every
+pair of fragments.
+
+    pieces = create_pieces('pUC19', vector, virtual_digest(vector,
+                           ['EcoRI', 'PstI'], 'circular'))
+    pieces += create_pieces('GFP', insert, virtual_digest(insert,
+                            ['EcoRI', 'PstI']))
+    pairs = find_ligatable_pairs(pieces)
+    weight_vector, weight_insert = calculate_pair_weights(pieces, pairs)
+
+Methods:
+    get_overhang - Return type and sequence of overhang of site string
+    get_end - Return key of end cut at top and bottom strand positions
+    create_pieces - Create pieces with ends from fragments of digest
+    build_end_index - Build hash index of ends of pieces
+    find_ligatable_pairs - Find every ligatable pair of ends of pieces
+    calculate_pair_weights - Calculate required weights of pairs
+
+Data:
+    FIVE_PRIME - the type of 5' overhang
+    THREE_PRIME - the type of 3' overhang
+    BLUNT - the type of blunt end
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+from calculator import calculate_required_weights_array, INSERT_MOLAR_RATIO
+from lambdabio.DNA.restriction_digest.enzyme import Attrdict
+from lambdabio.DNA.restriction_digest.scanner import parse_cuts, \
+        reverse_complement
+
+FIVE_PRIME = "5'"
+THREE_PRIME = "3'"
+BLUNT = 'blunt'
+
+# The sides of piece
+LEFT = 0
+RIGHT = 1
+
+def get_overhang(site):
+    """Return type and sequence of overhang of site string
+
+    The bottom strand is assumed to be cut at the mirrored position of
+    the top strand cut mark. The bases of overhang outside of the site
+    (Type IIS) are N.
+
+    Usage:
+        >>> get_overhang("G'AATTC")
+        ("5'", 'AATT')
+        >>> get_overhang("CTGCA'G")
+        ("3'", 'TGCA')
+        >>> get_overhang("GGTCTC(1/5)")
+        ("5'", 'NNNN')
+
+    Args:
+        site - the site string of enzyme like "G'AATTC"
+
+    Return:
+        a tuple of type of overhang and the top strand sequence of
+        overhang (tuple(string, string))
+    """
+    recognition, top, bottom = parse_cuts(site)
+    def _overhang(begin, end):
+        return ''.join(recognition[p] if 0 <= p < len(recognition) else 'N'
+                       for p in xrange(begin, end))
+    if top < bottom:
+        return FIVE_PRIME, _overhang(top, bottom)
+    elif top > bottom:
+        return THREE_PRIME, _overhang(bottom, top)
+    return BLUNT, ''
+
+def _slice(sequence, begin, end):
+    # slice circular sequence (end might be less than begin)
+    if begin <= end:
+        return sequence[begin:end]
+    return sequence[begin:] + sequence[:end]
+
+def get_end(sequence, top, bottom, side, circular=False):
+    """Return key of end cut at top and bottom strand positions
+
+    Args:
+        sequence - the DNA sequence (string)
+        top - the top strand cut position
+        bottom - the bottom strand cut position
+        side - the side of the end on the fragment (LEFT or RIGHT)
+        circular - True when the DNA is circular
+
+    Return:
+        a tuple of type of overhang and the protruding strand read from
+        5' to 3' (tuple(string, string))
+    """
+    if top == bottom:
+        return BLUNT, ''
+    # the cuts are on both sides of the origin of circular DNA
+    across = circular and abs(top - bottom) > len(sequence) // 2
+    if (top < bottom) != across:
+        kind = FIVE_PRIME
+        overhang = _slice(sequence, top, bottom).upper()
+    else:
+        kind = THREE_PRIME
+        overhang = _slice(sequence, bottom, top).upper()
+    # the protruding strand is the bottom strand on the left of 3'
+    # overhang and on the right of 5' overhang
+    if (kind == FIVE_PRIME) == (side == RIGHT):
+        overhang = reverse_complement(overhang)
+    return kind, overhang
+
+def create_pieces(name, sequence, fragments):
+    """Create pieces with ends from fragments of digest
+
+    Args:
+        name - the name of the digested DNA
+        sequence - the DNA sequence (string)
+        fragments - the fragments returned by virtual_digest
+
+    Return:
+        a list of Attrdict which has 'name' (like 'pUC19:0-2686'),
+        'size', 'left' and 'right' ends (see get_end). the ends of linear
+        DNA are None (list)
+
+    Raise:
+        ValueError - enzymes cut the same top strand position but the
+            different bottom strand positions thus the end is ambiguous
+    """
+    if fragments.conflicts:
+        cut = min(fragments.conflicts)
+        raise ValueError("The end of %s at %d is ambiguous (%s)." % (
+            name, cut, ', '.join('%s cuts the bottom strand at %d' % c
+                                 for c in fragments.conflicts[cut])))
+    circular = fragments.topology == 'circular'
+    cuts = fragments.cuts.tolist()
+    bottoms = fragments.bottom_cuts.tolist()
+    ends = [get_end(sequence, top, bottom, LEFT, circular)
+            for top, bottom in zip(cuts, bottoms)]
+    pieces = []
+    for k, (start, end, size) in enumerate(zip(fragments.starts.tolist(),
+            fragments.ends.tolist(), fragments.sizes.tolist())):
+        if circular:
+            if not cuts:
+                # uncut circular DNA could not be ligated
+                continue
+            left = k
+            right = (k + 1) % len(cuts)
+        else:
+            left = k - 1 if k else None
+            right = k if k < len(cuts) else None
+        pieces.append(Attrdict(
+            name='%s:%d-%d' % (name, start, end),
+            size=size,
+            left=None if left is None else ends[left],
+            right=None if right is None else get_end(sequence,
+                cuts[right], bottoms[right], RIGHT, circular),
+        ))
+    return pieces
+
+def build_end_index(pieces):
+    """Build hash index of ends of pieces
+
+    Args:
+        pieces - a list of pieces (see create_pieces)
+
+    Return:
+        a dictionary which key is the end and value is a list of tuple(
+        index of piece, side) (dict)
+    """
+    index = {}
+    for i, piece in enumerate(pieces):
+        for side, end in ((LEFT, piece.left), (RIGHT, piece.right)):
+            if end is not None:
+                index.setdefault(end, []).append((i, side))
+    return index
+
+def find_ligatable_pairs(pieces, index=None):
+    """Find every ligatable pair of ends of pieces
+
+    The compatible ends of each end are looked up in the hash index,
+    thus the cost is linear in the number of ends (and the pairs found).
+    Self ligation of a piece is not reported.
+
+    Args:
+        pieces - a list of pieces (see create_pieces)
+        index - the index of pieces built with build_end_index. it is
+            built when None is specified.
+
+    Return:
+        a list of tuple(index of piece, side, index of piece, side) where
+        the first index is less than the second (list)
+    """
+    if index is None:
+        index = build_end_index(pieces)
+    pairs = []
+    for i, piece in enumerate(pieces):
+        for side, end in ((LEFT, piece.left), (RIGHT, piece.right)):
+            if end is None:
+                continue
+            kind, overhang = end
+            for j, other in index.get((kind, reverse_complement(overhang)),
+                                      ()):
+                if i < j:
+                    pairs.append((i, side, j, other))
+    return pairs
+
+def calculate_pair_weights(pieces, pairs, ratio=INSERT_MOLAR_RATIO):
+    """Calculate required weights of pairs for Ligation at once
+
+    The larger piece of a pair is used as Vector and the other as Insert
+    (see calculate_required_weights).
+
+    Args:
+        pieces - a list of pieces (see create_pieces)
+        pairs - a list of pairs returned by find_ligatable_pairs
+        ratio - the molar ratio of Insert to Vector
+
+    Return:
+        a tuple of weights of Vectors and Inserts in ng of each pair
+        (tuple(numpy.ndarray, numpy.ndarray))
+    """
+    import numpy as np
+    sizes = np.array([piece.size for piece in pieces], dtype=np.float64)
+    pairs = np.array([(i, j) for i, si, j, sj in pairs], dtype=np.intp)
+    pairs = pairs.reshape(-1, 2)
+    size_i, size_j = sizes[pairs[:,0]], sizes[pairs[:,1]]
+    return calculate_required_weights_array(np.maximum(size_i, size_j),
+                                            np.minimum(size_i, size_j), ratio)
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    from calculator import calculate_required_weights
+    from lambdabio.DNA.restriction_digest.digest import virtual_digest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            # vector with EcoRI and PstI sites in MCS and an insert with
+            # EcoRI and PstI sites at the ends
+            self.vector = 'A' * 1000 + 'GAATTCAAACTGCAG' + 'T' * 1700
+            self.insert = 'CCGAATTC' + 'G' * 500 + 'CTGCAGCC'
+        def test_get_overhang(self):
+            self.assertEquals(get_overhang("G'AATTC"), (FIVE_PRIME, 'AATT'))
+            self.assertEquals(get_overhang("CTGCA'G"), (THREE_PRIME, 'TGCA'))
+            self.assertEquals(get_overhang("CAG'CTG"), (BLUNT, ''))
+            self.assertEquals(get_overhang("GCCNNNN'NGGC"),
+                              (THREE_PRIME, 'NNN'))
+            self.assertEquals(get_overhang("GAAGAC(2/6)"),
+                              (FIVE_PRIME, 'NNNN'))
+            self.assertEquals(get_overhang("GGTCTC(-1/-1)"), (BLUNT, ''))
+        def test_get_end(self):
+            sequence = 'AAGAATTCAA'
+            self.assertEquals(get_end(sequence, 3, 7, LEFT),
+                              (FIVE_PRIME, 'AATT'))
+            self.assertEquals(get_end(sequence, 3, 7, RIGHT),
+                              (FIVE_PRIME, 'AATT'))
+            sequence = 'AACTGCAGAA'
+            self.assertEquals(get_end(sequence, 7, 3, LEFT),
+                              (THREE_PRIME, 'TGCA'))
+            self.assertEquals(get_end(sequence, 7, 3, RIGHT),
+                              (THREE_PRIME, 'TGCA'))
+            # non palindromic overhang
+            self.assertEquals(get_end('AAACGAA', 2, 6, LEFT),
+                              (FIVE_PRIME, 'ACGA'))
+            self.assertEquals(get_end('AAACGAA', 2, 6, RIGHT),
+                              (FIVE_PRIME, 'TCGT'))
+            # overhang across the origin of circular DNA
+            self.assertEquals(get_end('TTCAAAAAGAA', 9, 2, LEFT, True),
+                              (FIVE_PRIME, 'AATT'))
+        def test_create_pieces(self):
+            fragments = virtual_digest(self.vector, ['EcoRI', 'PstI'],
+                                       'circular')
+            pieces = create_pieces('vector', self.vector, fragments)
+            self.assertEquals([p.name for p in pieces],
+                              ['vector:1001-1014', 'vector:1014-1001'])
+            self.assertEquals(pieces[0].left, (FIVE_PRIME, 'AATT'))
+            self.assertEquals(pieces[0].right, (THREE_PRIME, 'TGCA'))
+            self.assertEquals(pieces[1].left, (THREE_PRIME, 'TGCA'))
+            self.assertEquals(pieces[1].right, (FIVE_PRIME, 'AATT'))
+            fragments = virtual_digest(self.insert, ['EcoRI'])
+            pieces = create_pieces('insert', self.insert, fragments)
+            self.assertEquals([(p.left, p.right) for p in pieces],
+                              [(None, (FIVE_PRIME, 'AATT')),
+                               ((FIVE_PRIME, 'AATT'), None)])
+            fragments = virtual_digest(self.vector, ['SpeI'], 'circular')
+            self.assertEquals(create_pieces('vector', self.vector,
+                                            fragments), [])
+            # the blunt cut at the top strand cut of EcoRI
+            class BluntEcoRI(object):
+                name = 'BluntEcoRI'
+                site = 'GAATTC(-5/-5)'
+            fragments = virtual_digest(self.insert, ['EcoRI', BluntEcoRI()])
+            self.assertRaises(ValueError, create_pieces, 'insert',
+                              self.insert, fragments)
+        def test_find_ligatable_pairs(self):
+            pieces = create_pieces('vector', self.vector,
+                virtual_digest(self.vector, ['EcoRI', 'PstI'], 'circular'))
+            pieces += create_pieces('insert', self.insert,
+                virtual_digest(self.insert, ['EcoRI', 'PstI']))
+            names = [p.name for p in pieces]
+            pairs = find_ligatable_pairs(pieces)
+            found = set((names[i], si, names[j], sj)
+                        for i, si, j, sj in pairs)
+            self.assertEquals(len(found), len(pairs))
+            # the backbone and the insert
+            self.assertTrue(('vector:1014-1001', RIGHT,
+                             'insert:3-513', LEFT) in found)
+            self.assertTrue(('vector:1014-1001', LEFT,
+                             'insert:3-513', RIGHT) in found)
+            # the ends of pairs are compatible
+            for i, si, j, sj in pairs:
+                kind, overhang = pieces[i][('left', 'right')[si]]
+                other = pieces[j][('left', 'right')[sj]]
+                self.assertEquals(other,
+                                  (kind, reverse_complement(overhang)))
+            # same as the pairwise comparison
+            ends = [(i, side, end) for i, p in enumerate(pieces)
+                    for side, end in ((LEFT, p.left), (RIGHT, p.right))
+                    if end is not None]
+            expected = set((i, si, j, sj) for i, si, e in ends
+                           for j, sj, f in ends if i < j and
+                           e == (f[0], reverse_complement(f[1])))
+            self.assertEquals(set(pairs), expected)
+        def test_calculate_pair_weights(self):
+            pieces = [Attrdict(name='a', size=5400, left=None, right=None),
+                      Attrdict(name='b', size=540, left=None, right=None)]
+            weight_vector, weight_insert = calculate_pair_weights(pieces,
+                    [(0, RIGHT, 1, LEFT), (1, RIGHT, 0, LEFT)])
+            self.assertEquals(weight_vector.tolist(), [100, 100])
+            self.assertEquals(weight_insert.tolist(),
+                              [calculate_required_weights(5400, 540)[1]] * 2)
+            weight_vector, weight_insert = calculate_pair_weights(pieces, [])
+            self.assertEquals(weight_vector.shape, (0,))
+
+    unittest.main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Golden Gate assembly module
+
+Enumerate the 4 nt overhangs generated by Type IIS enzymes (e.g. BsaI
+GGTCTC(1/5)) and check the fidelity of overhang sets of assemblies.
+Overhangs are encoded as integers from 0 to 255 (2 bits per base, A=0,
+C=1, G=2, T=3) written on the top strand, thus the mismatches of every
+pair of overhangs are precomputed as a 256x256 matrix and the overhang
+sets of many designs are checked at once with numpy indexing.
+
+    fragments = virtual_digest(part, ['BsaI'])
+    left, right = fragment_overhangs(part, fragments)
+    result = check_fidelity([['AATG', 'GCTT', 'CGCT'],
+                             ['AATG', 'AATC', 'CGCT']])
+    result.valid    # array([ True, False])
+
+Methods:
+    encode_overhangs - Encode overhangs into integers
+    decode_overhang - Decode integer into overhang
+    get_mismatch_matrix - Return the mismatch matrix of overhangs
+    extract_overhangs - Extract 4 nt overhangs of cuts of digest
+    fragment_overhangs - Return overhangs of both ends of fragments
+    check_fidelity - Check fidelity of overhang sets of assemblies
+
+Data:
+    OVERHANG_LENGTH - the length of overhangs
+    MIN_MISMATCHES - the default minimum mismatches between overhangs
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+from lambdabio.DNA.restriction_digest.enzyme import Attrdict
+
+# The length of overhangs
+OVERHANG_LENGTH = 4
+
+# The default minimum mismatches between an overhang and the overhangs
+# of the other junctions
+MIN_MISMATCHES = 2
+
+BASES = 'ACGT'
+
+_compiled = {}
+def _compile():
+    # cache the reverse complement codes (256), the mismatch matrix
+    # (256x256) and the byte to digit table (256)
+    import numpy as np
+    if not _compiled:
+        codes = np.arange(4 ** OVERHANG_LENGTH)
+        shifts = 2 * np.arange(OVERHANG_LENGTH - 1, -1, -1)
+        digits = (codes[:,None] >> shifts) & 3
+        # the complement of base b is 3 - b
+        complements = (3 - digits[:,::-1])
+        _compiled['complements'] = (complements << shifts).sum(axis=1)
+        # the mismatches of overhang a annealed to overhang b
+        _compiled['mismatches'] = (digits[:,None,:] !=
+                                   complements[None,:,:]).sum(axis=2) \
+                                  .astype(np.uint8)
+        table = np.empty(256, dtype=np.int64)
+        table.fill(-1)
+        for digit, base in enumerate(BASES):
+            table[ord(base)] = table[ord(base.lower())] = digit
+        _compiled['table'] = table
+    return _compiled
+
+def encode_overhangs(overhangs):
+    """Encode overhangs into integers
+
+    Usage:
+        >>> encode_overhangs(['AATG', 'gctt']).tolist()
+        [14, 159]
+
+    Args:
+        overhangs - a list (or nested lists) of 4 nt overhangs
+
+    Return:
+        codes of overhangs (numpy.ndarray)
+    """
+    import numpy as np
+    overhangs = np.asarray(overhangs)
+    if overhangs.dtype.kind not in 'SU':
+        # already encoded
+        return overhangs.astype(np.int64)
+    table = _compile()['table']
+    view = np.frombuffer(''.join(overhangs.ravel().tolist()).encode(),
+                         dtype=np.uint8)
+    if len(view) != overhangs.size * OVERHANG_LENGTH:
+        raise ValueError("Overhangs must be %d nt." % OVERHANG_LENGTH)
+    digits = table[view].reshape(-1, OVERHANG_LENGTH)
+    if (digits < 0).any():
+        raise ValueError("Invalid nucleotide codes are found.")
+    shifts = 2 * np.arange(OVERHANG_LENGTH - 1, -1, -1)
+    return (digits << shifts).sum(axis=1).reshape(overhangs.shape)
+
+def decode_overhang(code):
+    """Decode integer into overhang"""
+    return ''.join(BASES[(code >> shift) & 3]
+                   for shift in xrange(2 * OVERHANG_LENGTH - 2, -1, -2))
+
+def get_mismatch_matrix():
+    """Return the mismatch matrix of overhangs
+
+    The (a, b) element is the number of mismatched base pairs when the
+    overhang a anneals to the overhang b, thus the overhangs are
+    compatible when it is 0 (i.e. b is the reverse complement of a).
+
+    Return:
+        a matrix of mismatches which shape is (256, 256) (numpy.ndarray)
+    """
+    return _compile()['mismatches']
+
+def extract_overhangs(sequence, fragments):
+    """Extract 4 nt overhangs of cuts of digest at once
+
+    Args:
+        sequence - the DNA sequence (string)
+        fragments - the fragments returned by virtual_digest
+
+    Return:
+        codes of the top strand overhangs of the cuts in fragments.cuts.
+        the cuts which do not generate 4 nt 5' overhangs of ACGT and the
+        cuts which bottom strand cut is ambiguous (fragments.conflicts)
+        are -1 (numpy.ndarray)
+    """
+    import numpy as np
+    compiled = _compile()
+    size = len(sequence)
+    top = fragments.cuts.astype(np.int64)
+    bottom = fragments.bottom_cuts.astype(np.int64)
+    if not len(top):
+        return np.empty(0, dtype=np.int64)
+    distance = np.abs(top - bottom)
+    begin = np.minimum(top, bottom)
+    five_prime = top < bottom
+    if fragments.topology == 'circular':
+        # the cuts are on both sides of the origin
+        across = distance > size // 2
+        begin = np.where(across, np.maximum(top, bottom), begin)
+        distance = np.where(across, size - distance, distance)
+        five_prime ^= across
+    positions = begin[:,None] + np.arange(OVERHANG_LENGTH)
+    if fragments.topology == 'circular':
+        positions %= size
+    inside = ((positions >= 0) & (positions < size)).all(axis=1)
+    view = np.frombuffer(sequence, dtype=np.uint8)
+    digits = compiled['table'][view[np.clip(positions, 0, size - 1)]]
+    shifts = 2 * np.arange(OVERHANG_LENGTH - 1, -1, -1)
+    codes = (digits << shifts).sum(axis=1)
+    valid = five_prime & (distance == OVERHANG_LENGTH) & inside & \
+        (digits >= 0).all(axis=1)
+    if fragments.conflicts:
+        valid &= ~np.in1d(top, list(fragments.conflicts))
+    return np.where(valid, codes, -1)
+
+def fragment_overhangs(sequence, fragments):
+    """Return overhangs of both ends of fragments at once
+
+    Args:
+        sequence - the DNA sequence (string)
+        fragments - the fragments returned by virtual_digest
+
+    Return:
+        a tuple of codes of overhangs of the left and the right ends of
+        fragments (see extract_overhangs). the ends without 4 nt
+        overhangs (e.g. the ends of linear DNA) are -1 (tuple(
+        numpy.ndarray, numpy.ndarray))
+    """
+    import numpy as np
+    codes = extract_overhangs(sequence, fragments)
+    if fragments.topology == 'circular':
+        if not len(codes):
+            return np.array([-1]), np.array([-1])
+        return codes, np.roll(codes, -1)
+    return np.concatenate(([-1], codes)), np.concatenate((codes, [-1]))
+
+def check_fidelity(overhangs, threshold=MIN_MISMATCHES):
+    """Check fidelity of overhang sets of assemblies at once
+
+    An overhang set is valid when every overhang is 4 nt of ACGT, is not
+    palindromic (self ligation) and anneals to the overhangs of the other
+    junctions (and their reverse complements) with at least threshold
+    mismatches.
+
+    Args:
+        overhangs - the overhangs (or the codes) of junctions of an
+            assembly or a matrix of overhangs of designs (designs x
+            junctions)
+        threshold - the minimum mismatches between junctions
+
+    Return:
+        an Attrdict which has 'valid', 'min_mismatches' and
+        'palindromic' of each design (arrays when a matrix is
+        specified) (Attrdict)
+    """
+    import numpy as np
+    compiled = _compile()
+    codes = encode_overhangs(overhangs)
+    single = codes.ndim == 1
+    codes = np.atleast_2d(codes)
+    encoded = (codes >= 0).all(axis=1)
+    codes = np.where(codes >= 0, codes, 0)
+    mismatches = compiled['mismatches']
+    complements = compiled['complements']
+    a = codes[:,:,None]
+    b = codes[:,None,:]
+    # the end of a junction anneals to either end of the other junctions
+    cross = np.minimum(mismatches[a, b], mismatches[a, complements[b]])
+    junctions = codes.shape[1]
+    diagonal = np.eye(junctions, dtype=bool)[None,:,:]
+    cross = np.where(diagonal, OVERHANG_LENGTH, cross)
+    if junctions:
+        min_mismatches = cross.reshape(len(codes), -1).min(axis=1)
+    else:
+        min_mismatches = np.repeat(OVERHANG_LENGTH, len(codes))
+    palindromic = (mismatches[codes, codes] == 0).any(axis=1)
+    valid = encoded & ~palindromic & (min_mismatches >= threshold)
+    result = Attrdict(valid=valid, min_mismatches=min_mismatches,
+                      palindromic=palindromic)
+    if single:
+        for key in result.keys():
+            result[key] = result[key][0]
+    return result
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    from lambdabio.DNA.restriction_digest.digest import virtual_digest
+    from lambdabio.DNA.restriction_digest.scanner import reverse_complement
+    class TestCase(unittest.TestCase):
+        def test_encode_overhangs(self):
+            codes = encode_overhangs(['AAAA', 'TTTT', 'aatg'])
+            self.assertEquals(codes.tolist(), [0, 255, 14])
+            self.assertEquals([decode_overhang(c) for c in codes],
+                              ['AAAA', 'TTTT', 'AATG'])
+            self.assertEquals(encode_overhangs([['AATG'], ['GCTT']]).shape,
+                              (2, 1))
+            self.assertRaises(ValueError, encode_overhangs, ['AATN'])
+            self.assertRaises(ValueError, encode_overhangs, ['AAT'])
+        def test_get_mismatch_matrix(self):
+            matrix = get_mismatch_matrix()
+            self.assertEquals(matrix.shape, (256, 256))
+            for a in ('AATG', 'GCTT', 'ACGT'):
+                for b in ('AATG', 'CATT', 'CATA', 'AGCA', 'ACGT'):
+                    expected = sum(x != y for x, y in
+                                   zip(a, reverse_complement(b)))
+                    code_a, code_b = encode_overhangs([a, b])
+                    self.assertEquals(matrix[code_a, code_b], expected)
+            self.assertTrue((matrix == matrix.T).all())
+        def test_extract_overhangs(self):
+            # a part flanked with BsaI sites facing inward
+            part = 'GGTCTCA' 'AATG' + 'C' * 20 + 'GCTT' 'AGAGACC'
+            fragments = virtual_digest(part, ['BsaI'])
+            codes = extract_overhangs(part, fragments)
+            self.assertEquals([decode_overhang(c) for c in codes],
+                              ['AATG', 'GCTT'])
+            left, right = fragment_overhangs(part, fragments)
+            self.assertEquals(left.tolist(), [-1] + codes.tolist())
+            self.assertEquals(right.tolist(), codes.tolist() + [-1])
+            # the insert of a circular plasmid and the overhang across
+            # the origin
+            plasmid = 'TTAGAGACCGGTCTCA' 'AATG' + 'C' * 20 + 'GC'
+            fragments = virtual_digest(plasmid, ['BsaI'], 'circular')
+            left, right = fragment_overhangs(plasmid, fragments)
+            self.assertEquals([decode_overhang(c) for c in left],
+                              ['AATG', 'GCTT'])
+            self.assertEquals([decode_overhang(c) for c in right],
+                              ['GCTT', 'AATG'])
+            # 4 nt 5' overhang of EcoRI and 3' overhang of PstI
+            fragments = virtual_digest(part + 'GAATTC', ['EcoRI'])
+            self.assertEquals(extract_overhangs(part + 'GAATTC',
+                fragments).tolist(), encode_overhangs(['AATT']).tolist())
+            fragments = virtual_digest(part + 'CTGCAG', ['PstI'])
+            self.assertEquals(extract_overhangs(part + 'CTGCAG',
+                                                fragments).tolist(), [-1])
+            # the overhang of EcoRI is ambiguous with a blunt cutter
+            class BluntEcoRI(object):
+                name = 'BluntEcoRI'
+                site = 'GAATTC(-5/-5)'
+            fragments = virtual_digest(part + 'GAATTC',
+                                       ['EcoRI', BluntEcoRI()])
+            self.assertEquals(extract_overhangs(part + 'GAATTC',
+                                                fragments).tolist(), [-1])
+        def test_check_fidelity(self):
+            result = check_fidelity(['AATG', 'GCTT', 'CGCT'])
+            self.assertTrue(result.valid)
+            self.assertEquals(result.min_mismatches, 2)
+            # AATC differs from AATG by a mismatch
+            result = check_fidelity(['AATG', 'AATC', 'CGCT'])
+            self.assertFalse(result.valid)
+            self.assertEquals(result.min_mismatches, 1)
+            # CATT is the reverse complement of AATG
+            self.assertFalse(check_fidelity(['AATG', 'CATT']).valid)
+            # ACGT is palindromic
+            result = check_fidelity(['AATG', 'ACGT'])
+            self.assertTrue(result.palindromic)
+            self.assertFalse(result.valid)
+        def test_check_fidelity_designs(self):
+            rng = np.random.RandomState(0)
+            designs = rng.randint(0, 256, (200, 5))
+            result = check_fidelity(designs, 2)
+            self.assertEquals(result.valid.shape, (200,))
+            for design, valid in zip(designs, result.valid):
+                overhangs = [decode_overhang(c) for c in design]
+                expected = True
+                for i, a in enumerate(overhangs):
+                    if a == reverse_complement(a):
+                        expected = False
+                    for j, b in enumerate(overhangs):
+                        if i == j:
+                            continue
+                        for c in (b, reverse_complement(b)):
+                            if sum(x != y for x, y in zip(a, c)) < 2:
+                                expected = False
+                self.assertEquals(valid, expected)
+            result = check_fidelity(np.array([[14, -1]]))
+            self.assertFalse(result.valid[0])
+
+    unittest.main()
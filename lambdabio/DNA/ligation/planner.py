@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Plate-scale ligation planner module
+
+Plan ligations of many vectors with many inserts at once. The required
+weights of every vector and insert pair are calculated as an outer
+product matrix (vectors x inserts) with the array calculators, then
+converted to the pipetting volumes of stock solutions (ng/ul) and the
+volume of TAKARA DNA Ligation Kit <Mighty Mix> (the same volume as the
+DNA mix). The pairs are laid out on 96 or 384 well plates.
+
+    plan = plan_ligations([('pUC19', 2686, 50)],
+                          [('GFP', 720, 20), ('RFP', 678, 25)])
+    for well in layout_plate(plan, 96):
+        print well['well'], well['volume_mix']
+
+Methods:
+    plan_ligations - Calculate weights and volumes of all pairs at once
+    well_name - Return plate number and well name of index
+    layout_plate - Lay out the pairs of plan on plates
+    generate_plate_layout - Write plate layout of vectors and inserts
+    read_samples - Read vectors or inserts from sample sheet
+
+Data:
+    PLATE_FORMATS - the number of rows and columns of plates
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import sys
+from collections import OrderedDict
+from calculator import calculate_required_weights_array
+from lambdabio.DNA.restriction_digest.enzyme import Attrdict
+from lambdabio.DNA.sheet import iter_sheet
+from lambdabio.DNA.instrument import stage
+from lambdabio.DNA.render import write_json, write_csv
+
+PLATE_FORMATS = {
+    96: (8, 12),
+    384: (16, 24),
+}
+"""The number of rows and columns of plates"""
+
+FORMAT_TABLE = {
+    'json': write_json,
+    'csv': write_csv,
+}
+"""Plate layout writers of each format"""
+
+def _split_samples(samples):
+    # return names, sizes and concentrations of samples as arrays
+    import numpy as np
+    samples = list(samples)
+    if not samples:
+        raise ValueError("No sample is specified.")
+    names = [name for name, size, concentration in samples]
+    sizes = np.array([size for name, size, concentration in samples],
+                     dtype=np.float64)
+    concentrations = np.array([c for name, size, c in samples],
+                              dtype=np.float64)
+    if (concentrations <= 0).any():
+        raise ValueError("Concentration of stock solution must be positive.")
+    return names, sizes, concentrations
+
+def plan_ligations(vectors, inserts):
+    """Calculate weights and volumes of all vector and insert pairs at once
+
+    The volumes are the volumes of stock solutions which contain the
+    required weights and the volume of Mighty Mix is the same as the
+    volume of DNA mix.
+
+    Args:
+        vectors - a list of tuple(name, size in bp, concentration of stock
+            solution in ng/ul) of Vector DNA
+        inserts - a list of tuple(name, size in bp, concentration of stock
+            solution in ng/ul) of Insert DNA
+
+    Return:
+        an Attrdict which has names of 'vectors' and 'inserts' and
+        matrices of 'weight_vector', 'weight_insert' in [ng] and
+        'volume_vector', 'volume_insert', 'volume_mix', 'volume_total' in
+        [ul] which shapes are (vectors, inserts) (Attrdict)
+    """
+    vectors, size_vector, conc_vector = _split_samples(vectors)
+    inserts, size_insert, conc_insert = _split_samples(inserts)
+    weight_vector, weight_insert = calculate_required_weights_array(
+        size_vector[:,None], size_insert[None,:])
+    volume_vector = weight_vector / conc_vector[:,None]
+    volume_insert = weight_insert / conc_insert[None,:]
+    volume_mix = volume_vector + volume_insert
+    return Attrdict(
+        vectors=vectors,
+        inserts=inserts,
+        weight_vector=weight_vector,
+        weight_insert=weight_insert,
+        volume_vector=volume_vector,
+        volume_insert=volume_insert,
+        volume_mix=volume_mix,
+        volume_total=volume_mix * 2,
+    )
+
+def well_name(index, plate=96):
+    """Return plate number and well name of index (row major)
+
+    Usage:
+        >>> well_name(0)
+        (1, 'A1')
+        >>> well_name(13)
+        (1, 'B2')
+        >>> well_name(96)
+        (2, 'A1')
+        >>> well_name(383, 384)
+        (1, 'P24')
+
+    Args:
+        index - the index of well from 0
+        plate - the number of wells of plate (96 or 384)
+
+    Return:
+        a tuple of plate number from 1 and well name (tuple(int, string))
+    """
+    try:
+        rows, columns = PLATE_FORMATS[plate]
+    except KeyError:
+        raise ValueError("Unknown plate format '%s'" % plate)
+    number, index = divmod(index, rows * columns)
+    row, column = divmod(index, columns)
+    return number + 1, '%s%d' % (chr(ord('A') + row), column + 1)
+
+def layout_plate(plan, plate=96):
+    """Lay out the pairs of plan on plates
+
+    The pairs are laid out in row major order of vectors x inserts and
+    the next plate is used when a plate is filled.
+
+    Args:
+        plan - the plan returned by plan_ligations
+        plate - the number of wells of plate (96 or 384)
+
+    Yield:
+        an ordered dictionary of plate, well, vector, insert, weights and
+        volumes of a pair (OrderedDict)
+    """
+    matrices = [(key, plan[key].ravel().tolist()) for key in (
+        'weight_vector', 'weight_insert', 'volume_vector', 'volume_insert',
+        'volume_mix')]
+    index = 0
+    for vector in plan.vectors:
+        for insert in plan.inserts:
+            number, well = well_name(index, plate)
+            record = OrderedDict((
+                ('plate', number),
+                ('well', well),
+                ('vector', vector),
+                ('insert', insert),
+            ))
+            for key, values in matrices:
+                record[key] = values[index]
+            yield record
+            index += 1
+
+def generate_plate_layout(vectors, inserts, plate=96, format='csv',
+        stream=None):
+    """Write plate layout of vectors and inserts
+
+    Args:
+        vectors - a list of tuple(name, size, concentration) of Vector DNA
+        inserts - a list of tuple(name, size, concentration) of Insert DNA
+        plate - the number of wells of plate (96 or 384)
+        format - the format of layout ('csv' or 'json')
+        stream - the file like object where the layout is written.
+            sys.stdout is used when None is specified.
+    """
+    stream = stream or sys.stdout
+    write = FORMAT_TABLE[format]
+    plan = plan_ligations(vectors, inserts)
+    with stage('render'):
+        header = True
+        for record in layout_plate(plan, plate):
+            write(stream, record, header)
+            header = False
+
+def read_samples(fi):
+    """Read name, size and concentration columns of sample sheet
+
+    Args:
+        fi - the file like object of sample sheet
+
+    Return:
+        a list of tuple(name, size, concentration) (list)
+    """
+    samples = []
+    for lineno, row in iter_sheet(fi):
+        try:
+            samples.append((row['name'], int(row['size']),
+                            float(row['concentration'])))
+        except (KeyError, TypeError, ValueError), e:
+            raise ValueError("line %d: %s: %s" %
+                             (lineno, e.__class__.__name__, e))
+    return samples
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    from calculator import calculate_required_weights
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            self.vectors = [('pUC19', 2700, 50.0), ('pET', 5400, 25.0)]
+            self.inserts = [('GFP', 720, 20.0), ('RFP', 540, 10.0),
+                            ('LacZ', 3000, 100.0)]
+        def test_plan_ligations(self):
+            plan = plan_ligations(self.vectors, self.inserts)
+            self.assertEquals(plan.vectors, ['pUC19', 'pET'])
+            self.assertEquals(plan.weight_vector.shape, (2, 3))
+            for i, (v, size_vector, conc_vector) in enumerate(self.vectors):
+                for j, (n, size_insert, conc_insert) in enumerate(
+                        self.inserts):
+                    weights = calculate_required_weights(size_vector,
+                                                         size_insert)
+                    self.assertAlmostEquals(plan.weight_vector[i,j],
+                                            weights[0])
+                    self.assertAlmostEquals(plan.weight_insert[i,j],
+                                            weights[1])
+                    volume = weights[0] / conc_vector + \
+                             weights[1] / conc_insert
+                    self.assertAlmostEquals(plan.volume_mix[i,j], volume)
+            self.assertTrue(np.allclose(plan.volume_total,
+                                        plan.volume_mix * 2))
+        def test_plan_ligations_invalid(self):
+            self.assertRaises(ValueError, plan_ligations, [], self.inserts)
+            self.assertRaises(ValueError, plan_ligations,
+                              [('pUC19', 2700, 0)], self.inserts)
+        def test_well_name(self):
+            self.assertEquals(well_name(11), (1, 'A12'))
+            self.assertEquals(well_name(95), (1, 'H12'))
+            self.assertEquals(well_name(384, 384), (2, 'A1'))
+            self.assertRaises(ValueError, well_name, 0, 24)
+        def test_layout_plate(self):
+            plan = plan_ligations(self.vectors * 20, self.inserts)
+            wells = list(layout_plate(plan, 96))
+            self.assertEquals(len(wells), 120)
+            self.assertEquals(wells[0].keys()[:4],
+                              ['plate', 'well', 'vector', 'insert'])
+            self.assertEquals((wells[4]['well'], wells[4]['vector'],
+                               wells[4]['insert']), ('A5', 'pET', 'RFP'))
+            self.assertEquals((wells[96]['plate'], wells[96]['well']),
+                              (2, 'A1'))
+            self.assertEquals(wells[4]['volume_mix'], plan.volume_mix[1,1])
+        def test_generate_plate_layout(self):
+            from StringIO import StringIO
+            stream = StringIO()
+            generate_plate_layout(self.vectors, self.inserts, 384,
+                                  stream=stream)
+            lines = stream.getvalue().splitlines()
+            self.assertEquals(len(lines), 7)
+            self.assertTrue(lines[0].startswith('plate,well,vector,insert'))
+            self.assertTrue(lines[1].startswith('1,A1,pUC19,GFP,50.0,'))
+        def test_read_samples(self):
+            from StringIO import StringIO
+            fi = StringIO("name,size,concentration\npUC19,2700,50\n")
+            self.assertEquals(read_samples(fi), [('pUC19', 2700, 50.0)])
+            fi = StringIO("name,size,concentration\npUC19,,50\n")
+            self.assertRaises(ValueError, read_samples, fi)
+
+    unittest.main()
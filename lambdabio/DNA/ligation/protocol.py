@@ -32,38 +32,77 @@ __author__  = 'Alisue <lambdalisue@hashnote.net>'
 __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
-from calculator import calculate_required_weights
-
-def _generate_protocol_rst(size_vector, size_insert, weight_vector,
-        weight_insert):
-
-    print "***********************************"
-    print " Ligation Protocols"
-    print "***********************************"
-    print
-    print "Information"
-    print "===================="
-    print "Vector DNA size: %d [bp]" % size_vector
-    print "Insert DNA size: %d [bp]" % size_insert
-    print "Required Vector DNA weight: %f [ng]" % weight_vector
-    print "Required Insert DNA weight: %f [ng]" % weight_insert
-    print
-    print "Material"
-    print "===================="
-    print "*   Purified, linearized Vector (likely in DW or EB):\tvolume adjust to %f [ng]" % weight_vector
-    print "*   Purified, linearized Insert (likely in DW or EB):\tvolume adjust to %f [ng]" % weight_insert
-    print "*   TAKARA DNA Ligation Kit <Mighty Mix>:\t\tvolume same as Vector and Insert DNA mix"
-    print
-    print "Procedure"
-    print "===================="
-    print "1.  Cool down PCR matchine to 16 [celsius]."
-    print "2.  Mix purified DNAs in 500 [ul] Tube."
-    print "3.  Add appropriate volume (usually the same volume as DNA mix) of Mighty Mix."
-    print "4.  Incubate 30 [min] at 16 [celcius] in PCR cool downed."
-    print "    .. NOTE:: In harry, use 5 [min] at 25 [celsius] for incubation."
-    print
-
-def generate_protocol(size_vector, size_insert, format='rst'):
+import sys
+from collections import OrderedDict
+from calculator import calculate_required_weights, \
+        calculate_required_vector_weight, calculate_required_weights_grid, \
+        INSERT_MOLAR_RATIO
+import planner
+from lambdabio.DNA.sheet import open_sheet, iter_sheet, run_sheet
+from lambdabio.DNA.instrument import stage, add_profile_options, profiling
+from lambdabio.DNA.cache import add_cache_options, caching
+from lambdabio.DNA.render import write_rst, write_json, write_csv, \
+        render_to_string
+
+PROTOCOL_RST_TEMPLATE = """\
+***********************************
+ Ligation Protocols
+***********************************
+
+Information
+====================
+Vector DNA size: %(size_vector)d [bp]
+Insert DNA size: %(size_insert)d [bp]
+Required Vector DNA weight: %(weight_vector)f [ng]
+Required Insert DNA weight: %(weight_insert)f [ng]
+%(ratio_line)s
+Material
+====================
+*   Purified, linearized Vector (likely in DW or EB):\tvolume adjust to %(weight_vector)f [ng]
+*   Purified, linearized Insert (likely in DW or EB):\tvolume adjust to %(weight_insert)f [ng]
+*   TAKARA DNA Ligation Kit <Mighty Mix>:\t\tvolume same as Vector and Insert DNA mix
+
+Procedure
+====================
+1.  Cool down PCR matchine to 16 [celsius].
+2.  Mix purified DNAs in 500 [ul] Tube.
+3.  Add appropriate volume (usually the same volume as DNA mix) of Mighty Mix.
+4.  Incubate 30 [min] at 16 [celcius] in PCR cool downed.
+    .. NOTE:: In harry, use 5 [min] at 25 [celsius] for incubation.
+
+"""
+
+RATIO_RST_TEMPLATE = """\
+Molar ratio of Vector and Insert: 1:%g
+"""
+
+def _generate_protocol_rst(stream, record, header=True, sweep=False):
+    # the ratio is shown only in sweeps or when it is not the default
+    # thus the default protocol is written as before
+    context = dict(record)
+    context['ratio_line'] = RATIO_RST_TEMPLATE % record['ratio'] \
+        if sweep or record['ratio'] != INSERT_MOLAR_RATIO else ''
+    write_rst(stream, PROTOCOL_RST_TEMPLATE, context)
+
+FORMAT_TABLE = {
+    'rst': _generate_protocol_rst,
+    'json': write_json,
+    'csv': write_csv,
+}
+"""Protocol writers of each format"""
+
+def _create_record(size_vector, size_insert, weight_vector, weight_insert,
+        ratio=INSERT_MOLAR_RATIO):
+    return OrderedDict((
+        ('size_vector', size_vector),
+        ('size_insert', size_insert),
+        ('weight_vector', weight_vector),
+        ('weight_insert', weight_insert),
+        ('ratio', ratio),
+    ))
+
+def generate_protocol(size_vector, size_insert, format='rst', stream=None,
+        header=True, ratio=INSERT_MOLAR_RATIO):
     """Generate protocol for Ligation of Vector and Insert
 
     A protocol generated is assumed to use TAKARA DNA Ligation
@@ -74,13 +113,96 @@ def generate_protocol(size_vector, size_insert, format='rst'):
     Args:
         size_vector - the size of Vector DNA in bp
         size_insert - the size of Insert DNA in bp
+        format - the format of protocol ('rst', 'json' or 'csv')
+        stream - the file like object where the protocol is written.
+            sys.stdout is used when None is specified.
+        header - write the CSV header row (csv format only)
+        ratio - the molar ratio of Insert to Vector
+    """
+    weights = calculate_required_weights(size_vector, size_insert, ratio)
+    record = _create_record(size_vector, size_insert, *weights, ratio=ratio)
+    with stage('render'):
+        FORMAT_TABLE[format](stream or sys.stdout, record, header)
+
+def generate_sweep_protocols(size_vector, size_insert, ratio,
+        weight_vector=None, format='rst', stream=None):
+    """Generate protocols for each point of a grid of ligation conditions
+
+    The weights of Insert are calculated at once with
+    calculate_required_weights_grid and protocols are written for every
+    combination of ratios, weights of Vector and sizes of Insert in this
+    order.
+
+    Args:
+        size_vector - the size of Vector DNA in bp
+        size_insert - the sizes of Insert DNA in bp (list)
+        ratio - the molar ratios of Insert to Vector (list)
+        weight_vector - the weights of Vector DNA in ng (list). the
+            weight calculated from size_vector is used when None is
+            specified.
+        format - the format of protocol ('rst', 'json' or 'csv')
+        stream - the file like object where protocols are written.
+            sys.stdout is used when None is specified.
+
+    Return:
+        a cube of weights of Insert in ng which shape is (ratios, weights
+        of Vector, sizes of Insert) (numpy.ndarray)
+    """
+    if weight_vector is None:
+        weight_vector = [calculate_required_vector_weight(size_vector)]
+    cube = calculate_required_weights_grid(size_vector, size_insert, ratio,
+                                           weight_vector)
+    stream = stream or sys.stdout
+    write = FORMAT_TABLE[format]
+    if write is _generate_protocol_rst:
+        def write(stream, record, header):
+            _generate_protocol_rst(stream, record, header, sweep=True)
+    header = True
+    with stage('render'):
+        for i, r in enumerate(ratio):
+            for j, w in enumerate(weight_vector):
+                for k, n in enumerate(size_insert):
+                    record = _create_record(size_vector, n, w,
+                                            float(cube[i,j,k]), r)
+                    write(stream, record, header)
+                    header = False
+    return cube
+
+def render_protocol(size_vector, size_insert, format='rst'):
+    """Render protocol for Ligation of Vector and Insert as a string
+
+    See generate_protocol for detail.
     """
-    FORMAT_TABLE = {
-        'rst': _generate_protocol_rst,
-    }
-    weights = calculate_required_weights(size_vector, size_insert)
-    FORMAT_TABLE[format](size_vector, size_insert, *weights)
-    
+    return render_to_string(generate_protocol, size_vector, size_insert,
+                            format)
+
+def generate_protocols_from_sheet(fi, format='rst', stream=None,
+        errors=sys.stderr):
+    """Generate protocols for each row of sample sheet
+
+    The sample sheet is a CSV/TSV file which has 'vector', 'insert' and
+    optional 'ratio' (molar ratio of Insert to Vector) columns. Rows are
+    processed one by one and errors of a row are
+    written to the errors stream without aborting.
+
+    Args:
+        fi - the file like object of sample sheet
+        format - the format of protocol
+        stream - the file like object where protocols are written.
+            sys.stdout is used when None is specified.
+        errors - the stream where errors are written
+
+    Return:
+        a tuple of the number of succeeded and failed rows (tuple(int, int))
+    """
+    state = dict(header=True)
+    def _generate(row):
+        ratio = float(row['ratio']) if row.get('ratio') \
+                else INSERT_MOLAR_RATIO
+        generate_protocol(int(row['vector']), int(row['insert']), format,
+                          stream, state['header'], ratio)
+        state['header'] = False
+    return run_sheet(iter_sheet(fi), _generate, errors)
 
 def main():
     def _to_num(x):
@@ -95,9 +217,84 @@ def main():
     parser.add_option('-i', '--insert', dest='insert', default=None, type='int',
             help="the size of Insert in [bp] for ligation.")
     parser.add_option('-f', '--format', dest='format', default='rst',
-            help="the format of protocol. currentry support 'rst' only.")
+            help="the format of protocol. 'rst', 'json' or 'csv'.")
+    parser.add_option('-b', '--batch', dest='batch', default=None,
+            help="the CSV/TSV sample sheet which has 'vector' and 'insert'"
+                 " columns ('-' for stdin). protocols of all rows are"
+                 " generated without prompt.")
+    parser.add_option('--vectors', dest='vectors', default=None,
+            help="the CSV/TSV sample sheet of Vectors which has 'name',"
+                 " 'size' and 'concentration' (of stock solution in"
+                 " [ng/ul]) columns. all pairs with --inserts are laid out"
+                 " on plates in csv (or json with -f json).")
+    parser.add_option('--inserts', dest='inserts', default=None,
+            help="the CSV/TSV sample sheet of Inserts (see --vectors).")
+    parser.add_option('-p', '--plate', dest='plate', type='int', default=96,
+            help="the number of wells of plate. 96 or 384.")
+    parser.add_option('-r', '--ratios', dest='ratios', default=None,
+            help="the comma separated molar ratios of Insert to Vector"
+                 " (e.g. 1,3,6,10). protocols of all combinations with"
+                 " --vector-weights and --insert-sizes are generated.")
+    parser.add_option('--vector-weights', dest='vector_weights',
+            default=None,
+            help="the comma separated weights of Vector in [ng] for"
+                 " --ratios. the weight calculated from the size of"
+                 " Vector is used when it is not specified.")
+    parser.add_option('--insert-sizes', dest='insert_sizes', default=None,
+            help="the comma separated sizes of Insert in [bp] for"
+                 " --ratios. the size of Insert is used when it is not"
+                 " specified.")
+    add_profile_options(parser)
+    add_cache_options(parser)
     opts, args = parser.parse_args()
 
+    if opts.format not in FORMAT_TABLE:
+        parser.error("Unknown format '%s'" % opts.format)
+    if opts.vectors or opts.inserts:
+        if not (opts.vectors and opts.inserts):
+            parser.error("Both --vectors and --inserts are required")
+        if opts.plate not in planner.PLATE_FORMATS:
+            parser.error("Unknown plate format '%s'" % opts.plate)
+        format = opts.format if opts.format in planner.FORMAT_TABLE \
+                else 'csv'
+        with profiling(opts), caching(opts):
+            try:
+                vectors = planner.read_samples(open_sheet(opts.vectors))
+                inserts = planner.read_samples(open_sheet(opts.inserts))
+            except ValueError, e:
+                parser.error(str(e))
+            planner.generate_plate_layout(vectors, inserts, opts.plate,
+                                          format)
+        return
+    if opts.ratios:
+        def _to_list(x, type=float):
+            try:
+                return [type(v) for v in x.split(',')]
+            except ValueError:
+                parser.error("Invalid list '%s'" % x)
+        if opts.vector is None:
+            parser.error("The size of Vector (-v) is required")
+        if opts.insert_sizes:
+            sizes = _to_list(opts.insert_sizes, int)
+        elif opts.insert is not None:
+            sizes = [opts.insert]
+        else:
+            parser.error("The size of Insert (-i or --insert-sizes) is "
+                         "required")
+        weights = opts.vector_weights and _to_list(opts.vector_weights)
+        with profiling(opts), caching(opts):
+            generate_sweep_protocols(opts.vector, sizes,
+                                     _to_list(opts.ratios), weights or None,
+                                     opts.format)
+        return
+    if opts.batch:
+        with profiling(opts), caching(opts):
+            succeeded, failed = generate_protocols_from_sheet(
+                open_sheet(opts.batch), opts.format)
+        sys.stderr.write("%d protocols are generated, %d rows are failed.\n"
+                         % (succeeded, failed))
+        sys.exit(1 if failed else 0)
+
     while opts.vector is None:
         opts.vector = raw_input("Please input the size of Vector in [bp]> ")
         opts.vector = _to_num(opts.vector)
@@ -105,7 +302,8 @@ def main():
         opts.insert = raw_input("Please input the size of Insert in [bp]> ")
         opts.insert = _to_num(opts.insert)
 
-    generate_protocol(opts.vector, opts.insert, opts.format)
+    with profiling(opts), caching(opts):
+        generate_protocol(opts.vector, opts.insert, opts.format)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Protocol rendering module
+
+Helpers shared by protocol modules to write protocols into any file
+like object instead of printing them line by line. A protocol is
+represented as an ordered dictionary (record) and written as
+
+    rst  - the precompiled template filled with the record
+    json - a JSON object per line (JSON Lines)
+    csv  - a row per protocol (the header is written when requested)
+
+Methods:
+    write_rst - Write record with template
+    write_json - Write record as a JSON object in a line
+    write_csv - Write record as a CSV row
+    render_to_string - Call protocol generator and return the output
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import csv
+import json
+from cStringIO import StringIO
+
+def write_rst(stream, template, record, header=True):
+    """Write record with template (header is ignored)"""
+    stream.write(template % record)
+
+def write_json(stream, record, header=True):
+    """Write record as a JSON object in a line (header is ignored)"""
+    stream.write(json.dumps(record))
+    stream.write('\n')
+
+def write_csv(stream, record, header=True):
+    """Write record as a CSV row
+
+    Args:
+        stream - the file like object
+        record - the ordered dictionary
+        header - write the keys of record as a header row before
+    """
+    writer = csv.writer(stream, lineterminator='\n')
+    if header:
+        writer.writerow(record.keys())
+    writer.writerow(record.values())
+
+def render_to_string(generate, *args, **kwargs):
+    """Call protocol generator and return the output as a string
+
+    Args:
+        generate - the protocol generator which accepts stream keyword
+        args, kwargs - the arguments passed to the generator
+
+    Return:
+        the output (string)
+    """
+    stream = StringIO()
+    generate(*args, stream=stream, **kwargs)
+    return stream.getvalue()
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            from collections import OrderedDict
+            self.record = OrderedDict((('name', 'EcoR I'), ('units', 1.5)))
+        def test_write_rst(self):
+            stream = StringIO()
+            write_rst(stream, "%(name)s: %(units)f\n", self.record)
+            self.assertEquals(stream.getvalue(), "EcoR I: 1.500000\n")
+        def test_write_json(self):
+            stream = StringIO()
+            write_json(stream, self.record)
+            write_json(stream, self.record)
+            self.assertEquals(stream.getvalue(),
+                '{"name": "EcoR I", "units": 1.5}\n' * 2)
+        def test_write_csv(self):
+            stream = StringIO()
+            write_csv(stream, self.record)
+            write_csv(stream, self.record, header=False)
+            self.assertEquals(stream.getvalue(),
+                'name,units\nEcoR I,1.5\nEcoR I,1.5\n')
+        def test_render_to_string(self):
+            def generate(name, stream=None):
+                stream.write(name)
+            self.assertEquals(render_to_string(generate, 'EcoR I'), 'EcoR I')
+
+    unittest.main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""gzip and BGZF compressed file module
+
+Read gzip compressed files as a stream of decompressed chunks and BGZF
+(blocked gzip, produced by bgzip) files at random offsets. A BGZF file is
+a series of gzip members (blocks) which hold at most 64 KB of data each,
+thus a range of decompressed bytes is read by seeking to the block which
+contains the first byte and inflating only the blocks of the range. The
+blocks are located with the .gzi index (written by `bgzip -i`) or by
+walking the block headers when the index is missing.
+
+Methods:
+    is_gzip - Return True when the file is gzip compressed
+    is_bgzf - Return True when the file is BGZF compressed
+    read_gzi - Read the block offsets of BGZF file from .gzi index
+    write_bgzf - Write BGZF file and its .gzi index
+    iter_gzip_chunks - Iterate decompressed chunks of gzip file
+
+Classes:
+    BgzfFile - Random access reader of BGZF file
+
+Data:
+    GZIP_MAGIC - the magic bytes of gzip file
+    DEFAULT_CHUNK_SIZE - the default size of compressed chunk in bytes
+    BGZF_BLOCK_SIZE - the size of decompressed data in a block
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import os
+import zlib
+import struct
+from bisect import bisect_right
+
+GZIP_MAGIC = '\x1f\x8b'
+"""The magic bytes of gzip file"""
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+"""The default size of compressed chunk in bytes"""
+
+BGZF_BLOCK_SIZE = 0xff00
+"""The size of decompressed data in a block (the same as bgzip)"""
+
+# The fixed part of gzip member header which has the extra field and the
+# 'BC' subfield of BGZF
+BGZF_HEADER = struct.Struct('<4sIBBH')
+BGZF_HEADER_FLAGS = '\x1f\x8b\x08\x04'
+
+def is_gzip(filename):
+    """Return True when the file is gzip compressed"""
+    with open(filename, 'rb') as fi:
+        return fi.read(2) == GZIP_MAGIC
+
+def _read_block_size(fi):
+    # read the header of BGZF block and return the total size of block.
+    # None is returned at the end of file and ValueError is raised when
+    # the block is not BGZF
+    header = fi.read(BGZF_HEADER.size)
+    if not header:
+        return None
+    if len(header) < BGZF_HEADER.size:
+        raise ValueError("Truncated BGZF block header")
+    magic, mtime, xfl, os_, xlen = BGZF_HEADER.unpack(header)
+    if magic != BGZF_HEADER_FLAGS:
+        raise ValueError("Not a BGZF block")
+    extra = fi.read(xlen)
+    pos = 0
+    while pos + 4 <= len(extra):
+        si, slen = extra[pos:pos+2], struct.unpack('<H', extra[pos+2:pos+4])[0]
+        if si == 'BC' and slen == 2:
+            return struct.unpack('<H', extra[pos+4:pos+6])[0] + 1
+        pos += 4 + slen
+    raise ValueError("Not a BGZF block")
+
+def is_bgzf(filename):
+    """Return True when the file is BGZF compressed"""
+    with open(filename, 'rb') as fi:
+        try:
+            return _read_block_size(fi) is not None
+        except ValueError:
+            return False
+
+def read_gzi(filename):
+    """Read the block offsets of BGZF file from .gzi index
+
+    Args:
+        filename - the path of .gzi index
+
+    Return:
+        a list of tuple(compressed offset, decompressed offset) of each
+        block except the first one (list)
+    """
+    with open(filename, 'rb') as fi:
+        data = fi.read()
+    n = struct.unpack('<Q', data[:8])[0]
+    offsets = struct.unpack('<%dQ' % (n * 2), data[8:8+n*16])
+    return zip(offsets[0::2], offsets[1::2])
+
+def _write_block(fo, data):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -zlib.MAX_WBITS)
+    cdata = compressor.compress(data) + compressor.flush()
+    fo.write(BGZF_HEADER.pack(BGZF_HEADER_FLAGS, 0, 0, 255, 6))
+    # BSIZE is the total size of block - 1
+    fo.write(struct.pack('<2sHH', 'BC', 2, BGZF_HEADER.size + 6 +
+                         len(cdata) + 8 - 1))
+    fo.write(cdata)
+    fo.write(struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
+
+def write_bgzf(filename, chunks, block_size=BGZF_BLOCK_SIZE, index=True):
+    """Write BGZF file and its .gzi index
+
+    Args:
+        filename - the path of BGZF file
+        chunks - the data (string) or an iterable of strings
+        block_size - the size of decompressed data in a block
+        index - write the .gzi index as <filename>.gzi when True
+    """
+    if isinstance(chunks, basestring):
+        chunks = [chunks]
+    offsets = []
+    position = 0
+    buffer = ''
+    with open(filename, 'wb') as fo:
+        for chunk in chunks:
+            buffer += chunk
+            pos = 0
+            while len(buffer) - pos >= block_size:
+                if position:
+                    offsets.append((fo.tell(), position))
+                _write_block(fo, buffer[pos:pos+block_size])
+                position += block_size
+                pos += block_size
+            buffer = buffer[pos:]
+        if buffer:
+            if position:
+                offsets.append((fo.tell(), position))
+            _write_block(fo, buffer)
+        # the empty block as the end of file marker
+        _write_block(fo, '')
+    if index:
+        with open(filename + '.gzi', 'wb') as fo:
+            fo.write(struct.pack('<Q', len(offsets)))
+            for offset in offsets:
+                fo.write(struct.pack('<QQ', *offset))
+
+def iter_gzip_chunks(fi, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate decompressed chunks of gzip file
+
+    The file is read and decompressed in chunks of chunk_size bytes thus
+    the whole file is never decompressed in memory. Multi member files
+    (e.g. BGZF) are supported as well.
+
+    Args:
+        fi - the file like object of gzip file
+        chunk_size - the size of compressed chunk in bytes
+
+    Yield:
+        decompressed chunks (string)
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    while True:
+        data = fi.read(chunk_size)
+        if not data:
+            break
+        while data:
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            data = decompressor.unused_data
+            if data:
+                # the next member
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+class BgzfFile(object):
+    """Random access reader of BGZF file
+
+    Usage:
+        >>> with BgzfFile('genome.fa.gz') as fi:
+        ...     data = ''.join(fi.iter_range(1000000, 2000000))
+    """
+    def __init__(self, filename):
+        """Construct reader
+
+        The block offsets are read from <filename>.gzi when it exists,
+        otherwise they are collected by walking the block headers.
+
+        Args:
+            filename - the path of BGZF file
+        """
+        self.filename = filename
+        self._fi = open(filename, 'rb')
+        gzi = filename + '.gzi'
+        if os.path.exists(gzi):
+            offsets = [(0, 0)] + read_gzi(gzi)
+        else:
+            offsets = self._walk()
+        self._compressed = [c for c, u in offsets]
+        self._decompressed = [u for c, u in offsets]
+
+    def _walk(self):
+        # collect the offsets of blocks from the block headers. the
+        # decompressed size of a block is stored in its last 4 bytes
+        fi = self._fi
+        offsets = []
+        compressed = decompressed = 0
+        while True:
+            fi.seek(compressed)
+            size = _read_block_size(fi)
+            if size is None:
+                break
+            offsets.append((compressed, decompressed))
+            fi.seek(compressed + size - 4)
+            decompressed += struct.unpack('<I', fi.read(4))[0]
+            compressed += size
+        return offsets or [(0, 0)]
+
+    def _read_block(self):
+        # read and decompress the block at the current position
+        fi = self._fi
+        begin = fi.tell()
+        size = _read_block_size(fi)
+        if size is None:
+            return None
+        fi.seek(begin)
+        block = fi.read(size)
+        xlen = struct.unpack('<H', block[10:12])[0]
+        return zlib.decompress(block[12+xlen:-8], -zlib.MAX_WBITS)
+
+    def iter_range(self, begin, end=None):
+        """Iterate decompressed chunks of the range
+
+        Only the blocks which have the bytes of the range are read and
+        decompressed.
+
+        Args:
+            begin - the decompressed offset of the first byte
+            end - the decompressed offset after the last byte. the range
+                runs to the end of file when None is specified.
+
+        Yield:
+            decompressed chunks of at most a block (string)
+        """
+        j = max(bisect_right(self._decompressed, begin) - 1, 0)
+        self._fi.seek(self._compressed[j])
+        position = self._decompressed[j]
+        while end is None or position < end:
+            block = self._read_block()
+            if block is None:
+                break
+            chunk = block[max(begin - position, 0):
+                          None if end is None else end - position]
+            position += len(block)
+            if chunk:
+                yield chunk
+
+    def close(self):
+        self._fi.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import random
+            import tempfile
+            random.seed(11)
+            self.directory = tempfile.mkdtemp()
+            self.data = ''.join(random.choice('ACGT\n') for i in xrange(1234))
+        def tearDown(self):
+            import shutil
+            shutil.rmtree(self.directory)
+        def test_iter_gzip_chunks(self):
+            import gzip
+            filename = os.path.join(self.directory, 'a.gz')
+            fo = gzip.open(filename, 'wb')
+            fo.write(self.data)
+            fo.close()
+            self.assertTrue(is_gzip(filename))
+            self.assertFalse(is_bgzf(filename))
+            with open(filename, 'rb') as fi:
+                self.assertEquals(''.join(iter_gzip_chunks(fi, 10)),
+                                  self.data)
+            filename = os.path.join(self.directory, 'b.gz')
+            write_bgzf(filename, self.data, 100, False)
+            with open(filename, 'rb') as fi:
+                self.assertEquals(''.join(iter_gzip_chunks(fi, 7)),
+                                  self.data)
+        def test_bgzf_file(self):
+            for gzi in (False, True):
+                filename = os.path.join(self.directory, 'c%d.gz' % gzi)
+                write_bgzf(filename, [self.data[:150], self.data[150:]],
+                           100, gzi)
+                self.assertTrue(is_bgzf(filename))
+                with BgzfFile(filename) as fi:
+                    for begin, end in ((0, 10), (95, 205), (100, 200),
+                                       (1200, 1234), (1200, 2000),
+                                       (300, None), (0, None)):
+                        self.assertEquals(''.join(fi.iter_range(begin, end)),
+                                          self.data[begin:end])
+            self.assertEquals([u for c, u in read_gzi(filename + '.gzi')],
+                              range(100, 1300, 100))
+
+    unittest.main()
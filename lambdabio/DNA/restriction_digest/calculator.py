@@ -5,9 +5,12 @@
 Methods:
     convert_weight_to_molar - Convert weight in [g] to molar
     calculate_molecular_weight - Calculate DNA molecular weight via size
+    calculate_sequence_molecular_weight - Calculate exact molecular weight
+    calculate_fragment_molecular_weights - Calculate exact molecular weights of fragments
     calculate_site_molar - Calculate site molar in solution
     calculate_unit_activity - Calculate enzyme unit activity
     calculate_unit_required - Calculate unit required to cut DNA
+    calculate_unit_required_matrix - Calculate units and volumes required for samples x enzymes
 
 
 Copyright:
@@ -30,9 +33,40 @@ __author__  = 'Alisue <lambdalisue@hashnote.net>'
 __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
+from lambdabio.DNA.cache import memoize
+from numbers import Number
+from lambdabio.DNA.instrument import instrument
+
 # The average molecular weight of base pair in double strand DNA
 BASE_PAIR_MOLECULAR_WEIGHT = 660
 
+# The molecular weights of nucleotides in DNA strand (anhydrous
+# deoxynucleoside monophosphates). degenerate bases use the average of
+# the bases they represent
+NUCLEOTIDE_MOLECULAR_WEIGHTS = {
+    'A': 313.21,
+    'C': 289.18,
+    'G': 329.21,
+    'T': 304.20,
+}
+
+# The correction of a linear strand with 5'-OH terminal (-HPO3 + H2O)
+STRAND_TERMINAL_CORRECTION = -61.96
+
+# The molecular weight of 5'-phosphate (HPO3)
+PHOSPHATE_MOLECULAR_WEIGHT = 79.98
+
+# IUPAC nucleotide codes and complements
+IUPAC_CODES = {
+    'A': 'A', 'C': 'C', 'G': 'G', 'T': 'T',
+    'R': 'AG', 'Y': 'CT', 'S': 'CG', 'W': 'AT', 'K': 'GT', 'M': 'AC',
+    'B': 'CGT', 'D': 'AGT', 'H': 'ACT', 'V': 'ACG', 'N': 'ACGT',
+}
+IUPAC_COMPLEMENTS = dict(zip('ACGTRYSWKMBDHVN', 'TGCAYRSWMKVHDBN'))
+
+# The excess of enzyme units used in protocols (3-fold)
+REQUIRED_UNIT_EXCESS = 3
+
 def convert_weight_to_molar(mw, weight=1):
     """Convert weight to molar
     
@@ -42,34 +76,155 @@ def convert_weight_to_molar(mw, weight=1):
                        x = 1 * weight / mw
 
     Args:
-        mw - the molecular weight
+        mw - the molecular weight (number or numpy.ndarray)
         weight - the weight in [g]
 
     Returns:
-        converted molar (float)
+        converted molar (float or numpy.ndarray)
     """
-    if not isinstance(mw, float):
+    if not isinstance(mw, float) and isinstance(mw, Number):
         mw = float(mw)
     return weight / mw
 
 def calculate_molecular_weight(size):
     """"Calculate molecular weight of DNA via DNA size in [bp]
+
+    The exact molecular weight of double strand DNA is calculated with
+    calculate_sequence_molecular_weight when the sequence is specified.
     
     Args:
-        size - the size of a DNA in [bp]
+        size - the size of a DNA in [bp] or the sequence of DNA (string)
 
     Return:
         Mw (float) - the calculated molecular weight
     """
+    if isinstance(size, basestring):
+        return calculate_sequence_molecular_weight(size)
     return size * BASE_PAIR_MOLECULAR_WEIGHT
 
+_WEIGHT_TABLES = {}
+def _compile_weight_table(double_strand):
+    # return the molecular weight of each byte (uint8) as a numpy array.
+    # the weight is NaN for bytes which are not nucleotide codes
+    import numpy as np
+    table = _WEIGHT_TABLES.get(double_strand)
+    if table is None:
+        def _weight(code):
+            bases = IUPAC_CODES[code]
+            return sum(NUCLEOTIDE_MOLECULAR_WEIGHTS[b] for b in bases) / \
+                float(len(bases))
+        table = np.empty(256, dtype=np.float64)
+        table.fill(np.nan)
+        for code in IUPAC_CODES:
+            weight = _weight(code)
+            if double_strand:
+                weight += _weight(IUPAC_COMPLEMENTS[code])
+            table[ord(code)] = table[ord(code.lower())] = weight
+        _WEIGHT_TABLES[double_strand] = table
+    return table
+
+def _terminal_correction(double_strand, phosphate):
+    correction = STRAND_TERMINAL_CORRECTION
+    if phosphate:
+        correction += PHOSPHATE_MOLECULAR_WEIGHT
+    return correction * 2 if double_strand else correction
+
+def _view_sequence(sequence):
+    # return the sequence as a uint8 array without copy
+    import numpy as np
+    if isinstance(sequence, np.ndarray):
+        return sequence.view(np.uint8)
+    return np.frombuffer(sequence, dtype=np.uint8)
+
+def calculate_sequence_molecular_weight(sequence, double_strand=True,
+        phosphate=False, circular=False):
+    """Calculate exact molecular weight of DNA via the sequence
+
+    The bases are counted on the raw bytes of the sequence at once and
+    the molecular weight is calculated as:
+
+        Mw = sum(<count of base> * <weight of base>) + <terminal>
+
+    where the terminal correction is -61.96 for a strand with 5'-OH and
+    +79.98 more for a strand with 5'-phosphate (e.g. DNA digested by
+    restriction enzymes). A circular DNA has no terminal.
+
+    Args:
+        sequence - the sequence of DNA (string, buffer or numpy array of
+            bytes). IUPAC degenerate codes are allowed.
+        double_strand - calculate the weight of double strand DNA
+        phosphate - the strands have 5'-phosphate
+        circular - the DNA is circular
+
+    Return:
+        Mw (float) - the calculated molecular weight
+    """
+    import numpy as np
+    counts = np.bincount(_view_sequence(sequence), minlength=256)
+    table = _compile_weight_table(double_strand)
+    used = counts > 0
+    weights = table[used]
+    if np.isnan(weights).any():
+        invalid = ''.join(chr(i) for i in np.flatnonzero(used)
+                          if np.isnan(table[i]))
+        raise ValueError("Invalid nucleotide codes %r are found." % invalid)
+    mw = float(np.dot(counts[used], weights))
+    if not circular and used.any():
+        mw += _terminal_correction(double_strand, phosphate)
+    return mw
+
+def calculate_fragment_molecular_weights(sequence, positions,
+        double_strand=True, phosphate=True, circular=False):
+    """Calculate exact molecular weights of fragments at once
+
+    Fragments are split at the cut positions on the top strand and the
+    weights of all fragments are summed with numpy.add.reduceat over the
+    weights of bases, thus the cost per fragment is constant. Overhangs
+    of sticky ends are not taken into account. Fragments of digested
+    DNA have 5'-phosphate by default.
+
+    Args:
+        sequence - the sequence of DNA (string, buffer or numpy array of
+            bytes)
+        positions - the sorted cut positions (array like)
+        double_strand - calculate the weights of double strand DNA
+        phosphate - the strands have 5'-phosphate
+        circular - the DNA is circular. the last fragment is joined to
+            the first fragment.
+
+    Return:
+        the molecular weights of fragments in the order of the sequence
+        (the same order as index.calculate_fragment_sizes) (numpy.ndarray)
+    """
+    import numpy as np
+    view = _view_sequence(sequence)
+    size = len(view)
+    if not size:
+        return np.zeros(0, dtype=np.float64)
+    weights = _compile_weight_table(double_strand)[view]
+    if np.isnan(weights).any():
+        raise ValueError("Invalid nucleotide codes are found.")
+    cuts = np.unique(np.asarray(positions, dtype=np.intp))
+    if circular:
+        cuts = cuts[(cuts >= 0) & (cuts < size)]
+        if not len(cuts):
+            return np.array([weights.sum()])
+        mws = np.add.reduceat(weights, cuts)
+        # the fragment across the origin
+        mws[-1] += weights[:cuts[0]].sum()
+    else:
+        cuts = cuts[(cuts > 0) & (cuts < size)]
+        mws = np.add.reduceat(weights, np.concatenate(([0], cuts)))
+    return mws + _terminal_correction(double_strand, phosphate)
+
 def calculate_site_molar(n, weight, size):
     """Calculate restriction site molar in solution.
     
     Args:
         n - the number of restriction sites per DNA
         weight - the total DNA mass in solution.
-        size - the size of DNA in bp.
+        size - the size of DNA in bp or the sequence of DNA for the exact
+            molecular weight.
 
     Return:
         molar (float) - the molar of restriction site in soltion
@@ -91,6 +246,8 @@ def calculate_unit_activity(enzyme):
     return calculate_site_molar(enzyme.substrate.sites, 1,
             enzyme.substrate.size)
 
+@instrument('unit_calculation')
+@memoize
 def calculate_unit_required(sites, size, weight, enzyme):
     """Calculate unit required to cut all restriction sites in DNA
     
@@ -121,41 +278,165 @@ def calculate_unit_required(sites, size, weight, enzyme):
     return sites * weight * enzyme.substrate.size / \
         float(enzyme.substrate.sites * size)
 
-# --- unittest
-import unittest
-class TestCase(unittest.TestCase):
-    def test_convert_weight_to_molar(self):
-        mw = 100
-        weight = 50
-        molar = convert_weight_to_molar(mw, weight)
-        self.assertEquals(molar, 0.5)
-    def test_calculate_molecular_weight(self):
-        size = 100
-        mw = calculate_molecular_weight(size)
-        self.assertEquals(mw, size * BASE_PAIR_MOLECULAR_WEIGHT)
-    def test_calculate_site_molar(self):
-        n = 1
-        weight = 100
-        size = 100
-        mw = calculate_molecular_weight(size)
-        molar = convert_weight_to_molar(mw, weight)
-        site_molar = calculate_site_molar(n, weight, size)
-        self.assertEquals(site_molar, n * molar)
-    def test_calculate_unit_activity(self):
-        import enzyme
-        # EcoR I(self): 5 sites in lambda DNA(48,502)
-        site_molar = calculate_site_molar(5, 1, 48502)
-        unit_activity = calculate_unit_activity(enzyme.EcoRI)
-        self.assertEquals(unit_activity, site_molar)
-    def test_calculate_unit_required(self):
-        import enzyme
-        n = 1
-        weight = 100
-        size = 100
-        site_molar = calculate_site_molar(n, weight, size)
-        unit_activity = calculate_unit_activity(enzyme.EcoRI)
-        unit_required = calculate_unit_required(n, weight, size, enzyme.EcoRI)
-        self.assertEquals(unit_required, site_molar / unit_activity)
+@instrument('unit_calculation')
+def calculate_unit_required_matrix(sites, size, weight, enzymes,
+        excess=REQUIRED_UNIT_EXCESS):
+    """Calculate units and volumes of enzymes required for samples at once
+
+    Calculate calculate_unit_required for every sample and enzyme
+    combination with the excess and convert the units to the volumes of
+    enzyme solution.
 
+    Args:
+        sites - the number of sites in DNA. the shape is (samples,) when
+            the number is common to all enzymes, otherwise
+            (samples, enzymes) (number or array like)
+        size - the sizes of DNA in bp (samples,) (number or array like)
+        weight - the weights of DNA in [ug] (samples,) (number or array
+            like)
+        enzymes - a list of the instance of enzyme
+        excess - the excess of units
+
+    Return:
+        a tuple of units and volumes in [ul] which shapes are
+        (samples, enzymes). a number is treated as a single sample
+        (tuple(numpy.ndarray, numpy.ndarray))
+    """
+    import numpy as np
+    substrate_size = np.array([e.substrate.size for e in enzymes],
+                              dtype=np.float64)
+    substrate_sites = np.array([e.substrate.sites for e in enzymes],
+                               dtype=np.float64)
+    concentration = np.array([e.concentration for e in enzymes],
+                             dtype=np.float64)
+    sites = np.atleast_1d(np.asarray(sites, dtype=np.float64))
+    if sites.ndim == 1:
+        sites = sites[:,np.newaxis]
+    size = np.atleast_1d(np.asarray(size, dtype=np.float64))[:,np.newaxis]
+    weight = np.atleast_1d(np.asarray(weight,
+                                      dtype=np.float64))[:,np.newaxis]
+    units = excess * sites * weight * substrate_size / \
+        (substrate_sites * size)
+    return units, units / concentration
+
+# --- unittest
 if __name__ == '__main__':
+    import unittest
+    import numpy as np
+    class TestCase(unittest.TestCase):
+        def test_convert_weight_to_molar(self):
+            mw = 100
+            weight = 50
+            molar = convert_weight_to_molar(mw, weight)
+            self.assertEquals(molar, 0.5)
+        def test_calculate_molecular_weight(self):
+            size = 100
+            mw = calculate_molecular_weight(size)
+            self.assertEquals(mw, size * BASE_PAIR_MOLECULAR_WEIGHT)
+        def test_calculate_sequence_molecular_weight(self):
+            # 5'-OH single strand oligo (A, C, G, T)
+            mw = calculate_sequence_molecular_weight('ACGT',
+                                                     double_strand=False)
+            self.assertAlmostEquals(mw, 313.21 + 289.18 + 329.21 + 304.20
+                                        - 61.96)
+            mw5p = calculate_sequence_molecular_weight('acgt',
+                    double_strand=False, phosphate=True)
+            self.assertAlmostEquals(mw5p - mw, 79.98)
+            # double strand of palindrome is twice of single strand
+            mw = calculate_sequence_molecular_weight('GAATTC')
+            self.assertAlmostEquals(mw, calculate_sequence_molecular_weight(
+                'GAATTC', double_strand=False) * 2)
+            # N is the average of ACGT and its complement is N
+            mw = calculate_sequence_molecular_weight('N', circular=True)
+            self.assertAlmostEquals(mw, sum(
+                NUCLEOTIDE_MOLECULAR_WEIGHTS.values()) / 2)
+            self.assertRaises(ValueError,
+                              calculate_sequence_molecular_weight, 'ACGU')
+            # close to the average of base pair
+            mw = calculate_molecular_weight('ACGT' * 1000)
+            self.assertTrue(abs(mw / 4000 - BASE_PAIR_MOLECULAR_WEIGHT) < 50)
+        def test_calculate_fragment_molecular_weights(self):
+            import random
+            from index import calculate_fragment_sizes
+            rng = random.Random(0)
+            sequence = ''.join(rng.choice('ACGT') for i in xrange(1000))
+            positions = [5, 100, 100, 640]
+            for circular in (False, True):
+                mws = calculate_fragment_molecular_weights(sequence,
+                        positions, circular=circular)
+                sizes = calculate_fragment_sizes(positions, 1000, circular)
+                self.assertEquals(len(mws), len(sizes))
+                cuts = [0, 5, 100, 640, 1000]
+                fragments = [sequence[b:e] for b, e in zip(cuts, cuts[1:])]
+                if circular:
+                    fragments = fragments[1:-1] + [fragments[-1] + fragments[0]]
+                for mw, fragment in zip(mws, fragments):
+                    self.assertAlmostEquals(mw,
+                        calculate_sequence_molecular_weight(fragment,
+                                                            phosphate=True))
+            mws = calculate_fragment_molecular_weights(sequence, [],
+                                                       circular=True)
+            self.assertAlmostEquals(mws[0],
+                calculate_sequence_molecular_weight(sequence, circular=True))
+            # molar of fragments at once
+            molars = convert_weight_to_molar(mws, 1e-6)
+            self.assertEquals(molars.shape, (1,))
+        def test_calculate_site_molar_with_sequence(self):
+            sequence = 'GAATTC' * 100
+            molar = calculate_site_molar(1, 1e-6, sequence)
+            self.assertAlmostEquals(molar, 1e-6 /
+                                    calculate_sequence_molecular_weight(sequence))
+        def test_calculate_site_molar(self):
+            n = 1
+            weight = 100
+            size = 100
+            mw = calculate_molecular_weight(size)
+            molar = convert_weight_to_molar(mw, weight)
+            site_molar = calculate_site_molar(n, weight, size)
+            self.assertEquals(site_molar, n * molar)
+        def test_calculate_unit_activity(self):
+            import enzyme
+            # EcoR I(self): 5 sites in lambda DNA(48,502)
+            site_molar = calculate_site_molar(5, 1, 48502)
+            unit_activity = calculate_unit_activity(enzyme.EcoRI)
+            self.assertEquals(unit_activity, site_molar)
+        def test_calculate_unit_required(self):
+            import enzyme
+            n = 1
+            weight = 100
+            size = 100
+            site_molar = calculate_site_molar(n, weight, size)
+            unit_activity = calculate_unit_activity(enzyme.EcoRI)
+            unit_required = calculate_unit_required(n, weight, size, enzyme.EcoRI)
+            self.assertEquals(unit_required, site_molar / unit_activity)
+        def test_calculate_unit_required_matrix(self):
+            import enzyme
+            enzymes = [e() for name, e in enzyme.AVARIABLE_ENZYME_LIST]
+            sites = [[1, 2, 3, 4], [5, 6, 7, 8]]
+            size = [3000, 5000]
+            weight = [0.5, 1.0]
+            units, volumes = calculate_unit_required_matrix(sites, size, weight,
+                    enzymes)
+            self.assertEquals(units.shape, (2, 4))
+            for i in xrange(2):
+                for j, e in enumerate(enzymes):
+                    expected = calculate_unit_required(sites[i][j], size[i],
+                            weight[i], e) * REQUIRED_UNIT_EXCESS
+                    self.assertAlmostEquals(units[i,j], expected)
+                    self.assertAlmostEquals(volumes[i,j],
+                            expected / e.concentration)
+            units, volumes = calculate_unit_required_matrix([1, 2], size, weight,
+                    enzymes, excess=1)
+            self.assertAlmostEquals(units[1,0],
+                    calculate_unit_required(2, 5000, 1.0, enzymes[0]))
+            # a number is a single sample
+            units, volumes = calculate_unit_required_matrix(2, 5000, 1.0,
+                    enzymes, excess=1)
+            self.assertEquals(units.shape, (1, 4))
+            self.assertAlmostEquals(units[0,0],
+                    calculate_unit_required(2, 5000, 1.0, enzymes[0]))
+            units, volumes = calculate_unit_required_matrix(2, size, 1.0,
+                    enzymes, excess=1)
+            self.assertEquals(volumes.shape, (2, 4))
+
     unittest.main()
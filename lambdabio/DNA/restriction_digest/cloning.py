@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Cloning enzyme finder module
+
+Find enzymes (and enzyme pairs) which cut the multiple cloning site
+(MCS) of a vector exactly once and do not cut an insert. Each sequence
+is scanned once and summarized as bitsets over the enzymes:
+
+    once   - enzymes which cut the sequence exactly once
+    many   - enzymes which cut the sequence more than once
+    unique - enzymes which cut the sequence exactly once in the region
+
+thus a library of vectors and inserts is screened with set operations of
+integers instead of nested loops. Candidates are ranked with the buffer
+compatibility of double_digestion and the volume of enzymes required
+(calculate_unit_required) once per vector, each insert only selects the
+ranked candidates which it does not cut.
+
+Methods:
+    profile_sequence - Summarize the sites of enzymes in sequence as bitsets
+    find_cloning_enzymes - Find cloning enzymes of a vector and an insert
+    screen_library - Find cloning enzymes of every vector and insert
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+from enzyme import Attrdict, AVARIABLE_ENZYME_LIST, double_digestion
+from calculator import calculate_unit_required
+from scanner import SiteScanner
+
+def _instantiate(enzyme):
+    # AVARIABLE_ENZYME_LIST has classes while the registry has instances
+    return enzyme() if isinstance(enzyme, type) else enzyme
+
+def _iter_bits(bits):
+    i = 0
+    while bits:
+        if bits & 1:
+            yield i
+        bits >>= 1
+        i += 1
+
+def profile_sequence(sequence, region=None, scanner=None):
+    """Summarize the sites of enzymes in sequence as bitsets
+
+    Args:
+        sequence - the DNA sequence (string)
+        region - a tuple of begin and end of the region (e.g. MCS). the
+            whole sequence is used when None is specified.
+        scanner - the instance of SiteScanner
+
+    Return:
+        a tuple of bitsets (once, many, unique) which n-th bit
+        represents n-th enzyme of the scanner (tuple(int, int, int))
+    """
+    if scanner is None:
+        scanner = SiteScanner()
+    begin, end = region or (0, len(sequence))
+    once = many = unique = 0
+    sites = scanner.scan(sequence)
+    for i, name in enumerate(scanner.names):
+        positions = sites[name]
+        if len(positions) == 1:
+            once |= 1 << i
+            if begin <= positions[0] < end:
+                unique |= 1 << i
+        elif len(positions) > 1:
+            many |= 1 << i
+    return once, many, unique
+
+def _calculate_volume(sites, size, weight, enzyme):
+    if enzyme.substrate is None or not enzyme.concentration:
+        # no unit definition
+        return float('inf')
+    units = calculate_unit_required(sites, size, weight, enzyme)
+    return units / float(enzyme.concentration)
+
+def _rank(unique, enzymes, names, size, weight, compatibility):
+    # rank every enzyme (and pair) which cuts the MCS of the vector once,
+    # thus each insert only selects the ranked items with the bit masks
+    candidates = list(_iter_bits(unique))
+    volumes = dict((i, _calculate_volume(1, size, weight, enzymes[i]))
+                   for i in candidates)
+    singles = [(1 << i, Attrdict(enzyme=names[i], volume=volumes[i]))
+               for i in sorted(candidates, key=lambda i: volumes[i])]
+    pairs = []
+    for n, i in enumerate(candidates):
+        for j in candidates[n+1:]:
+            if (i, j) not in compatibility:
+                compatibility[i, j] = double_digestion(enzymes[i],
+                                                       enzymes[j])
+            buffer, recommend, warning = compatibility[i, j]
+            volume = volumes[i] + volumes[j]
+            pairs.append(((not recommend, buffer is None, volume),
+                          (1 << i | 1 << j,
+                           Attrdict(enzymes=(names[i], names[j]),
+                                    buffer=buffer, recommend=recommend,
+                                    warning=warning, volume=volume))))
+    pairs.sort(key=lambda pair: pair[0])
+    return singles, [pair for cost, pair in pairs]
+
+def _select(ranked, candidates):
+    return [item for mask, item in ranked if candidates & mask == mask]
+
+def screen_library(vectors, inserts, enzymes=None, weight=1.0):
+    """Find cloning enzymes of every vector and insert
+
+    Args:
+        vectors - a list of tuple(name, sequence, mcs) where mcs is a
+            tuple of begin and end of the MCS or None for whole vector
+        inserts - a list of tuple(name, sequence)
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+        weight - the weight of vector DNA in [ug] to calculate the volume
+            of enzymes
+
+    Yield:
+        an Attrdict which has vector, insert, singles and pairs. singles
+        is a list of Attrdict(enzyme, volume) ordered by volume and pairs
+        is a list of Attrdict(enzymes, buffer, recommend, warning,
+        volume) ordered by recommend, buffer availability and volume
+        (Attrdict)
+    """
+    if enzymes is None:
+        enzymes = AVARIABLE_ENZYME_LIST
+    scanner = SiteScanner(enzymes)
+    instances = [_instantiate(enzyme) for name, enzyme in enzymes]
+    names = scanner.names
+    inserts = [(name, profile_sequence(sequence, scanner=scanner))
+               for name, sequence in inserts]
+    compatibility = {}
+    for vector, sequence, mcs in vectors:
+        once, many, unique = profile_sequence(sequence, mcs, scanner)
+        singles, pairs = _rank(unique, instances, names, len(sequence),
+                               weight, compatibility)
+        for insert, (insert_once, insert_many, insert_unique) in inserts:
+            candidates = unique & ~(insert_once | insert_many)
+            yield Attrdict(vector=vector, insert=insert,
+                           singles=_select(singles, candidates),
+                           pairs=_select(pairs, candidates))
+
+def find_cloning_enzymes(vector, insert, mcs=None, enzymes=None, weight=1.0):
+    """Find cloning enzymes of a vector and an insert
+
+    Args:
+        vector - the DNA sequence of vector (string)
+        insert - the DNA sequence of insert (string)
+        mcs - a tuple of begin and end of the MCS in vector. the whole
+            vector is used when None is specified.
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+        weight - the weight of vector DNA in [ug]
+
+    Return:
+        a tuple of singles and pairs (see screen_library)
+    """
+    result = screen_library([('vector', vector, mcs)],
+                            [('insert', insert)], enzymes, weight).next()
+    return result.singles, result.pairs
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        # EcoRI, PstI, SpeI, XbaI sites in MCS
+        MCS = 'GAATTCAACTGCAGAAACTAGTAATCTAGA'
+        def setUp(self):
+            self.vector = 'A' * 100 + self.MCS + 'T' * 100
+            self.region = (100, 100 + len(self.MCS))
+        def test_profile_sequence(self):
+            scanner = SiteScanner()
+            sequence = self.vector + 'CTGCAG'
+            once, many, unique = profile_sequence(sequence, self.region, scanner)
+            self.assertEquals(once, 0b1101)
+            self.assertEquals(many, 0b0010)
+            self.assertEquals(unique, 0b1101)
+            once, many, unique = profile_sequence(sequence, (0, 110), scanner)
+            self.assertEquals(unique, 0b0001)
+        def test_find_cloning_enzymes(self):
+            insert = 'GGGACTAGTGGG'
+            singles, pairs = find_cloning_enzymes(self.vector, insert,
+                                                  self.region)
+            self.assertEquals(sorted(s.enzyme for s in singles),
+                              ['EcoRI', 'PstI', 'XbaI'])
+            self.assertEquals(len(pairs), 3)
+            # recommended pair first
+            self.assertEquals(pairs[0].enzymes, ('EcoRI', 'PstI'))
+            self.assertTrue(pairs[0].recommend)
+            self.assertFalse(pairs[-1].recommend)
+            volumes = [s.volume for s in singles]
+            self.assertEquals(volumes, sorted(volumes))
+        def test_screen_library(self):
+            vectors = [('pA', self.vector, self.region),
+                       ('pB', self.vector + 'GAATTC', self.region)]
+            inserts = [('i1', 'GGG'), ('i2', 'CTGCAG')]
+            results = list(screen_library(vectors, inserts))
+            self.assertEquals([(r.vector, r.insert) for r in results],
+                [('pA', 'i1'), ('pA', 'i2'), ('pB', 'i1'), ('pB', 'i2')])
+            self.assertEquals([len(r.singles) for r in results], [4, 3, 3, 2])
+            self.assertEquals([len(r.pairs) for r in results], [6, 3, 3, 1])
+            self.assertEquals(results[3].pairs[0].enzymes, ('SpeI', 'XbaI'))
+
+    unittest.main()
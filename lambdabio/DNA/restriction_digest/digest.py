@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Virtual digestion module
+
+Digest a DNA sequence with one or more enzymes in silico and return the
+fragments as numpy arrays (coordinates, sizes and exact molecular
+weights). The arrays can be passed to the vectorized gel extraction
+functions as is, thus the recovered weight of every band of a library
+is predicted without scalar calls:
+
+    >>> fragments = virtual_digest(sequence, ['EcoRI', 'PstI'], 'circular')
+    >>> weights = predict_recovered_weights(fragments, 1e-6, 50)
+
+Methods:
+    virtual_digest - Digest DNA sequence with enzymes in silico
+    calculate_band_weights - Calculate weight of each fragment in digest
+    predict_recovered_weights - Predict recovered weight of each band
+
+Data:
+    TOPOLOGIES - the topologies of DNA
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import numpy as np
+from enzyme import Attrdict
+from scanner import _get_scanner
+from index import calculate_fragment_sizes
+from calculator import calculate_fragment_molecular_weights
+from lambdabio.DNA.gel_extraction.calculator import calculate_last_weight
+
+TOPOLOGIES = ('linear', 'circular')
+"""The topologies of DNA"""
+
+def _to_enzyme(enzyme):
+    # accept names, classes and instances of enzymes
+    if isinstance(enzyme, basestring):
+        from registry import get_enzyme
+        return get_enzyme(enzyme)
+    return enzyme() if isinstance(enzyme, type) else enzyme
+
+def virtual_digest(sequence, enzymes, topology='linear'):
+    """Digest DNA sequence with enzymes in silico
+
+    Single, double and multi digestion are the same call with one, two
+    or more enzymes. Sites across the origin of circular DNA are found
+    as well.
+
+    Args:
+        sequence - the DNA sequence (string)
+        enzymes - a list of enzymes (names, classes or instances)
+        topology - the topology of DNA ('linear' or 'circular')
+
+    Return:
+        an Attrdict which has 'size', 'topology', 'enzymes' (names),
+        'sites' (a dictionary of the number of sites of each enzyme),
+        'cuts' (sorted unique top strand cut positions), 'bottom_cuts'
+        (the bottom strand cut positions of each cut), 'conflicts' and
+        fragment arrays of 'starts', 'ends', 'sizes' and
+        'molecular_weights' in the order of the sequence. the last
+        fragment of circular DNA runs across the origin thus its end is
+        less than its start. when enzymes cut the same top strand
+        position but the different bottom strand positions, the bottom
+        cut of the first enzyme is used and 'conflicts' has the cut as a
+        key and a list of tuple(enzyme name, bottom cut) as a value
+        (Attrdict)
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError("Unknown topology '%s'" % topology)
+    circular = topology == 'circular'
+    enzymes = [_to_enzyme(enzyme) for enzyme in enzymes]
+    if not enzymes:
+        raise ValueError("No enzyme is specified.")
+    scanner = _get_scanner([(enzyme.name, enzyme) for enzyme in enzymes])
+    size = len(sequence)
+    text = sequence
+    if circular and size:
+        # scan the bases across the origin as well
+        overlap = min(scanner.max_length - 1, size)
+        text = sequence + sequence[:overlap]
+    counts = dict.fromkeys(scanner.names, 0)
+    positions = []
+    bottoms = {}
+    shared = {}
+    for i, begin, cut, bottom in scanner.iter_cuts(text):
+        # sites which begin in the overlap are found at the head
+        if begin < size:
+            counts[scanner.names[i]] += 1
+            if circular:
+                cut, bottom = cut % size, bottom % size
+            positions.append(cut)
+            found = bottoms.setdefault(cut, (i, bottom))
+            if found != (i, bottom):
+                # the top strand cut is shared with other site
+                shared.setdefault(cut, set([found])).add((i, bottom))
+                bottoms[cut] = min(found, (i, bottom))
+    positions = np.array(positions, dtype=np.int64)
+    sizes = calculate_fragment_sizes(positions, size, circular)
+    cuts = np.unique(positions)
+    if circular:
+        cuts = cuts[(cuts >= 0) & (cuts < size)]
+        if len(cuts):
+            starts = cuts
+            ends = np.roll(cuts, -1)
+        else:
+            starts = np.zeros(1, dtype=np.int64)
+            ends = np.array([size], dtype=np.int64)
+    else:
+        cuts = cuts[(cuts > 0) & (cuts < size)]
+        starts = np.concatenate(([0], cuts))
+        ends = np.concatenate((cuts, [size]))
+    # enzymes which share a top strand cut might cut the bottom strand at
+    # the different positions. the cut of the first enzyme is used and the
+    # ambiguous cuts are reported
+    cuts_list = cuts.tolist()
+    conflicts = {}
+    for cut in set(shared).intersection(cuts_list):
+        if len(set(bottom for i, bottom in shared[cut])) > 1:
+            conflicts[cut] = sorted(set((scanner.names[i], bottom)
+                                        for i, bottom in shared[cut]))
+    return Attrdict(
+        size=size,
+        topology=topology,
+        enzymes=[enzyme.name for enzyme in enzymes],
+        sites=counts,
+        cuts=cuts,
+        bottom_cuts=np.array([bottoms[cut][1] for cut in cuts_list],
+                             dtype=np.int64),
+        conflicts=conflicts,
+        starts=starts,
+        ends=ends,
+        sizes=sizes,
+        molecular_weights=calculate_fragment_molecular_weights(sequence,
+            cuts, circular=circular),
+    )
+
+def calculate_band_weights(fragments, weight):
+    """Calculate weight of each fragment in digest
+
+    The fragments of digested DNA are equimolar, thus the weight is
+    divided in proportion to the molecular weights of fragments.
+
+    Args:
+        fragments - the fragments returned by virtual_digest
+        weight - the weight of digested DNA in [g]
+
+    Return:
+        weights of fragments in [g] (numpy.ndarray)
+    """
+    mws = fragments.molecular_weights
+    return weight * mws / mws.sum()
+
+def predict_recovered_weights(fragments, weight, volume, interpolate=False):
+    """Predict recovered weight of each band after Gel Extraction
+
+    Args:
+        fragments - the fragments returned by virtual_digest
+        weight - the weight of digested DNA in [g]
+        volume - the volume of Gel Extraction Mix solution (number or
+            array like of each band). it is required because the recovery
+            of RECOVERY_ON_VOLUME_TABLE falls to 0.35 for small volumes
+        interpolate - linearly interpolate the recovery tables
+
+    Return:
+        recovered weights of fragments in [g] (numpy.ndarray)
+    """
+    return calculate_last_weight(calculate_band_weights(fragments, weight),
+                                 fragments.sizes, volume, interpolate)
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import random
+            random.seed(5)
+            self.sequence = ''.join(random.choice('ACGT')
+                                    for i in xrange(20000))
+        def test_single_digestion(self):
+            sequence = 'AAAG' + 'AATTCA' * 10 + 'GAATTCAAA'
+            fragments = virtual_digest(sequence, ['EcoRI'])
+            self.assertEquals(fragments.sites, {'EcoRI': 2})
+            self.assertEquals(fragments.cuts.tolist(), [4, 65])
+            self.assertEquals(fragments.bottom_cuts.tolist(), [8, 69])
+            self.assertEquals(fragments.starts.tolist(), [0, 4, 65])
+            self.assertEquals(fragments.ends.tolist(), [4, 65, len(sequence)])
+            self.assertEquals(fragments.sizes.tolist(), [4, 61, 8])
+            self.assertEquals(fragments.molecular_weights.shape, (3,))
+        def test_multi_digestion(self):
+            import enzyme
+            from scanner import scan_sites
+            enzymes = ['EcoRI', enzyme.PstI, enzyme.SpeI()]
+            fragments = virtual_digest(self.sequence, enzymes)
+            expected = scan_sites(self.sequence)
+            self.assertEquals(fragments.enzymes, ['EcoRI', 'PstI', 'SpeI'])
+            for name in fragments.enzymes:
+                self.assertEquals(fragments.sites[name], len(expected[name]))
+            self.assertEquals(fragments.sizes.sum(), len(self.sequence))
+            self.assertTrue(((fragments.ends - fragments.starts) ==
+                             fragments.sizes).all())
+            self.assertRaises(ValueError, virtual_digest, self.sequence, [])
+            self.assertRaises(ValueError, virtual_digest, self.sequence,
+                              ['EcoRI'], 'supercoiled')
+        def test_circular(self):
+            # the EcoRI site across the origin
+            sequence = 'AATTC' + 'A' * 50 + 'CTGCAG' + 'A' * 40 + 'G'
+            fragments = virtual_digest(sequence, ['EcoRI', 'PstI'],
+                                       'circular')
+            self.assertEquals(fragments.sites, {'EcoRI': 1, 'PstI': 1})
+            self.assertEquals(fragments.starts.tolist(), [0, 60])
+            self.assertEquals(fragments.ends.tolist(), [60, 0])
+            self.assertEquals(fragments.sizes.tolist(), [60, 42])
+            self.assertEquals(fragments.bottom_cuts.tolist(), [4, 56])
+            fragments = virtual_digest(sequence, ['EcoRI'])
+            self.assertEquals(fragments.sites, {'EcoRI': 0})
+            fragments = virtual_digest('A' * 100, ['EcoRI'], 'circular')
+            self.assertEquals(fragments.sizes.tolist(), [100])
+            fragments = virtual_digest('A' * 100, ['EcoRI'])
+            self.assertEquals(fragments.sizes.tolist(), [100])
+        def test_conflicts(self):
+            class EcoRILike(object):
+                # the same top strand cut as EcoRI
+                def __init__(self, name, site):
+                    self.name, self.site = name, site
+            short = EcoRILike('Short', 'GAATTC(-5/-3)')
+            same = EcoRILike('Same', 'GAATTC(-5/-1)')
+            sequence = 'AAAGAATTCAAA'
+            fragments = virtual_digest(sequence, ['EcoRI', short])
+            self.assertEquals(fragments.cuts.tolist(), [4])
+            self.assertEquals(fragments.bottom_cuts.tolist(), [8])
+            self.assertEquals(fragments.conflicts,
+                              {4: [('EcoRI', 8), ('Short', 6)]})
+            fragments = virtual_digest(sequence, [short, 'EcoRI'])
+            self.assertEquals(fragments.bottom_cuts.tolist(), [6])
+            fragments = virtual_digest(sequence, ['EcoRI', same])
+            self.assertEquals(fragments.bottom_cuts.tolist(), [8])
+            self.assertEquals(fragments.conflicts, {})
+        def test_molecular_weights(self):
+            from calculator import calculate_sequence_molecular_weight
+            fragments = virtual_digest(self.sequence, ['EcoRI', 'PstI'],
+                                       'circular')
+            for start, end, mw in zip(fragments.starts, fragments.ends,
+                                      fragments.molecular_weights):
+                if end > start:
+                    fragment = self.sequence[start:end]
+                else:
+                    fragment = self.sequence[start:] + self.sequence[:end]
+                self.assertAlmostEquals(mw,
+                    calculate_sequence_molecular_weight(fragment,
+                                                        phosphate=True))
+        def test_predict_recovered_weights(self):
+            from lambdabio.DNA.gel_extraction.calculator import \
+                calculate_last_weight as last_weight
+            fragments = virtual_digest(self.sequence, ['EcoRI', 'PstI'])
+            weights = calculate_band_weights(fragments, 1e-6)
+            self.assertAlmostEquals(weights.sum(), 1e-6)
+            recovered = predict_recovered_weights(fragments, 1e-6, 50)
+            self.assertEquals(recovered.shape, fragments.sizes.shape)
+            for w, size, r in zip(weights, fragments.sizes, recovered):
+                self.assertAlmostEquals(r, last_weight(float(w), int(size),
+                                                       50))
+            # the volume is never assumed
+            self.assertRaises(TypeError, predict_recovered_weights,
+                              fragments, 1e-6)
+
+    unittest.main()
@@ -32,6 +32,8 @@ __author__  = 'Alisue <lambdalisue@hashnote.net>'
 __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
+from lambdabio.DNA.instrument import instrument
+
 class Singleton(object):
     """Singleton Mixin Class
 
@@ -55,14 +57,13 @@ class Singleton(object):
         http://d.hatena.ne.jp/BetaNews/20090607/1244358178
     """
     def __new__(cls, *args, **kwargs):
-        # Store instance on cls._instance_dict with cls hash
-        key = str(hash(cls))
-        if not hasattr(cls, '_instance_dict'):
-            cls._instance_dict = {}
-        if key not in cls._instance_dict:
-            cls._instance_dict[key] = \
-                super(Singleton, cls).__new__(cls, *args, **kwargs)
-        return cls._instance_dict[key]
+        # Store instance on cls itself. cls.__dict__ is used instead of
+        # getattr to prevent the instance of superclass being found
+        instance = cls.__dict__.get('_instance')
+        if instance is None:
+            instance = super(Singleton, cls).__new__(cls, *args, **kwargs)
+            cls._instance = instance
+        return instance
 
 class Attrdict(dict):
     """Attribute accessible dictionary class
@@ -101,6 +102,10 @@ class RestrictionEnzymeBase(Singleton):
     """Restriction Enzyme Base class"""
     def __str__(self):
         return self._name
+    @property
+    def name(self):
+        """The name used in AVARIABLE_ENZYME_LIST (e.g. EcoRI)"""
+        return self.__class__.__name__
 
 class EcoRI(RestrictionEnzymeBase):
     # Ref: http://catalog.takara-bio.co.jp/product/basic_info.asp?catcd=B1000359&subcatcd=B1000364&unitid=U100003069
@@ -147,108 +152,363 @@ AVARIABLE_ENZYME_LIST = (
 )
 """Avariable enzyme list"""
 
+RECOMMEND_TABLE = (
+    (EcoRI, PstI, 'TAKARA Universal Buffer H', True, None),
+    (EcoRI, SpeI, 'TAKARA Universal Buffer H', True, None),
+    (EcoRI, XbaI, 'TAKARA Universal Buffer M', False,
+        "Double digestion of EcoR I and Xba I is not recommends."
+        " It will exhibits significant star activity for EcoR I"),
+    (PstI, SpeI, 'TAKARA Universal Buffer H', True, None),
+    (PstI, XbaI, 'TAKARA Universal Buffer M', False,
+        "Double digestion of Pst I and Xba I is not recommends."
+        " It will exhibits star activity for Pst I."),
+    (SpeI, XbaI, 'TAKARA Universal Buffer M', True, None),
+)
+"""Recommend buffers of double digestion"""
+
+BUFFER_SALT_ORDER = (
+    'TAKARA Universal Buffer L',
+    'TAKARA Universal Buffer M',
+    'TAKARA Universal Buffer M + 0.01% BSA',
+    'TAKARA Universal Buffer H',
+    'TAKARA Universal Buffer K',
+)
+"""Buffers in the order of salt concentration (low to high)"""
+
+def _compile_compatibility_table(table):
+    # index the recommends by the pair of enzyme name in both order
+    compatibility = {}
+    for enzyme1, enzyme2, buffer, recommend, warning in table:
+        compatibility[enzyme1.__name__, enzyme2.__name__] = \
+            compatibility[enzyme2.__name__, enzyme1.__name__] = \
+            (buffer, recommend, warning)
+    return compatibility
+BUFFER_COMPATIBILITY = _compile_compatibility_table(RECOMMEND_TABLE)
+"""Recommends of double digestion indexed by the pair of enzyme name"""
+
+def _recommend(enzyme1, enzyme2):
+    # return the recommend of the pair or None when no buffer is known to
+    # be shared. the pair out of RECOMMEND_TABLE (e.g. the enzymes of the
+    # registry) shares the buffer only when both enzymes specify the same
+    recommend = BUFFER_COMPATIBILITY.get((enzyme1.name, enzyme2.name))
+    if recommend is None and enzyme1.buffer and \
+            enzyme1.buffer == enzyme2.buffer:
+        recommend = (enzyme1.buffer, True, None)
+    return recommend
+
+@instrument('buffer_selection')
 def double_digestion(enzyme1, enzyme2):
     """Return recommends buffer for double digestion.
 
+    The pair which is not found in RECOMMEND_TABLE falls back to the
+    buffer of each enzyme. When the buffers differ (or are unknown) no
+    buffer is recommended and the warning explains it.
+
     Args:
         enzyme1 - the instance of Enzyme
         enzyme2 - the instance of Enzyme
 
     Return:
-        a name of recommends buffer (string)
+        a tuple of buffer, recommend and warning. buffer is None when no
+        buffer is recommended (tuple(string, bool, string))
     """
-    RECOMMEND_TABLE = (
-        (EcoRI, PstI, 'TAKARA Universal Buffer H', True, None),
-        (EcoRI, SpeI, 'TAKARA Universal Buffer H', True, None),
-        (EcoRI, XbaI, 'TAKARA Universal Buffer M', False,
-            "Double digestion of EcoR I and Xba I is not recommends."
-            " It will exhibits significant star activity for EcoR I"),
-        (PstI, SpeI, 'TAKARA Universal Buffer H', True, None),
-        (PstI, XbaI, 'TAKARA Universal Buffer M', False,
-            "Double digestion of Pst I and Xba I is not recommends."
-            " It will exhibits star activity for Pst I."),
-        (SpeI, XbaI, 'TAKARA Universal Buffer M', True, None),
-    )
-    for recommend in RECOMMEND_TABLE:
-        enzymeset = frozenset(recommend[0:2])
-        if enzymeset == frozenset((enzyme1.__class__,enzyme2.__class__)):
-            return recommend[2:]
-    raise KeyError("No avariable combination of %s and %s is found." \
-            % (enzyme1, enzyme2))
-
-import unittest
-class TestCase(unittest.TestCase):
-    def test_restriction_enzymes(self):
-        e1 = EcoRI()
-        e2 = EcoRI()
-        self.assertEquals(e1, e2)
-        e1 = PstI()
-        e2 = PstI()
-        self.assertEquals(e1, e2)
-        e1 = SpeI()
-        e2 = SpeI()
-        self.assertEquals(e1, e2)
-        e1 = XbaI()
-        e2 = XbaI()
-        self.assertEquals(e1, e2)
-    def test_EcoRI(self):
-        e = EcoRI()
-        self.assertEquals(str(e), 'EcoR I')
-        self.assertEquals(e.site, r"G'AATTC")
-        self.assertEquals(e.substrate.name, 'lambda')
-        self.assertEquals(e.substrate.size, 48502)
-        self.assertEquals(e.substrate.sites, 5)
-        self.assertEquals(e.temperature, 37)
-        self.assertEquals(e.heat_inactivate.temperature, 60)
-        self.assertEquals(e.heat_inactivate.time, 15)
-        self.assertEquals(e.buffer, 'TAKARA Universal Buffer H')
-    def test_PstI(self):
-        e = PstI()
-        self.assertEquals(str(e), 'Pst I')
-        self.assertEquals(e.site, r"CTGCA'G")
-        self.assertEquals(e.substrate.name, 'lambda')
-        self.assertEquals(e.substrate.size, 48502)
-        self.assertEquals(e.substrate.sites, 28)
-        self.assertEquals(e.temperature, 37)
-        self.assertEquals(e.heat_inactivate.temperature, 60)
-        self.assertEquals(e.heat_inactivate.time, 15)
-        self.assertEquals(e.buffer, 'TAKARA Universal Buffer H')
-    def test_SpeI(self):
-        e = SpeI()
-        self.assertEquals(str(e), 'Spe I')
-        self.assertEquals(e.site, r"A'CTAGT")
-        self.assertEquals(e.substrate.name, 'Adenovirus-2')
-        self.assertEquals(e.substrate.size, 35937)
-        self.assertEquals(e.substrate.sites, 3)
-        self.assertEquals(e.temperature, 37)
-        self.assertEquals(e.heat_inactivate.temperature, 60)
-        self.assertEquals(e.heat_inactivate.time, 15)
-        self.assertEquals(e.buffer, 'TAKARA Universal Buffer M')
-    def test_XbaI(self):
-        e = XbaI()
-        self.assertEquals(str(e), 'Xba I')
-        self.assertEquals(e.site, r"T'CTAGA")
-        self.assertEquals(e.substrate.name, 'lambda')
-        self.assertEquals(e.substrate.size, 48502)
-        self.assertEquals(e.substrate.sites, 1)
-        self.assertEquals(e.temperature, 37)
-        self.assertEquals(e.heat_inactivate.temperature, 60)
-        self.assertEquals(e.heat_inactivate.time, 15)
-        self.assertEquals(e.buffer, 'TAKARA Universal Buffer M + 0.01% BSA')
-    def test_double_digestion(self):
-        COMBINATION_TABLE = (
-            (EcoRI(), PstI(), 'TAKARA Universal Buffer H'),
-            (EcoRI(), SpeI(), 'TAKARA Universal Buffer H'),
-            (EcoRI(), XbaI(), 'TAKARA Universal Buffer M'),
-            (PstI(), SpeI(), 'TAKARA Universal Buffer H'),
-            (PstI(), XbaI(), 'TAKARA Universal Buffer M'),
-            (SpeI(), XbaI(), 'TAKARA Universal Buffer M'),
-        )
-        for e1, e2, expected in COMBINATION_TABLE:
-            buffer, recommend, warning = double_digestion(e1, e2)
-            #print "%s x %s: %s" % (e1, e2, buffer)
-            self.assertEquals(buffer, expected)
+    recommend = _recommend(enzyme1, enzyme2)
+    if recommend is None:
+        return (None, False,
+                "No recommended buffer for double digestion of %s and %s is "
+                "available. Digest them sequentially." % (enzyme1, enzyme2))
+    return recommend
+
+MAX_MULTI_DIGESTION_ENZYMES = 16
+"""The maximum number of enzymes which multi_digestion could plan
+
+The plan is found with a branch and bound search over the partitions of
+the enzymes which is exponential in the worst case, thus the number of
+enzymes is limited.
+"""
+
+def _join_group(group, enzyme):
+    # return the group (tuple(buffer, enzymes, warnings)) extended with the
+    # enzyme or None when the enzyme could not share the buffer of the group
+    buffer, members, warnings = group
+    buffers = set()
+    added = []
+    for member in members:
+        recommend = _recommend(member, enzyme)
+        if recommend is None:
+            return None
+        buffers.add(recommend[0])
+        if not recommend[1]:
+            added.append(recommend[2])
+    if len(buffers) != 1:
+        return None
+    common = buffers.pop()
+    if len(members) > 1 and common != buffer:
+        return None
+    return common, members + [enzyme], warnings + added
+
+def _signature(group):
+    return tuple(sorted(e.name for e in group[1]))
 
+def _cost(groups):
+    return (sum(len(group[2]) for group in groups), len(groups))
 
+def _plan_greedy(enzymes):
+    # put each enzyme in the first group which it joins without warnings
+    groups = []
+    for enzyme in enzymes:
+        for i, group in enumerate(groups):
+            joined = _join_group(group, enzyme)
+            if joined is not None and len(joined[2]) == len(group[2]):
+                groups[i] = joined
+                break
+        else:
+            groups.append((enzyme.buffer, [enzyme], []))
+    return groups
+
+def _plan_digestion(enzymes):
+    # branch and bound over the assignments of enzymes to groups. the
+    # greedy plan is the initial bound and a branch is pruned as soon as
+    # its cost reaches the best cost because the cost never decreases.
+    # the groups are compared by the enzyme names thus the repeated
+    # enzymes do not multiply the equivalent branches and a set of groups
+    # which has been searched with a lower cost is not searched again
+    isolated = [i for i, e in enumerate(enzymes)
+                if not any(_recommend(e, other) is not None
+                           for j, other in enumerate(enzymes) if j != i)]
+    if isolated:
+        # the enzymes which share a buffer with none of the others are
+        # digested alone, thus only the rest is searched
+        rest = [e for i, e in enumerate(enzymes) if i not in isolated]
+        return [(enzymes[i].buffer, [enzymes[i]], []) for i in isolated] + \
+               (_plan_digestion(rest) if rest else [])
+    greedy = _plan_greedy(enzymes)
+    best = [_cost(greedy), greedy]
+    seen = {}
+    def search(i, groups):
+        cost = _cost(groups)
+        if cost >= best[0]:
+            return
+        if i == len(enzymes):
+            best[:] = [cost, list(groups)]
+            return
+        state = (i, tuple(sorted(_signature(group) for group in groups)))
+        if seen.get(state, best[0]) <= cost:
+            return
+        seen[state] = cost
+        enzyme = enzymes[i]
+        tried = set()
+        for j, group in enumerate(groups):
+            # the groups of the same enzymes lead to the same plans
+            signature = _signature(group)
+            if signature in tried:
+                continue
+            tried.add(signature)
+            joined = _join_group(group, enzyme)
+            if joined is not None:
+                groups[j] = joined
+                search(i + 1, groups)
+                groups[j] = group
+        groups.append((enzyme.buffer, [enzyme], []))
+        search(i + 1, groups)
+        groups.pop()
+    search(0, [])
+    return best[1]
+
+def _salt_order(buffer):
+    try:
+        return BUFFER_SALT_ORDER.index(buffer)
+    except ValueError:
+        return len(BUFFER_SALT_ORDER)
+
+@instrument('buffer_selection')
+def multi_digestion(enzymes):
+    """Return the digestion plan of enzymes.
+
+    Find a buffer in which all enzymes could be digested at once. When
+    no such buffer is found, the enzymes are split into the sequential
+    digestion steps. The plan with the fewest warnings (star activity)
+    is preferred, then the plan with the fewest steps. The steps are
+    ordered from the low salt buffer to the high salt buffer.
+
+    The pairs out of RECOMMEND_TABLE share a buffer only when both
+    enzymes specify the same buffer. The plan is found with a branch and
+    bound search which is exponential in the number of enzymes in the
+    worst case, thus at most MAX_MULTI_DIGESTION_ENZYMES enzymes could be
+    specified.
+
+    Args:
+        enzymes - a list of the instance of Enzyme
+
+    Return:
+        a tuple of steps and warnings. steps is a list of tuple(buffer,
+        enzymes) and a single step means all enzymes share the buffer
+        (tuple(list, list))
+    """
+    enzymes = list(enzymes)
+    if not enzymes:
+        raise ValueError("No enzyme is specified.")
+    if len(enzymes) > MAX_MULTI_DIGESTION_ENZYMES:
+        raise ValueError("Too many enzymes (%d) are specified. At most %d "
+                         "enzymes could be planned at once." % (
+                             len(enzymes), MAX_MULTI_DIGESTION_ENZYMES))
+    steps = []
+    warnings = []
+    for buffer, group, added in _plan_digestion(enzymes):
+        steps.append((buffer, group))
+        warnings.extend(added)
+    steps.sort(key=lambda step: _salt_order(step[0]))
+    return steps, warnings
+
+# --- unittest
 if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def test_restriction_enzymes(self):
+            e1 = EcoRI()
+            e2 = EcoRI()
+            self.assertEquals(e1, e2)
+            e1 = PstI()
+            e2 = PstI()
+            self.assertEquals(e1, e2)
+            e1 = SpeI()
+            e2 = SpeI()
+            self.assertEquals(e1, e2)
+            e1 = XbaI()
+            e2 = XbaI()
+            self.assertEquals(e1, e2)
+        def test_EcoRI(self):
+            e = EcoRI()
+            self.assertEquals(str(e), 'EcoR I')
+            self.assertEquals(e.site, r"G'AATTC")
+            self.assertEquals(e.substrate.name, 'lambda')
+            self.assertEquals(e.substrate.size, 48502)
+            self.assertEquals(e.substrate.sites, 5)
+            self.assertEquals(e.temperature, 37)
+            self.assertEquals(e.heat_inactivate.temperature, 60)
+            self.assertEquals(e.heat_inactivate.time, 15)
+            self.assertEquals(e.buffer, 'TAKARA Universal Buffer H')
+        def test_PstI(self):
+            e = PstI()
+            self.assertEquals(str(e), 'Pst I')
+            self.assertEquals(e.site, r"CTGCA'G")
+            self.assertEquals(e.substrate.name, 'lambda')
+            self.assertEquals(e.substrate.size, 48502)
+            self.assertEquals(e.substrate.sites, 28)
+            self.assertEquals(e.temperature, 37)
+            self.assertEquals(e.heat_inactivate.temperature, 60)
+            self.assertEquals(e.heat_inactivate.time, 15)
+            self.assertEquals(e.buffer, 'TAKARA Universal Buffer H')
+        def test_SpeI(self):
+            e = SpeI()
+            self.assertEquals(str(e), 'Spe I')
+            self.assertEquals(e.site, r"A'CTAGT")
+            self.assertEquals(e.substrate.name, 'Adenovirus-2')
+            self.assertEquals(e.substrate.size, 35937)
+            self.assertEquals(e.substrate.sites, 3)
+            self.assertEquals(e.temperature, 37)
+            self.assertEquals(e.heat_inactivate.temperature, 60)
+            self.assertEquals(e.heat_inactivate.time, 15)
+            self.assertEquals(e.buffer, 'TAKARA Universal Buffer M')
+        def test_XbaI(self):
+            e = XbaI()
+            self.assertEquals(str(e), 'Xba I')
+            self.assertEquals(e.site, r"T'CTAGA")
+            self.assertEquals(e.substrate.name, 'lambda')
+            self.assertEquals(e.substrate.size, 48502)
+            self.assertEquals(e.substrate.sites, 1)
+            self.assertEquals(e.temperature, 37)
+            self.assertEquals(e.heat_inactivate.temperature, 60)
+            self.assertEquals(e.heat_inactivate.time, 15)
+            self.assertEquals(e.buffer, 'TAKARA Universal Buffer M + 0.01% BSA')
+        def test_double_digestion(self):
+            COMBINATION_TABLE = (
+                (EcoRI(), PstI(), 'TAKARA Universal Buffer H'),
+                (EcoRI(), SpeI(), 'TAKARA Universal Buffer H'),
+                (EcoRI(), XbaI(), 'TAKARA Universal Buffer M'),
+                (PstI(), SpeI(), 'TAKARA Universal Buffer H'),
+                (PstI(), XbaI(), 'TAKARA Universal Buffer M'),
+                (SpeI(), XbaI(), 'TAKARA Universal Buffer M'),
+            )
+            for e1, e2, expected in COMBINATION_TABLE:
+                buffer, recommend, warning = double_digestion(e1, e2)
+                #print "%s x %s: %s" % (e1, e2, buffer)
+                self.assertEquals(buffer, expected)
+            # the pairs out of RECOMMEND_TABLE fall back to the buffers
+            self.assertEquals(double_digestion(EcoRI(), EcoRI()),
+                              ('TAKARA Universal Buffer H', True, None))
+            class BglI(RestrictionEnzymeBase):
+                _name = 'Bgl I'
+                buffer = None
+            buffer, recommend, warning = double_digestion(EcoRI(), BglI())
+            self.assertEquals(buffer, None)
+            self.assertFalse(recommend)
+            self.assertTrue('EcoR I' in warning and 'Bgl I' in warning)
+            steps, warnings = multi_digestion([EcoRI(), BglI(), PstI()])
+            self.assertEquals(steps, [
+                ('TAKARA Universal Buffer H', [EcoRI(), PstI()]),
+                (None, [BglI()]),
+            ])
+        def test_multi_digestion(self):
+            steps, warnings = multi_digestion([EcoRI(), PstI(), SpeI()])
+            self.assertEquals(steps,
+                [('TAKARA Universal Buffer H', [EcoRI(), PstI(), SpeI()])])
+            self.assertEquals(warnings, [])
+            steps, warnings = multi_digestion([EcoRI(), XbaI()])
+            self.assertEquals(steps, [
+                ('TAKARA Universal Buffer M + 0.01% BSA', [XbaI()]),
+                ('TAKARA Universal Buffer H', [EcoRI()]),
+            ])
+            self.assertEquals(warnings, [])
+            steps, warnings = multi_digestion([EcoRI(), PstI(), SpeI(), XbaI()])
+            self.assertEquals(len(steps), 2)
+            self.assertEquals(warnings, [])
+            self.assertEquals(sorted(e.name for b, es in steps for e in es),
+                              ['EcoRI', 'PstI', 'SpeI', 'XbaI'])
+            self.assertEquals(steps[-1][0], 'TAKARA Universal Buffer H')
+            steps, warnings = multi_digestion([SpeI()])
+            self.assertEquals(steps, [('TAKARA Universal Buffer M', [SpeI()])])
+            self.assertRaises(ValueError, multi_digestion, [])
+            self.assertRaises(ValueError, multi_digestion,
+                              [EcoRI()] * (MAX_MULTI_DIGESTION_ENZYMES + 1))
+        def test_plan_digestion(self):
+            # the pruned search finds the same cost as the exhaustive search
+            import random
+            def partitions(items):
+                if not items:
+                    yield []
+                    return
+                for partition in partitions(items[1:]):
+                    yield [[items[0]]] + partition
+                    for i in xrange(len(partition)):
+                        yield partition[:i] + [[items[0]] + partition[i]] + \
+                              partition[i+1:]
+            def exhaustive(enzymes):
+                costs = []
+                for partition in partitions(enzymes):
+                    groups = []
+                    for group in partition:
+                        joined = (group[0].buffer, group[:1], [])
+                        for enzyme in group[1:]:
+                            if joined is not None:
+                                joined = _join_group(joined, enzyme)
+                        groups.append(joined)
+                    if None not in groups:
+                        costs.append(_cost(groups))
+                return min(costs)
+            names = sorted(set(name for pair in BUFFER_COMPATIBILITY
+                               for name in pair))
+            random.seed(7)
+            for i in xrange(30):
+                enzymes = [globals()[random.choice(names)]()
+                           for j in xrange(random.randint(1, 7))]
+                self.assertEquals(_cost(_plan_digestion(enzymes)),
+                                  exhaustive(enzymes))
+            # a large input is planned quickly
+            enzymes = [globals()[name]() for name in names] * \
+                      (MAX_MULTI_DIGESTION_ENZYMES / len(names))
+            steps, warnings = multi_digestion(enzymes)
+            self.assertEquals(sorted(e.name for b, es in steps for e in es),
+                              sorted(e.name for e in enzymes))
+
     unittest.main()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Genome scale restriction digestion module
+
+Digest genome scale FASTA files without loading whole records into
+memory. The file is memory mapped and each record is scanned in fixed
+size windows. The last (longest recognition length - 1) bases of a
+window are carried over to the next window and only the sites which end
+in the new bases are accepted, thus a site crossing a window boundary is
+found exactly once.
+
+gzip compressed FASTA files are decompressed as a stream in chunks.
+With a FASTA index (.fai, written by `samtools faidx`) only regions like
+'chr3:10,000,000-12,000,000' are read: plain FASTA files are sliced from
+the memory mapped file, BGZF compressed files are decompressed from
+the block which has the first base of the region (see bgzf module) and
+the other gzip compressed files are decompressed once for all regions.
+
+The counts and the size of each record can be passed to
+calculate_site_molar as is:
+
+    >>> for record in digest_fasta('genome.fa.gz', regions=['chr3:1-2000']):
+    ...     molar = calculate_site_molar(record.counts['EcoRI'],
+    ...                                  weight, record.size)
+
+Methods:
+    iter_fasta_records - Iterate records in memory mapped FASTA file
+    parse_region - Parse region string like 'chr3:10,000,000-12,000,000'
+    read_fai - Read FASTA index (.fai)
+    digest_fasta - Locate restriction sites of enzymes in FASTA file
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import re
+import mmap
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from collections import OrderedDict
+from enzyme import Attrdict
+from scanner import SiteScanner
+from bgzf import is_gzip, is_bgzf, iter_gzip_chunks, BgzfFile
+
+# The default window size in bytes of raw FASTA file
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The characters which are not part of sequence
+WHITESPACES = '\r\n\t '
+
+# The pattern of region string (1-based and inclusive like samtools)
+REGION_PATTERN = re.compile(r'^([^:]+)(?::([\d,]+)(?:-([\d,]+))?)?$')
+
+def iter_fasta_records(buffer):
+    """Iterate records in memory mapped FASTA file
+
+    Args:
+        buffer - the memory mapped FASTA file (mmap or string)
+
+    Yield:
+        a tuple of record name, begin and end offset of the sequence
+        data in buffer (tuple(string, int, int))
+    """
+    pos = buffer.find('>')
+    while pos >= 0:
+        newline = buffer.find('\n', pos)
+        if newline < 0:
+            newline = len(buffer)
+        header = buffer[pos+1:newline].strip()
+        name = header.split(None, 1)[0] if header else ''
+        end = buffer.find('\n>', newline)
+        if end < 0:
+            end = len(buffer)
+        yield name, newline + 1, end
+        pos = buffer.find('>', end)
+
+def _iter_fasta_stream(chunks):
+    # split the decompressed chunks of FASTA file into the sequence data
+    # of records. yield tuple(record number, name, data) and a record
+    # always starts with an empty data
+    n = 0
+    header = None
+    newline = True
+    for chunk in chunks:
+        pos = 0
+        while pos < len(chunk):
+            if header is not None:
+                eol = chunk.find('\n', pos)
+                if eol < 0:
+                    header += chunk[pos:]
+                    break
+                header = (header + chunk[pos:eol]).strip()
+                name = header.split(None, 1)[0] if header else ''
+                n += 1
+                yield n, name, ''
+                header = None
+                pos = eol + 1
+                newline = True
+            elif newline and chunk[pos] == '>':
+                header = ''
+                pos += 1
+            else:
+                end = chunk.find('\n>', pos)
+                end = len(chunk) if end < 0 else end + 1
+                if n:
+                    # the data before the first header is ignored
+                    yield n, name, chunk[pos:end]
+                newline = chunk[end-1] == '\n'
+                pos = end
+    if header is not None:
+        header = header.strip()
+        yield n + 1, header.split(None, 1)[0] if header else '', ''
+
+class _Digestion(object):
+    # collect the sites of a record or region from the chunks fed in order
+    def __init__(self, scanner, locate, start=0):
+        self.scanner = scanner
+        self.locate = locate
+        self.start = start
+        self.counts = [0] * len(scanner.names)
+        self.positions = [array('l') for name in scanner.names]
+        self.carry = ''
+        self.consumed = 0
+    def feed(self, chunk):
+        chunk = chunk.translate(None, WHITESPACES)
+        text = self.carry + chunk
+        start = self.start + self.consumed
+        lengths = self.scanner.lengths
+        for i, site, cut in self.scanner.iter_matches(
+                text, start - len(self.carry)):
+            # sites entirely in the carried bases are already found
+            if site + lengths[i] > start:
+                self.counts[i] += 1
+                if self.locate:
+                    self.positions[i].append(cut)
+        self.consumed += len(chunk)
+        overlap = self.scanner.max_length - 1
+        self.carry = text[-overlap:] if overlap else ''
+    def result(self):
+        # sites on the bottom strand may be found out of order
+        positions = [array('l', sorted(p)) for p in self.positions]
+        return self.consumed, self.counts, positions
+
+def _digest_chunks(chunks, scanner, locate, start=0):
+    digestion = _Digestion(scanner, locate, start)
+    for chunk in chunks:
+        digestion.feed(chunk)
+    return digestion.result()
+
+def _create_record(name, start, scanner, result):
+    size, counts, positions = result
+    return Attrdict(
+        name=name,
+        start=start,
+        size=size,
+        counts=dict(zip(scanner.names, counts)),
+        positions=dict(zip(scanner.names, positions)),
+    )
+
+def parse_region(region):
+    """Parse region string like 'chr3:10,000,000-12,000,000'
+
+    The positions of region string are 1-based and inclusive like
+    samtools and commas are ignored.
+
+    Args:
+        region - the region string ('name', 'name:begin' or
+            'name:begin-end')
+
+    Return:
+        a tuple of name, 0-based start and end (None for the end of the
+        record) (tuple(string, int, int))
+    """
+    m = REGION_PATTERN.match(region.strip())
+    if m is None:
+        raise ValueError("Invalid region '%s'" % region)
+    name, start, end = m.groups()
+    start = int(start.replace(',', '')) - 1 if start else 0
+    end = int(end.replace(',', '')) if end else None
+    if start < 0 or (end is not None and end < start):
+        raise ValueError("Invalid region '%s'" % region)
+    return name, start, end
+
+def read_fai(filename):
+    """Read FASTA index (.fai)
+
+    Args:
+        filename - the path of FASTA index
+
+    Return:
+        an ordered dictionary which key is the name of record and value
+        is an Attrdict which has size, offset, linebases and linewidth
+        (OrderedDict)
+    """
+    entries = OrderedDict()
+    with open(filename) as fi:
+        for line in fi:
+            columns = line.rstrip('\r\n').split('\t')
+            if len(columns) < 5:
+                continue
+            entries[columns[0]] = Attrdict(zip(
+                ('size', 'offset', 'linebases', 'linewidth'),
+                map(int, columns[1:5])))
+    return entries
+
+def _get_offset(entry, position):
+    # the byte offset of the base at the position in the record
+    return entry.offset + position // entry.linebases * entry.linewidth + \
+        position % entry.linebases
+
+def _iter_stream_ranges(chunks, ranges, scanner, locate):
+    # digest the ranges of bytes in a single pass over the stream of
+    # chunks. the ranges are fed in the order of the offset and yielded
+    # in the given order as soon as they and the preceding ones are done
+    pending = sorted(xrange(len(ranges)), key=lambda i: ranges[i][2],
+                     reverse=True)
+    active = {}
+    done = {}
+    n = 0
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        while pending and ranges[pending[-1]][2] < end:
+            i = pending.pop()
+            active[i] = _Digestion(scanner, locate, ranges[i][1])
+        for i, digestion in active.items():
+            name, start, begin, stop = ranges[i]
+            digestion.feed(chunk[max(begin - position, 0):stop - position])
+            if stop <= end:
+                done[i] = active.pop(i)
+        position = end
+        while n in done:
+            yield done.pop(n)
+            n += 1
+        if not pending and not active:
+            break
+    # the empty ranges at the end of the stream
+    for i in pending:
+        done[i] = _Digestion(scanner, locate, ranges[i][1])
+    done.update(active)
+    while n in done:
+        yield done.pop(n)
+        n += 1
+
+def _digest_regions(filename, regions, scanner, chunk_size, locate):
+    fai = filename + '.fai'
+    try:
+        entries = read_fai(fai)
+    except IOError:
+        raise ValueError("FASTA index '%s' is not found." % fai)
+    ranges = []
+    for region in regions:
+        name, start, end = parse_region(region)
+        if name not in entries:
+            raise ValueError("Unknown sequence name '%s'" % name)
+        entry = entries[name]
+        end = entry.size if end is None else min(end, entry.size)
+        start = min(start, end)
+        begin = _get_offset(entry, start)
+        stop = _get_offset(entry, end - 1) + 1 if end > start else begin
+        ranges.append((name, start, begin, stop))
+    if is_gzip(filename):
+        if is_bgzf(filename):
+            with BgzfFile(filename) as fi:
+                for name, start, begin, stop in ranges:
+                    yield _create_record(name, start, scanner,
+                        _digest_chunks(fi.iter_range(begin, stop),
+                                       scanner, locate, start))
+        else:
+            # gzip file can not be accessed at random thus all regions
+            # are digested in a single pass up to the last region
+            with open(filename, 'rb') as fi:
+                digestions = _iter_stream_ranges(
+                    iter_gzip_chunks(fi, chunk_size), ranges, scanner,
+                    locate)
+                for (name, start, begin, stop), digestion in \
+                        zip(ranges, digestions):
+                    yield _create_record(name, start, scanner,
+                                         digestion.result())
+        return
+    with open(filename, 'rb') as fi:
+        buffer = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for name, start, begin, stop in ranges:
+                chunks = (buffer[pos:min(pos + chunk_size, stop)]
+                          for pos in xrange(begin, stop, chunk_size))
+                yield _create_record(name, start, scanner,
+                    _digest_chunks(chunks, scanner, locate, start))
+        finally:
+            buffer.close()
+
+def digest_fasta(filename, enzymes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+        locate=True, regions=None):
+    """Locate restriction sites of enzymes in FASTA file
+
+    The file is memory mapped and scanned in windows of chunk_size bytes
+    so the peak memory does not depend on the size of the file (except
+    the positions found). gzip compressed files are decompressed in
+    chunks of chunk_size compressed bytes.
+
+    When regions are specified, only the regions are read with the FASTA
+    index (<filename>.fai). BGZF compressed files are decompressed from
+    the block which has the first base of each region while the other
+    gzip compressed files are decompressed once up to the last region.
+
+    Args:
+        filename - the path of FASTA file (plain or gzip compressed)
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+        chunk_size - the size of window in bytes
+        locate - collect the positions of sites when True, otherwise
+            only counts are collected
+        regions - a list of region strings like 'chr3:10,000-12,000'
+            (see parse_region). all records are digested when None is
+            specified.
+
+    Yield:
+        an Attrdict which has name, start, size, counts and positions of
+        the record or region. start is the 0-based position of the first
+        base in the record (0 for a whole record). counts and positions
+        are dictionaries which key is the name of enzyme and value is the
+        number of sites and an array of top strand cut positions in the
+        record respectively (Attrdict)
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    scanner = SiteScanner(enzymes)
+    if regions is not None:
+        for record in _digest_regions(filename, regions, scanner,
+                                      chunk_size, locate):
+            yield record
+        return
+    if is_gzip(filename):
+        with open(filename, 'rb') as fi:
+            stream = _iter_fasta_stream(iter_gzip_chunks(fi, chunk_size))
+            for (n, name), group in groupby(stream, itemgetter(0, 1)):
+                chunks = (data for n, name, data in group)
+                yield _create_record(name, 0, scanner,
+                    _digest_chunks(chunks, scanner, locate))
+        return
+    with open(filename, 'rb') as fi:
+        try:
+            buffer = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file could not be mapped
+            return
+        try:
+            for name, begin, end in iter_fasta_records(buffer):
+                chunks = (buffer[pos:min(pos + chunk_size, end)]
+                          for pos in xrange(begin, end, chunk_size))
+                yield _create_record(name, 0, scanner,
+                    _digest_chunks(chunks, scanner, locate))
+        finally:
+            buffer.close()
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import os
+            import random
+            import tempfile
+            random.seed(1)
+            self.records = []
+            self.directory = tempfile.mkdtemp()
+            self.filename = os.path.join(self.directory, 'genome.fa')
+            fai = []
+            with open(self.filename, 'w') as fo:
+                for n in xrange(3):
+                    sequence = ''.join(random.choice('ACGT')
+                                       for i in xrange(5000 + n * 1000))
+                    # make sure that some sites cross lines and windows
+                    sequence = sequence[:58] + 'GAATTC' + sequence[58:]
+                    name = 'chr%d' % (n + 1)
+                    self.records.append((name, sequence))
+                    fo.write('>%s description\n' % name)
+                    fai.append('%s\t%d\t%d\t60\t61\n' % (name, len(sequence),
+                                                        fo.tell()))
+                    for i in xrange(0, len(sequence), 60):
+                        fo.write(sequence[i:i+60] + '\n')
+            with open(self.filename + '.fai', 'w') as fo:
+                fo.writelines(fai)
+        def tearDown(self):
+            import shutil
+            shutil.rmtree(self.directory)
+        def _compress(self, bgzf):
+            import gzip
+            import shutil
+            from bgzf import write_bgzf
+            filename = self.filename + '.gz'
+            with open(self.filename, 'rb') as fi:
+                data = fi.read()
+            if bgzf:
+                write_bgzf(filename, data, 1000)
+            else:
+                fo = gzip.open(filename, 'wb')
+                fo.write(data)
+                fo.close()
+            shutil.copy(self.filename + '.fai', filename + '.fai')
+            return filename
+        def test_iter_fasta_records(self):
+            with open(self.filename) as fi:
+                buffer = fi.read()
+            names = [name for name, begin, end in iter_fasta_records(buffer)]
+            self.assertEquals(names, ['chr1', 'chr2', 'chr3'])
+        def test_digest_fasta(self):
+            from scanner import scan_sites
+            for chunk_size in (7, 61, 1000, DEFAULT_CHUNK_SIZE):
+                results = list(digest_fasta(self.filename, chunk_size=chunk_size))
+                self.assertEquals(len(results), len(self.records))
+                for result, (name, sequence) in zip(results, self.records):
+                    expected = scan_sites(sequence)
+                    self.assertEquals(result.name, name)
+                    self.assertEquals(result.size, len(sequence))
+                    for enzyme, positions in expected.iteritems():
+                        self.assertEquals(list(result.positions[enzyme]),
+                                          positions)
+                        self.assertEquals(result.counts[enzyme], len(positions))
+        def test_digest_fasta_gzip(self):
+            expected = list(digest_fasta(self.filename))
+            for bgzf in (False, True):
+                filename = self._compress(bgzf)
+                for chunk_size in (7, 1000, DEFAULT_CHUNK_SIZE):
+                    results = list(digest_fasta(filename,
+                                                chunk_size=chunk_size))
+                    self.assertEquals(results, expected)
+        def test_parse_region(self):
+            self.assertEquals(parse_region('chr3:10,000,000-12,000,000'),
+                              ('chr3', 9999999, 12000000))
+            self.assertEquals(parse_region('chr3:101'), ('chr3', 100, None))
+            self.assertEquals(parse_region('chrM'), ('chrM', 0, None))
+            self.assertRaises(ValueError, parse_region, 'chr3:0-10')
+            self.assertRaises(ValueError, parse_region, 'chr3:20-10')
+            self.assertRaises(ValueError, parse_region, 'chr3:a-b')
+        def test_read_fai(self):
+            entries = read_fai(self.filename + '.fai')
+            self.assertEquals(entries.keys(), ['chr1', 'chr2', 'chr3'])
+            self.assertEquals(entries['chr2'].size, 6006)
+            self.assertEquals(entries['chr2'].linewidth, 61)
+        def test_digest_fasta_regions(self):
+            from scanner import scan_sites
+            regions = ['chr2:1-6006', 'chr2:59-64', 'chr3:1,001-4,500',
+                       'chr1:4,001', 'chr1:4001-4000']
+            expected = []
+            for region in regions:
+                name, start, end = parse_region(region)
+                sequence = dict(self.records)[name][start:end]
+                expected.append((name, start, len(sequence), dict(
+                    (enzyme, [p + start for p in positions])
+                    for enzyme, positions in
+                    scan_sites(sequence).iteritems())))
+            self.assertEquals(expected[1][3]['EcoRI'], [59])
+            for filename in (self.filename, self._compress(False),
+                             self._compress(True)):
+                results = list(digest_fasta(filename, regions=regions,
+                                            chunk_size=100))
+                self.assertEquals(len(results), len(regions))
+                for result, (name, start, size, positions) in \
+                        zip(results, expected):
+                    self.assertEquals(result.name, name)
+                    self.assertEquals(result.start, start)
+                    self.assertEquals(result.size, size)
+                    for enzyme, cuts in positions.iteritems():
+                        self.assertEquals(list(result.positions[enzyme]),
+                                          cuts)
+                        self.assertEquals(result.counts[enzyme], len(cuts))
+            # plain gzip file is decompressed once for all regions
+            global iter_gzip_chunks
+            calls = []
+            original = iter_gzip_chunks
+            def counted(fi, chunk_size):
+                calls.append(chunk_size)
+                return original(fi, chunk_size)
+            iter_gzip_chunks = counted
+            try:
+                results = list(digest_fasta(self._compress(False),
+                    regions=regions + ['chr3:7001', 'chr3:8000'], chunk_size=100))
+            finally:
+                iter_gzip_chunks = original
+            self.assertEquals(len(calls), 1)
+            self.assertEquals([(r.name, r.start, r.size) for r in results],
+                              [e[:3] for e in expected] +
+                              [('chr3', 7000, 6), ('chr3', 7006, 0)])
+            self.assertRaises(ValueError, list,
+                digest_fasta(self.filename, regions=['chrX:1-10']))
+            import os
+            os.remove(self.filename + '.fai')
+            self.assertRaises(ValueError, list,
+                digest_fasta(self.filename, regions=['chr1:1-10']))
+        def test_digest_fasta_count_only(self):
+            result = list(digest_fasta(self.filename, locate=False))[0]
+            self.assertTrue(result.counts['EcoRI'] > 0)
+            self.assertEquals(len(result.positions['EcoRI']), 0)
+        def test_digest_fasta_site_molar(self):
+            from calculator import calculate_site_molar
+            result = list(digest_fasta(self.filename))[0]
+            molar = calculate_site_molar(result.counts['EcoRI'], 1, result.size)
+            self.assertTrue(molar > 0)
+
+    unittest.main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Incremental restriction site index module
+
+Keep the restriction sites of a sequence current while the sequence is
+edited. Only the sites which begin within (longest recognition length -
+1) bases before an edit or in the edited bases are removed and found
+again, while the downstream sites are shifted by the difference of
+length. The sites are stored in blocks and each block has a base offset,
+thus the shift is done by updating the offsets of downstream blocks
+instead of all positions.
+
+The counts and the size can be passed to calculate_unit_required as is:
+
+    >>> index = IncrementalSiteIndex(plasmid, circular=True)
+    >>> index.insert(120, 'GAATTC')
+    >>> units = calculate_unit_required(index.count('EcoRI'), index.size,
+    ...                                 weight, EcoRI())
+
+Classes:
+    IncrementalSiteIndex - Restriction site index of an editable sequence
+
+Data:
+    BLOCK_SIZE - the number of sites stored in a block
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+from bisect import bisect_left
+import numpy as np
+from scanner import _get_scanner
+from index import calculate_fragment_sizes
+
+BLOCK_SIZE = 64
+"""The number of sites stored in a block"""
+
+class IncrementalSiteIndex(object):
+    """Restriction site index of an editable sequence
+
+    Usage:
+        >>> index = IncrementalSiteIndex('AAGAATTCAACTGCAGAA')
+        >>> index.count('EcoRI')
+        1
+        >>> index.substitute(3, 'C')
+        >>> index.count('EcoRI')
+        0
+        >>> list(index.locate('PstI'))
+        [15]
+    """
+    def __init__(self, sequence, enzymes=None, circular=False):
+        """Construct index
+
+        Args:
+            sequence - the DNA sequence (string)
+            enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST
+                is used when None is specified.
+            circular - True when the DNA is circular
+        """
+        self.scanner = _get_scanner(enzymes)
+        self.names = list(self.scanner.names)
+        self.circular = circular
+        self._lookup = dict((name, i) for i, name in enumerate(self.names))
+        self._sequence = bytearray(sequence)
+        self._rebuild()
+
+    @property
+    def sequence(self):
+        """The current DNA sequence (string)"""
+        return str(self._sequence)
+
+    @property
+    def size(self):
+        """The current size of DNA in bp"""
+        return len(self._sequence)
+
+    def _find(self, text, start, stop):
+        # find the sites which begin in [start, stop) of the sequence in
+        # text which starts at start. return a list of tuple(begin,
+        # record) where record is tuple(enzyme index, top and bottom
+        # strand cut positions relative to the begin)
+        size = len(self._sequence)
+        found = []
+        for i, begin, top, bottom in self.scanner.iter_cuts(text, start):
+            if begin < stop:
+                record = (i, top - begin, bottom - begin)
+                if self.circular:
+                    begin %= size
+                found.append((begin, record))
+        return found
+
+    def _rebuild(self):
+        size = len(self._sequence)
+        text = str(self._sequence)
+        if self.circular and size:
+            text += text[:min(self.scanner.max_length - 1, size)]
+        found = sorted(self._find(text, 0, size))
+        self._counts = [0] * len(self.names)
+        for begin, record in found:
+            self._counts[record[0]] += 1
+        # a block is a list of base offset, begins relative to the base
+        # and records
+        self._blocks = [[0, [begin for begin, record in found[k:k+BLOCK_SIZE]],
+                         [record for begin, record in found[k:k+BLOCK_SIZE]]]
+                        for k in xrange(0, len(found), BLOCK_SIZE)]
+
+    def _remove(self, start, stop, delta):
+        # remove the sites which begin in [start, stop) and shift the
+        # sites which begin after them by delta
+        blocks = self._blocks
+        for block in blocks:
+            base, begins, records = block
+            if base + begins[-1] < start:
+                continue
+            if base + begins[0] >= stop:
+                block[0] += delta
+                continue
+            lo = bisect_left(begins, start - base)
+            hi = bisect_left(begins, stop - base)
+            for record in records[lo:hi]:
+                self._counts[record[0]] -= 1
+            del begins[lo:hi], records[lo:hi]
+            if delta:
+                for k in xrange(lo, len(begins)):
+                    begins[k] += delta
+        self._blocks = [block for block in blocks if block[1]]
+
+    def _insert(self, begin, record):
+        blocks = self._blocks
+        self._counts[record[0]] += 1
+        if not blocks:
+            blocks.append([0, [begin], [record]])
+            return
+        j = 0
+        while j + 1 < len(blocks) and \
+                blocks[j+1][0] + blocks[j+1][1][0] <= begin:
+            j += 1
+        base, begins, records = blocks[j]
+        k = bisect_left(begins, begin - base)
+        begins.insert(k, begin - base)
+        records.insert(k, record)
+        if len(begins) > 2 * BLOCK_SIZE:
+            blocks.insert(j + 1, [base, begins[BLOCK_SIZE:],
+                                  records[BLOCK_SIZE:]])
+            del begins[BLOCK_SIZE:], records[BLOCK_SIZE:]
+
+    def replace(self, position, length, bases):
+        """Replace bases of the sequence and update the sites
+
+        Args:
+            position - the position of the first replaced base
+            length - the number of replaced bases
+            bases - the new bases (string)
+        """
+        size = len(self._sequence)
+        if position < 0 or length < 0 or position + length > size:
+            raise ValueError("The range %d-%d is out of the sequence." % (
+                position, position + length))
+        overlap = self.scanner.max_length - 1
+        delta = len(bases) - length
+        if self.circular and 2 * overlap + max(length, len(bases)) >= \
+                min(size, size + delta):
+            # the window to rescan covers the whole circular DNA
+            self._sequence[position:position+length] = bases
+            self._rebuild()
+            return
+        start = position - overlap
+        if self.circular and start < 0:
+            # the sites which run across the origin into the edit
+            self._remove(size + start, size, 0)
+        self._remove(max(start, 0), position + length, delta)
+        self._sequence[position:position+length] = bases
+        stop = position + len(bases)
+        if self.circular:
+            size += delta
+            begin = start % size
+            end = begin + stop + overlap - start
+            text = str(self._sequence[begin:end])
+            if end > size:
+                text += str(self._sequence[:end - size])
+        else:
+            start = max(start, 0)
+            text = str(self._sequence[start:stop + overlap])
+        for begin, record in self._find(text, start, stop):
+            self._insert(begin, record)
+
+    def substitute(self, position, bases):
+        """Substitute bases (e.g. a point mutation) at the position"""
+        self.replace(position, len(bases), bases)
+
+    def insert(self, position, bases):
+        """Insert bases before the position"""
+        self.replace(position, 0, bases)
+
+    def delete(self, position, length=1):
+        """Delete bases from the position"""
+        self.replace(position, length, '')
+
+    def count(self, name):
+        """Return the number of sites of the enzyme"""
+        return self._counts[self._lookup[name]]
+
+    def counts(self):
+        """Return a dictionary of the number of sites of each enzyme"""
+        return dict(zip(self.names, self._counts))
+
+    def _cuts(self, indexes):
+        cuts = [base + begin + record[1]
+                for base, begins, records in self._blocks
+                for begin, record in zip(begins, records)
+                if record[0] in indexes]
+        cuts = np.array(cuts, dtype=np.int64)
+        if self.circular and len(self._sequence):
+            cuts %= len(self._sequence)
+        cuts.sort()
+        return cuts
+
+    def locate(self, name):
+        """Return sorted top strand cut positions of the enzyme"""
+        return self._cuts(set([self._lookup[name]]))
+
+    def fragment_sizes(self, names):
+        """Return fragment sizes digested with the enzymes
+
+        Args:
+            names - a list of enzyme names
+
+        Return:
+            fragment sizes in the order of the DNA (numpy.ndarray)
+        """
+        cuts = self._cuts(set(self._lookup[name] for name in names))
+        return calculate_fragment_sizes(cuts, len(self._sequence),
+                                        self.circular)
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import random
+            from registry import REGISTRY
+            random.seed(7)
+            self.random = random
+            self.enzymes = REGISTRY.items()
+            self.sequence = ''.join(random.choice('ACGT')
+                                    for i in xrange(3000))
+        def _expected(self, sequence, circular):
+            from scanner import SiteScanner
+            scanner = SiteScanner(self.enzymes)
+            size = len(sequence)
+            text = sequence
+            if circular and size:
+                text += sequence[:min(scanner.max_length - 1, size)]
+            found = dict((name, []) for name in scanner.names)
+            for i, begin, top, bottom in scanner.iter_cuts(text):
+                if begin < size:
+                    found[scanner.names[i]].append(
+                        top % size if circular else top)
+            return dict((name, sorted(cuts))
+                        for name, cuts in found.iteritems())
+        def _assertIndex(self, index, sequence, circular):
+            self.assertEquals(index.sequence, sequence)
+            expected = self._expected(sequence, circular)
+            for name, cuts in expected.iteritems():
+                self.assertEquals(index.count(name), len(cuts))
+                self.assertEquals(list(index.locate(name)), cuts)
+            self.assertEquals(index.counts(),
+                dict((name, len(cuts)) for name, cuts in expected.iteritems()))
+            self.assertEquals(list(index.fragment_sizes(['EcoRI', 'BsaI'])),
+                list(calculate_fragment_sizes(expected['EcoRI'] +
+                     expected['BsaI'], len(sequence), circular)))
+        def _edit(self, circular):
+            random = self.random
+            sequence = self.sequence
+            index = IncrementalSiteIndex(sequence, self.enzymes, circular)
+            for n in xrange(200):
+                position = random.randint(0, len(sequence) - 20)
+                bases = ''.join(random.choice('ACGT')
+                                for i in xrange(random.randint(0, 8)))
+                kind = n % 3
+                if kind == 0:
+                    bases = bases or 'G'
+                    index.substitute(position, bases)
+                    length = len(bases)
+                elif kind == 1:
+                    index.insert(position, bases)
+                    length = 0
+                else:
+                    length = random.randint(1, 8)
+                    index.delete(position, length)
+                    bases = ''
+                sequence = sequence[:position] + bases + \
+                           sequence[position+length:]
+                self._assertIndex(index, sequence, circular)
+        def test_edit_linear(self):
+            self._edit(False)
+        def test_edit_circular(self):
+            self._edit(True)
+        def test_edit_across_origin(self):
+            # the EcoRI site across the origin is broken and restored
+            sequence = 'AATTC' + 'A' * 50 + 'CTGCAG' + 'A' * 40 + 'G'
+            index = IncrementalSiteIndex(sequence, self.enzymes, True)
+            self.assertEquals(list(index.locate('EcoRI')), [0])
+            index.substitute(1, 'C')
+            self.assertEquals(index.count('EcoRI'), 0)
+            index.substitute(1, 'A')
+            self.assertEquals(list(index.locate('EcoRI')), [0])
+            index.insert(len(sequence), 'T')
+            self.assertEquals(index.count('EcoRI'), 0)
+            index.delete(len(sequence))
+            self._assertIndex(index, sequence, True)
+            # small circular DNA is rebuilt
+            index = IncrementalSiteIndex('GAATTC', self.enzymes, True)
+            index.insert(3, 'A')
+            self._assertIndex(index, 'GAAATTC', True)
+        def test_edit_out_of_range(self):
+            index = IncrementalSiteIndex(self.sequence, self.enzymes)
+            self.assertRaises(ValueError, index.delete, 2999, 2)
+            self.assertRaises(ValueError, index.insert, -1, 'A')
+        def test_unit_required(self):
+            from enzyme import EcoRI
+            from calculator import calculate_unit_required
+            index = IncrementalSiteIndex(self.sequence)
+            index.insert(100, 'GAATTC')
+            self.assertAlmostEquals(
+                calculate_unit_required(index.count('EcoRI'), index.size,
+                                        1, EcoRI()),
+                calculate_unit_required(
+                    len(self._expected(index.sequence, False)['EcoRI']),
+                    3006, 1, EcoRI()))
+
+    unittest.main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Persistent restriction site index module
+
+Build a restriction site index of a sequence once and reuse it for
+repeated queries. An index is stored as two files named with the SHA-1
+digest of the sequence in the index directory:
+
+    <digest>.npy  - sorted top strand cut positions of all enzymes
+                    concatenated in enzyme order (int64)
+    <digest>.json - the header which has the size of the sequence, the
+                    names of enzymes, the offsets of each enzyme in the
+                    positions and the fingerprint of enzyme definitions
+
+The positions are memory mapped on load. The fingerprint is calculated
+from the names and sites of enzymes, thus an index is rebuilt when
+AVARIABLE_ENZYME_LIST is changed.
+
+Methods:
+    sequence_digest - Calculate the content hash of DNA sequence
+    registry_fingerprint - Calculate the fingerprint of enzyme definitions
+    calculate_fragment_sizes - Calculate fragment sizes from cut positions
+    build_index - Build and store restriction site index of sequence
+    load_index - Load stored restriction site index of sequence
+    get_index - Load restriction site index or build it when missing
+
+Classes:
+    SiteIndex - Restriction site index of a sequence
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import os
+import json
+import hashlib
+import numpy as np
+from enzyme import AVARIABLE_ENZYME_LIST
+from scanner import SiteScanner
+
+# The version of index file layout
+INDEX_VERSION = 1
+
+# The default directory where indexes are stored
+DEFAULT_INDEX_DIRECTORY = os.path.join(os.path.expanduser('~'),
+                                       '.lambdabio', 'index')
+
+def sequence_digest(sequence):
+    """Calculate the content hash of DNA sequence (case insensitive)"""
+    return hashlib.sha1(sequence.upper()).hexdigest()
+
+def registry_fingerprint(enzymes=None):
+    """Calculate the fingerprint of enzyme definitions
+
+    Args:
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        a hex digest of names and sites of enzymes (string)
+    """
+    if enzymes is None:
+        enzymes = AVARIABLE_ENZYME_LIST
+    fingerprint = hashlib.sha1(str(INDEX_VERSION))
+    for name, enzyme in enzymes:
+        fingerprint.update('%s\t%s\n' % (name, enzyme.site))
+    return fingerprint.hexdigest()
+
+def calculate_fragment_sizes(positions, size, circular=False):
+    """Calculate fragment sizes from cut positions
+
+    Args:
+        positions - the top strand cut positions (may be unsorted or
+            duplicated)
+        size - the size of DNA in bp
+        circular - True when the DNA is circular
+
+    Return:
+        fragment sizes in the order of the DNA (numpy.ndarray)
+    """
+    cuts = np.unique(np.asarray(positions, dtype=np.int64))
+    if circular:
+        cuts = cuts[(cuts >= 0) & (cuts < size)]
+        if len(cuts) == 0:
+            return np.array([size], dtype=np.int64)
+        sizes = np.diff(cuts)
+        return np.append(sizes, size - cuts[-1] + cuts[0])
+    cuts = cuts[(cuts > 0) & (cuts < size)]
+    return np.diff(np.concatenate(([0], cuts, [size])))
+
+class SiteIndex(object):
+    """Restriction site index of a sequence"""
+    def __init__(self, digest, size, names, offsets, positions, fingerprint):
+        self.digest = digest
+        self.size = size
+        self.names = list(names)
+        self.offsets = list(offsets)
+        self.positions = positions
+        self.fingerprint = fingerprint
+        self._lookup = dict((name, i) for i, name in enumerate(self.names))
+
+    def count(self, name):
+        """Return the number of sites of the enzyme"""
+        i = self._lookup[name]
+        return self.offsets[i+1] - self.offsets[i]
+
+    def counts(self):
+        """Return a dictionary of the number of sites of each enzyme"""
+        return dict((name, self.count(name)) for name in self.names)
+
+    def locate(self, name):
+        """Return sorted top strand cut positions of the enzyme"""
+        i = self._lookup[name]
+        return self.positions[self.offsets[i]:self.offsets[i+1]]
+
+    def fragment_sizes(self, names, circular=False):
+        """Return fragment sizes digested with the enzymes
+
+        Args:
+            names - a list of enzyme names
+            circular - True when the DNA is circular
+
+        Return:
+            fragment sizes in the order of the DNA (numpy.ndarray)
+        """
+        positions = np.concatenate([self.locate(name) for name in names] or
+                                   [np.empty(0, dtype=np.int64)])
+        return calculate_fragment_sizes(positions, self.size, circular)
+
+def _get_filenames(digest, directory):
+    basename = os.path.join(directory, digest)
+    return basename + '.npy', basename + '.json'
+
+def build_index(sequence, directory=DEFAULT_INDEX_DIRECTORY, enzymes=None):
+    """Build and store restriction site index of sequence
+
+    Args:
+        sequence - the DNA sequence (string)
+        directory - the directory where the index is stored
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        an instance of SiteIndex
+    """
+    scanner = SiteScanner(enzymes)
+    sites = scanner.scan(sequence)
+    offsets = [0]
+    for name in scanner.names:
+        offsets.append(offsets[-1] + len(sites[name]))
+    positions = np.array([p for name in scanner.names for p in sites[name]],
+                         dtype=np.int64)
+    index = SiteIndex(sequence_digest(sequence), len(sequence),
+                      scanner.names, offsets, positions,
+                      registry_fingerprint(enzymes))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    npy, header = _get_filenames(index.digest, directory)
+    # write to temporary files and rename them to avoid broken index
+    with open(npy + '.tmp', 'wb') as fo:
+        np.save(fo, positions)
+    with open(header + '.tmp', 'w') as fo:
+        json.dump(dict(
+            version=INDEX_VERSION,
+            size=index.size,
+            names=index.names,
+            offsets=index.offsets,
+            fingerprint=index.fingerprint,
+        ), fo)
+    os.rename(npy + '.tmp', npy)
+    os.rename(header + '.tmp', header)
+    return index
+
+def load_index(digest, directory=DEFAULT_INDEX_DIRECTORY, enzymes=None):
+    """Load stored restriction site index of sequence
+
+    Args:
+        digest - the content hash of the sequence (see sequence_digest)
+        directory - the directory where the index is stored
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        an instance of SiteIndex or None when the index is not found or
+        the enzyme definitions are changed
+    """
+    npy, header = _get_filenames(digest, directory)
+    if not os.path.exists(npy) or not os.path.exists(header):
+        return None
+    with open(header) as fi:
+        header = json.load(fi)
+    if header.get('version') != INDEX_VERSION or \
+            header.get('fingerprint') != registry_fingerprint(enzymes):
+        return None
+    if header['offsets'][-1]:
+        positions = np.load(npy, mmap_mode='r')
+    else:
+        # empty array could not be memory mapped
+        positions = np.load(npy)
+    return SiteIndex(digest, header['size'], header['names'],
+                     header['offsets'], positions, header['fingerprint'])
+
+def get_index(sequence, directory=DEFAULT_INDEX_DIRECTORY, enzymes=None):
+    """Load restriction site index of sequence or build it when missing
+
+    Args:
+        sequence - the DNA sequence (string)
+        directory - the directory where the index is stored
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        an instance of SiteIndex
+    """
+    index = load_index(sequence_digest(sequence), directory, enzymes)
+    if index is None:
+        index = build_index(sequence, directory, enzymes)
+    return index
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import random
+            import tempfile
+            random.seed(3)
+            self.directory = tempfile.mkdtemp()
+            self.sequence = ''.join(random.choice('ACGT') for i in xrange(20000))
+        def tearDown(self):
+            import shutil
+            shutil.rmtree(self.directory)
+        def test_calculate_fragment_sizes(self):
+            sizes = calculate_fragment_sizes([30, 10, 10], 100)
+            self.assertEquals(list(sizes), [10, 20, 70])
+            sizes = calculate_fragment_sizes([30, 10], 100, circular=True)
+            self.assertEquals(list(sizes), [20, 80])
+            sizes = calculate_fragment_sizes([], 100, circular=True)
+            self.assertEquals(list(sizes), [100])
+            sizes = calculate_fragment_sizes([0, 100], 100)
+            self.assertEquals(list(sizes), [100])
+        def test_build_and_load_index(self):
+            from scanner import scan_sites
+            expected = scan_sites(self.sequence)
+            build_index(self.sequence, self.directory)
+            index = load_index(sequence_digest(self.sequence), self.directory)
+            self.assertTrue(isinstance(index.positions, np.memmap))
+            self.assertEquals(index.size, len(self.sequence))
+            for name, positions in expected.iteritems():
+                self.assertEquals(index.count(name), len(positions))
+                self.assertEquals(list(index.locate(name)), positions)
+            sizes = index.fragment_sizes(['EcoRI', 'PstI'])
+            self.assertEquals(sizes.sum(), len(self.sequence))
+            self.assertEquals(len(sizes),
+                len(expected['EcoRI']) + len(expected['PstI']) + 1)
+        def test_get_index(self):
+            index = get_index(self.sequence, self.directory)
+            self.assertFalse(isinstance(index.positions, np.memmap))
+            index = get_index(self.sequence.lower(), self.directory)
+            self.assertTrue(isinstance(index.positions, np.memmap))
+        def test_load_index_invalidated(self):
+            build_index(self.sequence, self.directory)
+            digest = sequence_digest(self.sequence)
+            enzymes = AVARIABLE_ENZYME_LIST[:2]
+            self.assertEquals(load_index(digest, self.directory, enzymes), None)
+            self.assertEquals(load_index('0' * 40, self.directory), None)
+
+    unittest.main()
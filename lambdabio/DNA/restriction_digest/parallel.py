@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Parallel restriction digestion module
+
+Digest many records (chromosomes or plasmids) on a process pool. The
+sequences are copied once into a shared memory buffer which is
+inherited by the worker processes, thus only offsets are sent to the
+workers. Large records are split into windows which overlap by
+(longest recognition length - 1) bases and only the sites which end in
+the window are accepted, so that the result is identical to the serial
+scan.
+
+Methods:
+    digest_many - Locate restriction sites of enzymes in many records
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import ctypes
+import multiprocessing
+from array import array
+from multiprocessing.sharedctypes import RawArray
+from enzyme import Attrdict
+from scanner import SiteScanner
+
+# The default size of window in bp
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# The shared buffer and scanner of worker process
+_buffer = None
+_scanner = None
+
+def _init_worker(buffer, enzymes):
+    global _buffer, _scanner
+    _buffer = buffer
+    _scanner = SiteScanner(enzymes)
+
+def _digest_window(task):
+    # task is a tuple of record index, offset of the record in buffer,
+    # begin and end of the window in the record
+    record, offset, begin, end = task
+    lengths = _scanner.lengths
+    start = max(begin - _scanner.max_length + 1, 0)
+    text = _buffer[offset+start:offset+end]
+    counts = [0] * len(lengths)
+    positions = [[] for length in lengths]
+    for i, site, cut in _scanner.iter_matches(text, start):
+        # sites entirely in the overlap belong to the previous window
+        if site + lengths[i] > begin:
+            counts[i] += 1
+            positions[i].append(cut)
+    return record, counts, positions
+
+def _create_buffer(records):
+    size = sum(len(sequence) for name, sequence in records)
+    buffer = RawArray(ctypes.c_char, max(size, 1))
+    address = ctypes.addressof(buffer)
+    offsets = []
+    offset = 0
+    for name, sequence in records:
+        ctypes.memmove(address + offset, sequence, len(sequence))
+        offsets.append(offset)
+        offset += len(sequence)
+    return buffer, offsets
+
+def _iter_tasks(records, offsets, chunk_size):
+    for record, ((name, sequence), offset) in enumerate(zip(records, offsets)):
+        for begin in xrange(0, len(sequence), chunk_size):
+            end = min(begin + chunk_size, len(sequence))
+            yield record, offset, begin, end
+
+def digest_many(records, enzymes=None, processes=None,
+        chunk_size=DEFAULT_CHUNK_SIZE):
+    """Locate restriction sites of enzymes in many records in parallel
+
+    Args:
+        records - a list of tuple(name, sequence)
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+        processes - the number of worker processes. the number of CPUs
+            is used when None is specified and no process pool is
+            used when 1 is specified.
+        chunk_size - the maximum size of window in bp
+
+    Return:
+        a list of Attrdict which has name, size, counts and positions of
+        each record in the order of records. counts and positions are
+        dictionaries which key is the name of enzyme and value is the
+        number of sites and an array of top strand cut positions
+        respectively (list)
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    records = list(records)
+    buffer, offsets = _create_buffer(records)
+    tasks = _iter_tasks(records, offsets, chunk_size)
+    if processes == 1:
+        _init_worker(buffer, enzymes)
+        results = (_digest_window(task) for task in tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker,
+                                    (buffer, enzymes))
+        results = pool.imap(_digest_window, tasks)
+    try:
+        names = SiteScanner(enzymes).names
+        counts = [[0] * len(names) for record in records]
+        positions = [[array('l') for name in names] for record in records]
+        for record, window_counts, window_positions in results:
+            for i in xrange(len(names)):
+                counts[record][i] += window_counts[i]
+                positions[record][i].extend(window_positions[i])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return [Attrdict(
+                name=name,
+                size=len(sequence),
+                counts=dict(zip(names, counts[r])),
+                # sites on the bottom strand may be found out of order
+                positions=dict((n, array('l', sorted(p)))
+                               for n, p in zip(names, positions[r])),
+            ) for r, (name, sequence) in enumerate(records)]
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def setUp(self):
+            import random
+            random.seed(2)
+            self.records = []
+            for n in xrange(4):
+                sequence = ''.join(random.choice('ACGT')
+                                   for i in xrange(3000 + n * 1000))
+                self.records.append(('plasmid%d' % n, sequence))
+            self.records.append(('empty', ''))
+        def _assert_results(self, results):
+            from scanner import scan_sites
+            self.assertEquals(len(results), len(self.records))
+            for result, (name, sequence) in zip(results, self.records):
+                expected = scan_sites(sequence)
+                self.assertEquals(result.name, name)
+                self.assertEquals(result.size, len(sequence))
+                for enzyme, positions in expected.iteritems():
+                    self.assertEquals(list(result.positions[enzyme]), positions)
+                    self.assertEquals(result.counts[enzyme], len(positions))
+        def test_digest_many_serial(self):
+            for chunk_size in (5, 100, DEFAULT_CHUNK_SIZE):
+                results = digest_many(self.records, processes=1,
+                                      chunk_size=chunk_size)
+                self._assert_results(results)
+        def test_digest_many(self):
+            results = digest_many(self.records, processes=2, chunk_size=500)
+            self._assert_results(results)
+
+    unittest.main()
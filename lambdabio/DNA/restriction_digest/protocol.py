@@ -33,185 +33,262 @@ __version__ = '1.0.0'
 __date__    = '2011-05-16'
 
 import sys
-from calculator import calculate_unit_required
-from enzyme import AVARIABLE_ENZYME_LIST, double_digestion
-
-def _generate_single_digestion_protocol_rst(sites, size, weight, enzyme,
-        required_unit):
-    print "**************************************"
-    print " Single Restriction Digest Protocol"
-    print "**************************************"
-    print
-    print "Information"
-    print "================================"
-    print "Unit required: %f [units]" % required_unit
-    print
-    print "DNA"
-    print "--------------------------------"
-    print "Size: %d [bp]" % size
-    print "Weight: %f [ng]" % weight
-    print "Sites: %d [sites]" % sites
-    print
-    print "Enzyme"
-    print "--------------------------------"
-    print "Name: %s" % enzyme
-    print "Site: %s" % enzyme.site
-    print "Substrate name: %s" % enzyme.substrate.name
-    print "Substrate size: %d [bp]" % enzyme.substrate.size
-    print "Substrate sites: %d [sites]" % enzyme.substrate.sites
-    print "Temperature: %f" % enzyme.temperature
-    print "Heat inactivate: %(temperature)f [celcius], %(time)f [min]" \
-        % enzyme.heat_inactivate
-    print "Concentration: %f [U/ul]" % enzyme.concentration
-    print "Buffer: %s" % enzyme.buffer
-    print
-    print "Material"
-    print "================================="
-    print "-   10x %s:\t2 [ul]" % enzyme.buffer
-    print "-   TAKARA %s:\t\t %f [ul]" % (enzyme, required_unit / float(enzyme.concentration))
-    print "-   DNA:\t volume to %f [ng]" % weight
-    print "-   DW:\t\t volume to 20 [ul]"
-    print
-    print "Procedure"
-    print "================================="
-    print "1.  Set PCR temperature as %f [celcius] to warm up." \
-        % enzyme.temperature
-    print "2.  Mix materials in PCR Tube."
-    print "3.  Incubate reaction mixture at %f [celcius] at least 1 hour" \
-        % enzyme.temperature
-    print "4.  Heat other PCR at %f [celcius] for heat inactivate duaring incubate." \
-        % enzyme.heat_inactivate.temperature
-    print "5.  After incubate, move PCR tube to the PCR heated and incubate %f [min] for heat inactivate." \
-        % enzyme.heat_inactivate.time
-    print
+from collections import OrderedDict
+from calculator import calculate_unit_required, REQUIRED_UNIT_EXCESS
+from enzyme import double_digestion
+from registry import REGISTRY, get_enzyme, has_unit_data, \
+        UNIT_DATA_FIELDS
+from lambdabio.DNA.sheet import open_sheet, iter_sheet, run_sheet
+from lambdabio.DNA.instrument import stage, add_profile_options, profiling
+from lambdabio.DNA.cache import add_cache_options, caching
+from lambdabio.DNA.render import write_rst, write_json, write_csv, \
+        render_to_string
 
-def _generate_double_digestion_protocol_rst(sites, size, weight, enzyme,
-        enzyme2, required_unit, required_unit2, buffer):
-    # Chose more restrict condition
-    temperature = max(enzyme.temperature, enzyme2.temperature)
-    heat_inactivate_temperature = max((enzyme.heat_inactivate.temperature,
-        enzyme2.heat_inactivate.temperature))
-    heat_inactivate_time = max((enzyme.heat_inactivate.time,
-        enzyme2.heat_inactivate.time))
-
-    print "**************************************"
-    print " Double Restriction Digest Protocol"
-    print "**************************************"
-    print
-    print "Information"
-    print "================================"
-    print "Unit required: %f [units]" % required_unit
-    print "Unit required2: %f [units]" % required_unit2
-    print "Recommend buffer: %s" % buffer
-    print
-    print "DNA"
-    print "--------------------------------"
-    print "Size: %d [bp]" % size
-    print "Weight: %f [ng]" % weight
-    print "Sites: %d [sites]" % sites
-    print
-    print "Enzyme"
-    print "--------------------------------"
-    print "Name: %s" % enzyme
-    print "Site: %s" % enzyme.site
-    print "Substrate name: %s" % enzyme.substrate.name
-    print "Substrate size: %d [bp]" % enzyme.substrate.size
-    print "Substrate sites: %d [sites]" % enzyme.substrate.sites
-    print "Temperature: %f" % enzyme.temperature
-    print "Heat inactivate: %(temperature)f [celcius], %(time)f [min]" \
-        % enzyme.heat_inactivate
-    print "Concentration: %f [U/ul]" % enzyme.concentration
-    print "Buffer: %s" % enzyme.buffer
-    print
-    print "Enzyme2"
-    print "--------------------------------"
-    print "Name: %s" % enzyme2
-    print "Site: %s" % enzyme2.site
-    print "Substrate name: %s" % enzyme2.substrate.name
-    print "Substrate size: %d [bp]" % enzyme2.substrate.size
-    print "Substrate sites: %d [sites]" % enzyme2.substrate.sites
-    print "Temperature: %f" % enzyme2.temperature
-    print "Heat inactivate: %(temperature)f [celcius], %(time)f [min]" \
-        % enzyme2.heat_inactivate
-    print "Concentration: %f [U/ul]" % enzyme2.concentration
-    print "Buffer: %s" % enzyme2.buffer
-    print
-    print "Material"
-    print "================================="
-    print "-   10x %s:\t2 [ul]" % buffer
-    print "-   TAKARA %s:\t\t %f [ul]" % (enzyme, required_unit / float(enzyme.concentration))
-    print "-   TAKARA %s:\t\t %f [ul]" % (enzyme2, required_unit2 / float(enzyme2.concentration))
-    print "-   DNA:\t volume to %f [ng]" % weight
-    print "-   DW:\t\t volume to 20 [ul]"
-    print
-    print "Procedure"
-    print "================================="
-    print "1.  Set PCR temperature as %f [celcius] to warm up." \
-        % temperature
-    print "2.  Mix materials in PCR Tube."
-    print "3.  Incubate reaction mixture at %f [celcius] at least 1 hour" \
-        % temperature
-    print "4.  Heat other PCR at %f [celcius] for heat inactivate duaring incubate." \
-        % heat_inactivate_temperature
-    print "5.  After incubate, move PCR tube to the PCR heated and incubate %f [min] for heat inactivate." \
-        % heat_inactivate_time
-    print
+ENZYME_RST_TEMPLATE = """\
+%(title)s
+--------------------------------
+Name: %(name)s
+Site: %(site)s
+Substrate name: %(substrate_name)s
+Substrate size: %(substrate_size)d [bp]
+Substrate sites: %(substrate_sites)d [sites]
+Temperature: %(temperature)f
+Heat inactivate: %(heat_inactivate_temperature)f [celcius], %(heat_inactivate_time)f [min]
+Concentration: %(concentration)f [U/ul]
+Buffer: %(buffer)s
 
-def _generate_single_digestion_protocol(sites, size, weight, enzyme, format='rst'):
-    FORMAT_TABLE = {
-        'rst': _generate_single_digestion_protocol_rst,
-    }
-    # Convert weight [ng] -> [ug]
-    weight = weight / 1000.0
+"""
+
+SINGLE_DIGESTION_RST_TEMPLATE = """\
+**************************************
+ Single Restriction Digest Protocol
+**************************************
+
+Information
+================================
+Unit required: %(required_unit)f [units]
+
+DNA
+--------------------------------
+Size: %(size)d [bp]
+Weight: %(weight)f [ng]
+Sites: %(sites)d [sites]
+
+%(enzyme_section)s\
+Material
+=================================
+-   10x %(buffer)s:\t2 [ul]
+-   TAKARA %(enzyme)s:\t\t %(volume)f [ul]
+-   DNA:\t volume to %(weight)f [ng]
+-   DW:\t\t volume to 20 [ul]
+
+Procedure
+=================================
+1.  Set PCR temperature as %(temperature)f [celcius] to warm up.
+2.  Mix materials in PCR Tube.
+3.  Incubate reaction mixture at %(temperature)f [celcius] at least 1 hour
+4.  Heat other PCR at %(heat_inactivate_temperature)f [celcius] for heat inactivate duaring incubate.
+5.  After incubate, move PCR tube to the PCR heated and incubate %(heat_inactivate_time)f [min] for heat inactivate.
+
+"""
+
+DOUBLE_DIGESTION_RST_TEMPLATE = """\
+%(warning_section)s\
+**************************************
+ Double Restriction Digest Protocol
+**************************************
+
+Information
+================================
+Unit required: %(required_unit)f [units]
+Unit required2: %(required_unit2)f [units]
+Recommend buffer: %(buffer)s
+
+DNA
+--------------------------------
+Size: %(size)d [bp]
+Weight: %(weight)f [ng]
+Sites: %(sites)d [sites]
+%(sites2_line)s
+%(enzyme_section)s\
+%(enzyme2_section)s\
+Material
+=================================
+-   10x %(buffer)s:\t2 [ul]
+-   TAKARA %(enzyme)s:\t\t %(volume)f [ul]
+-   TAKARA %(enzyme2)s:\t\t %(volume2)f [ul]
+-   DNA:\t volume to %(weight)f [ng]
+-   DW:\t\t volume to 20 [ul]
+
+Procedure
+=================================
+1.  Set PCR temperature as %(temperature)f [celcius] to warm up.
+2.  Mix materials in PCR Tube.
+3.  Incubate reaction mixture at %(temperature)f [celcius] at least 1 hour
+4.  Heat other PCR at %(heat_inactivate_temperature)f [celcius] for heat inactivate duaring incubate.
+5.  After incubate, move PCR tube to the PCR heated and incubate %(heat_inactivate_time)f [min] for heat inactivate.
+
+"""
+
+WARNING_RST_TEMPLATE = """
+.. WARNING::
+    %s
+
+"""
 
-    # Calculate required units for enzyme
-    required_unit = calculate_unit_required(sites, size, weight, enzyme)
-    # assume 3-fold excess is required
-    required_unit = required_unit * 3
+# rendered enzyme sections which key is tuple(enzyme, title)
+_enzyme_sections = {}
+def _render_enzyme_rst(enzyme, title):
+    section = _enzyme_sections.get((enzyme, title))
+    if section is None:
+        section = ENZYME_RST_TEMPLATE % dict(
+            title=title,
+            name=enzyme,
+            site=enzyme.site,
+            substrate_name=enzyme.substrate.name,
+            substrate_size=enzyme.substrate.size,
+            substrate_sites=enzyme.substrate.sites,
+            temperature=enzyme.temperature,
+            heat_inactivate_temperature=enzyme.heat_inactivate.temperature,
+            heat_inactivate_time=enzyme.heat_inactivate.time,
+            concentration=enzyme.concentration,
+            buffer=enzyme.buffer,
+        )
+        _enzyme_sections[enzyme, title] = section
+    return section
 
-    return FORMAT_TABLE[format](sites, size, weight, enzyme, required_unit)
-def _generate_double_digestion_protocol(sites, size, weight, enzyme, enzyme2, format='rst'):
-    FORMAT_TABLE = {
-        'rst': _generate_double_digestion_protocol_rst,
-    }
+def _generate_protocol_rst(stream, record, header, enzymes):
+    context = dict(record)
+    context['enzyme_section'] = _render_enzyme_rst(enzymes[0], 'Enzyme')
+    if len(enzymes) == 1:
+        template = SINGLE_DIGESTION_RST_TEMPLATE
+    else:
+        template = DOUBLE_DIGESTION_RST_TEMPLATE
+        context['enzyme2_section'] = _render_enzyme_rst(enzymes[1], 'Enzyme2')
+        context['sites2_line'] = '' if record.get('sites2') is None else \
+            'Sites2: %d [sites]\n' % record['sites2']
+        context['warning_section'] = '' if record['recommend'] else \
+            WARNING_RST_TEMPLATE % record['warning']
+    write_rst(stream, template, context)
+
+def _generate_protocol_json(stream, record, header, enzymes):
+    write_json(stream, record)
+
+def _generate_protocol_csv(stream, record, header, enzymes):
+    write_csv(stream, record, header)
+
+FORMAT_TABLE = {
+    'rst': _generate_protocol_rst,
+    'json': _generate_protocol_json,
+    'csv': _generate_protocol_csv,
+}
+"""Protocol writers of each format"""
+
+def _create_record(sites, size, weight, enzymes, sites2=None):
+    # sites2 is the number of sites of the second enzyme when it differs
+    # from sites (e.g. counted in sequence)
+    for enzyme in enzymes:
+        if not has_unit_data(enzyme):
+            raise ValueError("%s has no %s in the catalogue, thus units "
+                             "could not be calculated." % (enzyme,
+                ', '.join(field for field in UNIT_DATA_FIELDS
+                          if getattr(enzyme, field, None) is None)))
     # Convert weight [ng] -> [ug]
     weight = weight / 1000.0
+    record = OrderedDict((
+        ('protocol', 'single' if len(enzymes) == 1 else 'double'),
+        ('size', size),
+        ('sites', sites),
+    ))
+    if sites2 is not None:
+        record['sites2'] = sites2
+    record.update((
+        ('weight', weight),
+        ('enzyme', str(enzymes[0])),
+        ('enzyme2', None),
+        ('buffer', enzymes[0].buffer),
+        ('recommend', None),
+        ('warning', None),
+    ))
+    for i, enzyme in enumerate(enzymes):
+        suffix = str(i + 1) if i else ''
+        # Calculate required units for enzyme with its own sites
+        required_unit = calculate_unit_required(
+            sites2 if i and sites2 is not None else sites, size, weight,
+            enzyme)
+        # assume REQUIRED_UNIT_EXCESS-fold excess is required
+        required_unit = required_unit * REQUIRED_UNIT_EXCESS
+        record['required_unit' + suffix] = required_unit
+        record['volume' + suffix] = required_unit / float(enzyme.concentration)
+    if len(enzymes) == 1:
+        record['required_unit2'] = record['volume2'] = None
+    else:
+        record['enzyme2'] = str(enzymes[1])
+        # Find the best buffer
+        record['buffer'], record['recommend'], record['warning'] = \
+            double_digestion(*enzymes)
+    # Chose more restrict condition
+    record['temperature'] = max(e.temperature for e in enzymes)
+    record['heat_inactivate_temperature'] = max(
+        e.heat_inactivate.temperature for e in enzymes)
+    record['heat_inactivate_time'] = max(
+        e.heat_inactivate.time for e in enzymes)
+    return record
 
-    # Calculate required units for enzyme
-    required_unit = calculate_unit_required(sites, size, weight, enzyme)
-    # assume 3-fold excess is required
-    required_unit = required_unit * 3
-    
-    # Calculate required units for enzyme2
-    required_unit2 = calculate_unit_required(sites, size, weight, enzyme2)
-    # assume 3-fold excess is required
-    required_unit2 = required_unit2 * 3
-
-    # Find the best buffer
-    buffer, recommend, warning = double_digestion(enzyme, enzyme2)
-    if not recommend:
-        print
-        print ".. WARNING::"
-        print "    %s" % warning
-        print
-    return FORMAT_TABLE[format](sites, size, weight, enzyme, enzyme2,
-            required_unit, required_unit2, buffer)
+def _generate_single_digestion_protocol(sites, size, weight, enzyme,
+        format='rst', stream=None, header=True):
+    record = _create_record(sites, size, weight, (enzyme,))
+    with stage('render'):
+        FORMAT_TABLE[format](stream or sys.stdout, record, header, (enzyme,))
+def _generate_double_digestion_protocol(sites, size, weight, enzyme, enzyme2,
+        format='rst', stream=None, header=True, sites2=None):
+    record = _create_record(sites, size, weight, (enzyme, enzyme2), sites2)
+    with stage('render'):
+        FORMAT_TABLE[format](stream or sys.stdout, record, header,
+                             (enzyme, enzyme2))
+
+def render_protocol(sites, size, weight, enzyme, enzyme2=None, format='rst'):
+    """Render restriction digest protocol as a string
+
+    Args:
+        sites - the number of sites in DNA
+        size - the size of DNA in [bp]
+        weight - the weight of DNA in [ng]
+        enzyme - the instance of enzyme
+        enzyme2 - the instance of enzyme for double digestion
+        format - the format of protocol ('rst', 'json' or 'csv')
+
+    Return:
+        the protocol (string)
+    """
+    if enzyme2 is None:
+        return render_to_string(_generate_single_digestion_protocol,
+                                sites, size, weight, enzyme, format)
+    return render_to_string(_generate_double_digestion_protocol,
+                            sites, size, weight, enzyme, enzyme2, format)
 
 def _to_num(x):
     try:
         return float(x)
     except ValueError:
         return None
+def _get_enzyme_list():
+    # enzymes without unit data could not be used for protocols
+    return [(name, instance) for name, instance in REGISTRY.items()
+            if has_unit_data(instance)]
 def _to_enzyme(x):
     try:
-        return AVARIABLE_ENZYME_LIST[int(x)-1][1]()
-    except KeyError:
+        index = int(x) - 1
+        if index < 0:
+            return None
+        return _get_enzyme_list()[index][1]
+    except IndexError:
         return None
     except ValueError:
         return None
 
 def _print_enzyme_list():
-    for i, (name, instance) in enumerate(AVARIABLE_ENZYME_LIST):
+    for i, (name, instance) in enumerate(_get_enzyme_list()):
         sys.stdout.write("%02d. %s\t" % (i+1, name))
         if (i+1) % 5 == 0:
             print
@@ -230,7 +307,7 @@ def generate_single_digestion_protocol(opts):
         _print_enzyme_list()
         opts.enzyme = _to_enzyme(raw_input("> "))
     _generate_single_digestion_protocol(
-        opts.sites, opts.size, opts.weight, opts.enzyme,
+        opts.sites, opts.size, opts.weight, opts.enzyme, opts.format,
     )
 
 def generate_double_digestion_protocol(opts):
@@ -251,11 +328,97 @@ def generate_double_digestion_protocol(opts):
         opts.enzyme2 = _to_enzyme(raw_input("> "))
     _generate_double_digestion_protocol(
         opts.sites, opts.size, opts.weight, opts.enzyme, opts.enzyme2,
+        opts.format,
     )
 
-if __name__ == '__main__':
+def generate_protocols_from_sheet(fi, format='rst', stream=None,
+        errors=sys.stderr):
+    """Generate protocols for each row of sample sheet
+
+    The sample sheet is a CSV/TSV file which has 'size', 'sites',
+    'weight', 'enzyme' and optional 'enzyme2' columns. Enzymes are
+    specified by name (e.g. EcoRI) and a double digestion protocol is
+    generated when 'enzyme2' is specified. Rows are processed one by one
+    and errors of a row are written to the errors stream without
+    aborting.
+
+    Args:
+        fi - the file like object of sample sheet
+        format - the format of protocol
+        stream - the file like object where protocols are written.
+            sys.stdout is used when None is specified.
+        errors - the stream where errors are written
+
+    Return:
+        a tuple of the number of succeeded and failed rows (tuple(int, int))
+    """
+    state = dict(header=True)
+    def _generate(row):
+        sites = int(row['sites'])
+        size = int(row['size'])
+        weight = float(row['weight'])
+        enzyme = get_enzyme(row['enzyme'])
+        if row.get('enzyme2'):
+            _generate_double_digestion_protocol(sites, size, weight,
+                    enzyme, get_enzyme(row['enzyme2']), format, stream,
+                    state['header'])
+        else:
+            _generate_single_digestion_protocol(sites, size, weight, enzyme,
+                    format, stream, state['header'])
+        state['header'] = False
+    return run_sheet(iter_sheet(fi), _generate, errors)
+
+def generate_protocols_from_fasta(filename, weight, enzyme, enzyme2=None,
+        regions=None, format='rst', stream=None):
+    """Generate protocols for each record or region of FASTA file
+
+    The sites and the size of DNA are counted with digest_fasta, thus
+    gzip/BGZF compressed files and regions like 'chr3:10,000-12,000' are
+    supported. The units of each enzyme are calculated from its own sites
+    in double digestion.
+    All records are scanned (measured as 'site_scanning' stage) before
+    any protocol is written, thus an invalid region or a missing FASTA
+    index does not leave partial output.
+
+    Args:
+        filename - the path of FASTA file
+        weight - the weight of DNA in [ng]
+        enzyme - the instance of enzyme
+        enzyme2 - the instance of enzyme for double digestion
+        regions - a list of region strings. all records are used when
+            None is specified.
+        format - the format of protocol
+        stream - the file like object where protocols are written.
+            sys.stdout is used when None is specified.
+
+    Return:
+        the number of generated protocols (int)
+
+    Raise:
+        ValueError - the region is invalid or the FASTA index is missing
+        IOError - the FASTA file could not be read
+    """
+    from genome import digest_fasta
+    enzymes = [enzyme] if enzyme2 is None else [enzyme, enzyme2]
+    with stage('site_scanning'):
+        records = [([record.counts[str(e)] for e in enzymes], record.size)
+                   for record in digest_fasta(filename,
+                       [(str(e), e) for e in enzymes], locate=False,
+                       regions=regions)]
+    n = 0
+    for sites, size in records:
+        if enzyme2 is None:
+            _generate_single_digestion_protocol(sites[0], size, weight,
+                    enzyme, format, stream, n == 0)
+        else:
+            _generate_double_digestion_protocol(sites[0], size, weight,
+                    enzyme, enzyme2, format, stream, n == 0, sites[1])
+        n += 1
+    return n
+
+def main():
     from optparse import OptionParser
-    usage = """%prog [options] [enzymes|single|double]
+    usage = """%prog [options] [enzymes|single|double|batch SHEET]
     
     - enzymes:
         print list of enzymes avariable
@@ -265,6 +428,15 @@ if __name__ == '__main__':
 
     - double:
         run as double digestion mode
+
+    - batch:
+        generate protocols of all rows in CSV/TSV sample sheet which
+        has size, sites, weight, enzyme and enzyme2 (optional) columns
+        ('-' for stdin)
+
+    - fasta FASTA [REGION ...]:
+        generate protocols of each record or region (e.g.
+        chr3:10,000,000-12,000,000) of FASTA file (plain, gzip or BGZF)
     """
     parser = OptionParser(usage=usage)
     parser.add_option('-l', '--size', dest='size', type="int",
@@ -277,21 +449,51 @@ if __name__ == '__main__':
             help="the index of enzyme")
     parser.add_option('-f', '--enzyme2', dest='enzyme2', type="int",
             help="the index of enzyme2")
+    parser.add_option('--format', dest='format', default='rst',
+            help="the format of protocol. 'rst', 'json' or 'csv'.")
+    add_profile_options(parser)
+    add_cache_options(parser)
     opts, args = parser.parse_args()
 
+    if opts.format not in FORMAT_TABLE:
+        parser.error("Unknown format '%s'" % opts.format)
+
     if opts.enzyme:
         opts.enzyme = _to_enzyme(opts.enzyme)
+        if opts.enzyme is None:
+            parser.error("Unknown enzyme index (see 'enzymes' mode)")
     if opts.enzyme2:
         opts.enzyme2 = _to_enzyme(opts.enzyme2)
+        if opts.enzyme2 is None:
+            parser.error("Unknown enzyme2 index (see 'enzymes' mode)")
 
     if len(args) == 0:
         parser.print_help()
-    else:
+        return
+    with profiling(opts), caching(opts):
         if args[0] == 'enzymes':
             _print_enzyme_list()
         elif args[0] == 'single':
             generate_single_digestion_protocol(opts)
         elif args[0] == 'double':
             generate_double_digestion_protocol(opts)
+        elif args[0] == 'batch' and len(args) == 2:
+            succeeded, failed = generate_protocols_from_sheet(
+                open_sheet(args[1]), opts.format)
+            sys.stderr.write("%d protocols are generated, %d rows are "
+                             "failed.\n" % (succeeded, failed))
+            sys.exit(1 if failed else 0)
+        elif args[0] == 'fasta' and len(args) >= 2:
+            if opts.weight is None or opts.enzyme is None:
+                parser.error("weight and enzyme are required in fasta mode")
+            try:
+                generate_protocols_from_fasta(args[1], opts.weight,
+                    opts.enzyme, opts.enzyme2, args[2:] or None,
+                    opts.format)
+            except (ValueError, IOError), e:
+                parser.error(str(e))
         else:
             raise Exception("Invalid mode flag is selected")
+
+if __name__ == '__main__':
+    main()
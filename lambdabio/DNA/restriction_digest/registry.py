@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Restriction enzyme registry module
+
+Load restriction enzymes from a catalogue file written in REBASE like
+tagged format (see enzymes.dat) on first access. Enzymes which have a
+hand written class in enzyme module (e.g. EcoRI) are resolved to the
+singleton instance of the class so that the existing API keeps working,
+the others are stored as compact records with __slots__.
+
+The parsed catalogue is stored as a versioned precompiled cache (pickle)
+and loaded in one read on the next invocation. The cache is rebuilt
+when the catalogue or CACHE_VERSION is changed.
+
+Methods:
+    parse_catalogue - Parse REBASE like tagged catalogue file
+    get_enzyme - Get enzyme from the default registry by name
+    has_unit_data - Return True when enzyme has the data to calculate units
+
+Classes:
+    Substrate - Unit definition substrate of enzyme
+    HeatInactivate - Heat inactivation condition of enzyme
+    EnzymeRecord - Restriction enzyme loaded from catalogue
+    EnzymeRegistry - Restriction enzyme registry
+
+Data:
+    DEFAULT_CATALOGUE - the path of default catalogue file
+    DEFAULT_CACHE_DIRECTORY - the directory of precompiled caches
+        (LAMBDABIO_CACHE_DIRECTORY environment variable or
+        ~/.lambdabio/cache)
+    REGISTRY - the default registry
+    UNIT_DATA_FIELDS - the fields required to calculate units
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import os
+import re
+import cPickle as pickle
+from collections import OrderedDict
+from enzyme import AVARIABLE_ENZYME_LIST
+
+DEFAULT_CATALOGUE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'enzymes.dat')
+
+# The version of precompiled cache layout (increment it when the records
+# are changed)
+CACHE_VERSION = 1
+
+# The default directory where precompiled caches are stored. it could be
+# changed with LAMBDABIO_CACHE_DIRECTORY environment variable
+DEFAULT_CACHE_DIRECTORY = os.environ.get('LAMBDABIO_CACHE_DIRECTORY') or \
+    os.path.join(os.path.expanduser('~'), '.lambdabio', 'cache')
+
+FIELD_PATTERN = re.compile(r'^<(\d+)>(.*)$')
+
+UNIT_DATA_FIELDS = ('substrate', 'temperature', 'heat_inactivate',
+                    'concentration', 'buffer')
+"""The fields required to calculate units and generate protocols"""
+
+# The cut mark and the outside cuts like (1/5) in site
+CUT_NOTATION_PATTERN = re.compile(r"'|\(-?\d+/-?\d+\)")
+
+class _Record(object):
+    """Compact record accessible as attribute and mapping"""
+    __slots__ = ()
+    def __init__(self, *args):
+        for key, value in zip(self.__slots__, args):
+            setattr(self, key, value)
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+    def __getstate__(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+    def __setstate__(self, state):
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (key, getattr(self, key)) for key in self.__slots__))
+
+class Substrate(_Record):
+    """Unit definition substrate of enzyme"""
+    __slots__ = ('name', 'size', 'sites')
+
+class HeatInactivate(_Record):
+    """Heat inactivation condition of enzyme"""
+    __slots__ = ('temperature', 'time')
+
+class EnzymeRecord(_Record):
+    """Restriction enzyme loaded from catalogue"""
+    __slots__ = ('name', '_name', 'site', 'substrate', 'temperature',
+                 'heat_inactivate', 'concentration', 'buffer')
+    def __str__(self):
+        return self._name
+
+def parse_catalogue(fi):
+    """Parse REBASE like tagged catalogue file
+
+    Args:
+        fi - the file like object of catalogue
+
+    Yield:
+        a dictionary which key is the field number and value is the
+        field value (dict)
+    """
+    fields = {}
+    for lineno, line in enumerate(fi, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line == '//':
+            if fields:
+                yield fields
+            fields = {}
+            continue
+        m = FIELD_PATTERN.match(line)
+        if m is None:
+            raise ValueError("Invalid line %d in catalogue: %s" %
+                             (lineno, line))
+        fields[int(m.group(1))] = m.group(2).strip()
+    if fields:
+        yield fields
+
+def _normalize(name):
+    return name.replace(' ', '')
+
+def _to_number(x):
+    return float(x) if '.' in x else int(x)
+
+def _create_record(fields):
+    def _split(n, types):
+        if not fields.get(n):
+            return None
+        values = fields[n].split(',')
+        return [t(v.strip()) for t, v in zip(types, values)]
+    substrate = _split(4, (str, int, int))
+    heat_inactivate = _split(6, (_to_number, _to_number))
+    return EnzymeRecord(
+        fields[1],
+        fields.get(2, fields[1]),
+        fields[3].replace('^', "'"),
+        substrate and Substrate(*substrate),
+        _to_number(fields[5]) if fields.get(5) else None,
+        heat_inactivate and HeatInactivate(*heat_inactivate),
+        _to_number(fields[7]) if fields.get(7) else None,
+        fields.get(8),
+    )
+
+class EnzymeRegistry(object):
+    """Restriction enzyme registry
+
+    The catalogue is loaded on first access.
+
+    Usage:
+        >>> registry = EnzymeRegistry()
+        >>> str(registry['EcoRI'])
+        'EcoR I'
+        >>> registry['EcoR I'] is registry['EcoRI']
+        True
+        >>> [str(e) for e in registry.find_by_recognition('GAATTC')]
+        ['EcoR I']
+    """
+    def __init__(self, filename=DEFAULT_CATALOGUE,
+            cache_directory=DEFAULT_CACHE_DIRECTORY):
+        """Construct registry
+
+        Args:
+            filename - the path of catalogue file
+            cache_directory - the directory where the precompiled cache
+                is stored. no cache is used when None is specified.
+        """
+        self.filename = filename
+        self.cache_directory = cache_directory
+        self._enzymes = None
+        self._recognitions = None
+
+    @property
+    def cache_filename(self):
+        """The path of precompiled cache or None"""
+        if not self.cache_directory:
+            return None
+        import hashlib
+        key = hashlib.sha1(os.path.abspath(self.filename)).hexdigest()
+        return os.path.join(self.cache_directory,
+                            'registry-%s.pickle' % key[:16])
+
+    def _load_cache(self, stamp):
+        # return records in the precompiled cache or None when the cache
+        # is not found or outdated
+        filename = self.cache_filename
+        if filename is None or not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, 'rb') as fi:
+                cached_stamp, records = pickle.loads(fi.read())
+        except Exception:
+            # broken cache is rebuilt
+            return None
+        if cached_stamp != stamp:
+            return None
+        return records
+
+    def _save_cache(self, stamp, records):
+        filename = self.cache_filename
+        if filename is None:
+            return
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            # write to a temporary file and rename it to avoid broken cache
+            with open(filename + '.tmp', 'wb') as fo:
+                fo.write(pickle.dumps((stamp, records), 2))
+            os.rename(filename + '.tmp', filename)
+        except EnvironmentError:
+            # the cache is optional (e.g. read only home directory)
+            pass
+
+    def _load(self):
+        stat = os.stat(self.filename)
+        stamp = (CACHE_VERSION, stat.st_mtime, stat.st_size)
+        records = self._load_cache(stamp)
+        if records is None:
+            with open(self.filename) as fi:
+                records = [_create_record(fields)
+                           for fields in parse_catalogue(fi)]
+            self._save_cache(stamp, records)
+        builtins = dict(AVARIABLE_ENZYME_LIST)
+        enzymes = OrderedDict()
+        recognitions = {}
+        for record in records:
+            name = _normalize(record.name)
+            if name in builtins:
+                enzyme = builtins[name]()
+            else:
+                enzyme = record
+            enzymes[name] = enzyme
+            recognition = CUT_NOTATION_PATTERN.sub('', enzyme.site).upper()
+            recognitions.setdefault(recognition, []).append(enzyme)
+        self._recognitions = recognitions
+        self._enzymes = enzymes
+
+    @property
+    def enzymes(self):
+        """An ordered dictionary of enzymes which key is the name"""
+        if self._enzymes is None:
+            self._load()
+        return self._enzymes
+
+    def get(self, name, default=None):
+        """Get enzyme by name (spaces in name are ignored)"""
+        return self.enzymes.get(_normalize(name), default)
+
+    def __getitem__(self, name):
+        try:
+            return self.enzymes[_normalize(name)]
+        except KeyError:
+            raise KeyError("No enzyme named '%s' is found." % name)
+
+    def __contains__(self, name):
+        return _normalize(name) in self.enzymes
+
+    def __iter__(self):
+        return iter(self.enzymes)
+
+    def __len__(self):
+        return len(self.enzymes)
+
+    def items(self):
+        """Return a list of tuple(name, enzyme) like AVARIABLE_ENZYME_LIST"""
+        return self.enzymes.items()
+
+    def find_by_recognition(self, recognition):
+        """Find enzymes which recognize the sequence (isoschizomers)
+
+        Args:
+            recognition - the recognition sequence without cut mark
+
+        Return:
+            a list of enzymes (list)
+        """
+        if self._recognitions is None:
+            self._load()
+        return list(self._recognitions.get(recognition.upper(), ()))
+
+REGISTRY = EnzymeRegistry()
+"""The default registry"""
+
+def get_enzyme(name):
+    """Get enzyme from the default registry by name"""
+    return REGISTRY[name]
+
+def has_unit_data(enzyme):
+    """Return True when enzyme has the data to calculate units
+
+    Records of the catalogue might omit the unit definition substrate,
+    the concentration or the buffer (e.g. BglI). Such enzymes could be
+    used for site scanning but not for protocols.
+    """
+    return all(getattr(enzyme, field, None) is not None
+               for field in UNIT_DATA_FIELDS)
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    # do not write the precompiled cache of the default registry in the
+    # home directory while testing
+    REGISTRY.cache_directory = None
+    class TestCase(unittest.TestCase):
+        CATALOGUE = """
+# comment
+<1>EcoRI
+<3>G^AATTC
+//
+<1>MunI
+<2>Mun I
+<3>C^AATTG
+<4>pBR322,4361,1
+<5>37
+<6>65,20
+<7>10
+<8>Buffer M
+//
+<1>MfeI
+<3>C^AATTG
+"""
+        def setUp(self):
+            import tempfile
+            fd, self.filename = tempfile.mkstemp(suffix='.dat')
+            with os.fdopen(fd, 'w') as fo:
+                fo.write(self.CATALOGUE)
+            self.directory = tempfile.mkdtemp()
+        def tearDown(self):
+            import shutil
+            os.remove(self.filename)
+            shutil.rmtree(self.directory)
+        def test_default_registry(self):
+            import enzyme
+            for name, cls in AVARIABLE_ENZYME_LIST:
+                self.assertTrue(REGISTRY[name] is cls())
+                self.assertTrue(get_enzyme(str(cls())) is cls())
+            self.assertEquals(REGISTRY.items()[:len(AVARIABLE_ENZYME_LIST)],
+                [(name, cls()) for name, cls in AVARIABLE_ENZYME_LIST])
+            self.assertEquals(get_enzyme('Sfi I').site, "GGCCNNNN'NGGCC")
+            self.assertEquals(get_enzyme('BsaI').site, "GGTCTC(1/5)")
+            self.assertEquals(REGISTRY.find_by_recognition('ggtctc'),
+                              [get_enzyme('BsaI')])
+            self.assertRaises(KeyError, get_enzyme, 'Unknown')
+        def test_lazy_loading(self):
+            registry = EnzymeRegistry(self.filename, None)
+            self.assertEquals(registry._enzymes, None)
+            self.assertTrue('MunI' in registry)
+            self.assertNotEquals(registry._enzymes, None)
+        def test_record(self):
+            import enzyme
+            registry = EnzymeRegistry(self.filename, None)
+            self.assertTrue(registry['EcoRI'] is enzyme.EcoRI())
+            e = registry['Mun I']
+            self.assertEquals(str(e), 'Mun I')
+            self.assertEquals(e.site, "C'AATTG")
+            self.assertEquals(e.substrate.size, 4361)
+            self.assertEquals(e.substrate.sites, 1)
+            self.assertEquals(e.temperature, 37)
+            self.assertEquals('%(temperature)d,%(time)d' % e.heat_inactivate,
+                              '65,20')
+            self.assertEquals(e.concentration, 10)
+            self.assertEquals(e.buffer, 'Buffer M')
+            self.assertFalse(hasattr(e, '__dict__'))
+            e = registry['MfeI']
+            self.assertEquals(str(e), 'MfeI')
+            self.assertEquals(e.substrate, None)
+        def test_has_unit_data(self):
+            registry = EnzymeRegistry(self.filename, None)
+            self.assertTrue(has_unit_data(registry['EcoRI']))
+            self.assertTrue(has_unit_data(registry['MunI']))
+            self.assertFalse(has_unit_data(registry['MfeI']))
+            for name in ('BglI', 'SfiI', 'BsaI', 'BsmBI', 'BbsI'):
+                self.assertFalse(has_unit_data(REGISTRY[name]))
+        def test_precompiled_cache(self):
+            registry = EnzymeRegistry(self.filename, self.directory)
+            self.assertFalse(os.path.exists(registry.cache_filename))
+            self.assertEquals(len(registry), 3)
+            self.assertTrue(os.path.exists(registry.cache_filename))
+            # the cache is used instead of the catalogue
+            registry = EnzymeRegistry(self.filename, self.directory)
+            stat = os.stat(self.filename)
+            self.assertNotEquals(registry._load_cache(
+                (CACHE_VERSION, stat.st_mtime, stat.st_size)), None)
+            self.assertEquals(registry['MunI'].substrate.size, 4361)
+            self.assertEquals(registry['MunI'].heat_inactivate.time, 20)
+            self.assertTrue(registry['EcoRI'] is REGISTRY['EcoRI'])
+            # the cache is rebuilt when the catalogue is changed
+            with open(self.filename, 'a') as fo:
+                fo.write("//\n<1>BglII\n<3>A^GATCT\n")
+            registry = EnzymeRegistry(self.filename, self.directory)
+            self.assertTrue('BglII' in registry)
+            self.assertEquals(self.directory, registry.cache_directory)
+            self.assertEquals(len(os.listdir(self.directory)), 1)
+        def test_startup_imports(self):
+            # listing enzymes should not import heavy modules (e.g. numpy).
+            # the startup time is measured in benchmarks/bench.py
+            import sys
+            import subprocess
+            code = (
+                "import sys\n"
+                "sys.argv = ['protocol', 'enzymes']\n"
+                "from lambdabio.DNA.restriction_digest import protocol\n"
+                "protocol.main()\n"
+                "sys.stderr.write('%d %d' % ('numpy' in sys.modules,\n"
+                "    'unittest' in sys.modules))\n"
+            )
+            env = dict(os.environ)
+            root = os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__)))))
+            env['PYTHONPATH'] = os.pathsep.join(filter(None,
+                (root, env.get('PYTHONPATH'))))
+            # the precompiled cache is written in the temporary directory
+            env['LAMBDABIO_CACHE_DIRECTORY'] = self.directory
+            process = subprocess.Popen([sys.executable, '-c', code],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+            stdout, stderr = process.communicate()
+            self.assertEquals(process.returncode, 0, stderr)
+            self.assertEquals(stderr.split(), ['0', '0'])
+            self.assertTrue('EcoRI' in stdout)
+            self.assertEquals(len(os.listdir(self.directory)), 1)
+        def test_find_by_recognition(self):
+            registry = EnzymeRegistry(self.filename, None)
+            found = registry.find_by_recognition('caattg')
+            self.assertEquals([e.name for e in found], ['MunI', 'MfeI'])
+            self.assertEquals(registry.find_by_recognition('AAAAAA'), [])
+        def test_parse_catalogue(self):
+            from StringIO import StringIO
+            self.assertRaises(ValueError, list, parse_catalogue(StringIO('EcoRI')))
+        def test_scanner(self):
+            from scanner import scan_sites
+            registry = EnzymeRegistry(self.filename, None)
+            sites = scan_sites('GAATTCAATTG', registry.items())
+            self.assertEquals(sites['MunI'], [6])
+            self.assertEquals(sites['EcoRI'], [1])
+            # degenerate sites of the default catalogue
+            sites = scan_sites('AAGCCTAGCAGGCAA', REGISTRY.items())
+            self.assertEquals(sites['BglI'], [9])
+            self.assertEquals(sites['SfiI'], [])
+
+    unittest.main()
@@ -0,0 +1,629 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Restriction site scanner module
+
+Scan a DNA sequence for the restriction sites of enzymes. A few exact
+recognition sequences (and reverse complements of non palindromic ones)
+are located one by one with str.find, which runs in C and is faster
+than any loop over the characters in Python. When there are more than
+MAX_FIND_PATTERNS exact sequences (e.g. a large catalogue), they are
+compiled into a single Aho-Corasick automaton so that the sequence is
+read only once no matter how many enzymes are scanned.
+
+Type IIS enzymes which cut outside of the recognition sequence are
+written in REBASE notation, the cut positions on the top and the bottom
+strand counted from the end of the recognition sequence (e.g. BsaI
+GGTCTC(1/5)).
+
+Recognition sequences may contain IUPAC degenerate codes (e.g. BglI
+GCCNNNN'NGGC). A degenerate sequence is expanded into the exact
+sequences and compiled into the automaton as well when the expansion is
+small (see MAX_EXPANSION), otherwise it is compiled into a regular
+expression which is cached per recognition sequence.
+
+Methods:
+    parse_site - Parse a site string into recognition sequence and cut position
+    parse_cuts - Parse a site string into recognition sequence and cut positions
+    reverse_complement - Return reverse complement of DNA sequence
+    expand_recognition - Expand degenerate recognition sequence
+    compile_recognition - Compile recognition sequence into regular expression
+    scan_sites - Locate restriction sites of enzymes in DNA sequence
+    count_sites - Count restriction sites of enzymes in DNA sequence
+
+Classes:
+    SiteScanner - Multi pattern restriction site scanner
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import re
+from string import maketrans
+from itertools import product
+from enzyme import AVARIABLE_ENZYME_LIST
+from calculator import IUPAC_CODES, IUPAC_COMPLEMENTS
+
+# The character used for cut position in site string
+CUT_MARK = "'"
+
+# The cut positions outside of recognition sequence like GGTCTC(1/5)
+OUTSIDE_CUTS_PATTERN = re.compile(r'^([A-Za-z]+)\((-?\d+)/(-?\d+)\)$')
+
+# The maximum number of exact sequences a degenerate recognition
+# sequence is expanded into. larger ones are matched with regex
+MAX_EXPANSION = 256
+
+# The maximum number of exact sequences located with str.find one by one.
+# a pass of str.find costs about 1/40 of a pass of the automaton in
+# Python, thus more sequences are compiled into the automaton
+MAX_FIND_PATTERNS = 32
+
+COMPLEMENT_TABLE = maketrans(
+    ''.join(IUPAC_COMPLEMENTS.keys()) +
+    ''.join(IUPAC_COMPLEMENTS.keys()).lower(),
+    ''.join(IUPAC_COMPLEMENTS.values()) +
+    ''.join(IUPAC_COMPLEMENTS.values()).lower())
+
+def parse_cuts(site):
+    """Parse site string into recognition sequence and cut positions
+
+    The bottom strand of a site with a cut mark is cut at the mirrored
+    position of the mark.
+
+    Usage:
+        >>> parse_cuts("G'AATTC")
+        ('GAATTC', 1, 5)
+        >>> parse_cuts('GGTCTC(1/5)')
+        ('GGTCTC', 7, 11)
+
+    Args:
+        site - the site string of enzyme like "G'AATTC", "GCCNNNN'NGGC"
+            or "GGTCTC(1/5)"
+
+    Return:
+        a tuple of recognition sequence and cut positions on the top and
+        the bottom strand from the beginning of the recognition sequence
+        (tuple(string, int, int))
+    """
+    m = OUTSIDE_CUTS_PATTERN.match(site)
+    if m is not None:
+        recognition = m.group(1).upper()
+        top = len(recognition) + int(m.group(2))
+        bottom = len(recognition) + int(m.group(3))
+    else:
+        top = site.find(CUT_MARK)
+        if top < 0:
+            raise ValueError("No cut mark is found in site '%s'" % site)
+        recognition = site.replace(CUT_MARK, '').upper()
+        bottom = len(recognition) - top
+    for code in recognition:
+        if code not in IUPAC_CODES:
+            raise ValueError("Invalid nucleotide code '%s' in site '%s'" %
+                             (code, site))
+    return recognition, top, bottom
+
+def parse_site(site):
+    """Parse site string into recognition sequence and cut position
+
+    Args:
+        site - the site string of enzyme like "G'AATTC", "GCCNNNN'NGGC"
+            or "GGTCTC(1/5)"
+
+    Return:
+        a tuple of recognition sequence and cut position on the top
+        strand (tuple(string, int))
+    """
+    recognition, top, bottom = parse_cuts(site)
+    return recognition, top
+
+def reverse_complement(sequence):
+    """Return reverse complement of DNA sequence (IUPAC codes allowed)"""
+    return sequence.translate(COMPLEMENT_TABLE)[::-1]
+
+def _count_expansion(recognition):
+    count = 1
+    for code in recognition:
+        count *= len(IUPAC_CODES[code])
+    return count
+
+def expand_recognition(recognition):
+    """Expand degenerate recognition sequence into exact sequences
+
+    Usage:
+        >>> expand_recognition('GRCGYC')
+        ['GACGCC', 'GACGTC', 'GGCGCC', 'GGCGTC']
+
+    Args:
+        recognition - the recognition sequence with IUPAC codes
+
+    Return:
+        a list of exact recognition sequences (list)
+    """
+    return [''.join(bases) for bases in
+            product(*[IUPAC_CODES[code] for code in recognition])]
+
+_compiled_recognitions = {}
+def compile_recognition(recognition):
+    """Compile recognition sequence into regular expression (cached)
+
+    The regular expression is a lookahead assertion so that overlapped
+    sites are found with finditer. Bases other than ACGT (e.g. N in the
+    sequence) do not match any code.
+
+    Args:
+        recognition - the recognition sequence with IUPAC codes
+
+    Return:
+        a compiled regular expression (re.RegexObject)
+    """
+    regex = _compiled_recognitions.get(recognition)
+    if regex is None:
+        classes = []
+        for code in recognition:
+            bases = IUPAC_CODES[code]
+            classes.append(bases if len(bases) == 1 else '[%s]' % bases)
+        regex = re.compile('(?=%s)' % ''.join(classes), re.IGNORECASE)
+        _compiled_recognitions[recognition] = regex
+    return regex
+
+class SiteScanner(object):
+    """Multi pattern restriction site scanner
+
+    Locate the exact recognition sequences of enzymes with str.find, or
+    compile them into an Aho-Corasick automaton and scan DNA sequences
+    in a single linear pass when there are more than MAX_FIND_PATTERNS
+    of them. Degenerate recognition sequences which expand into more
+    than MAX_EXPANSION exact sequences are matched with cached regular
+    expressions instead.
+
+    Usage:
+        >>> scanner = SiteScanner()
+        >>> scanner.count('AAGAATTCAACTGCAGAA')['EcoRI']
+        1
+        >>> scanner.scan('AAGAATTCAACTGCAGAA')['PstI']
+        [15]
+    """
+    def __init__(self, enzymes=None):
+        """Construct scanner
+
+        Args:
+            enzymes - a list of tuple(name, enzyme) like
+                AVARIABLE_ENZYME_LIST. AVARIABLE_ENZYME_LIST is used
+                when None is specified.
+        """
+        if enzymes is None:
+            enzymes = AVARIABLE_ENZYME_LIST
+        self.names = []
+        self.lengths = []
+        # a list of tuple(enzyme index, exact recognition sequence, top
+        # and bottom strand cut positions) compiled into the automaton
+        self.patterns = []
+        # a list of tuple(enzyme index, regex, length, top and bottom
+        # strand cut positions, regex of the top strand site or None)
+        # matched with regex
+        self.degenerates = []
+        for i, (name, enzyme) in enumerate(enzymes):
+            recognition, top, bottom = parse_cuts(enzyme.site)
+            length = len(recognition)
+            self.names.append(name)
+            self.lengths.append(length)
+            complement = reverse_complement(recognition)
+            palindromic = complement == recognition
+            # non palindromic site: the cuts of the site found on the
+            # bottom strand are reversed. the cut mark is mirrored as it
+            # is while the outside cuts (Type IIS) are swapped as well
+            if CUT_MARK in enzyme.site:
+                cuts = (top, bottom), (length - top, length - bottom)
+            else:
+                cuts = (top, bottom), (length - bottom, length - top)
+            if _count_expansion(recognition) <= MAX_EXPANSION:
+                exacts = expand_recognition(recognition)
+                self.patterns.extend((i, exact) + cuts[0]
+                                     for exact in exacts)
+                if not palindromic:
+                    # an exact sequence might be palindromic even if the
+                    # degenerate one is not and it is a single site
+                    exacts = set(exacts)
+                    self.patterns.extend((i, exact) + cuts[1]
+                        for exact in expand_recognition(complement)
+                        if exact not in exacts)
+            else:
+                regex = compile_recognition(recognition)
+                self.degenerates.append((i, regex, length) + cuts[0] +
+                                        (None,))
+                if not palindromic:
+                    self.degenerates.append((i,
+                        compile_recognition(complement), length) +
+                        cuts[1] + (regex,))
+        self.max_length = max(self.lengths or [0])
+        self._build()
+
+    def _build(self):
+        # a list of tuple(exact recognition sequence, outputs) where
+        # outputs is a tuple of (enzyme index, length, top and bottom
+        # strand cut positions) of the sequence
+        finds = {}
+        for i, recognition, top, bottom in self.patterns:
+            finds.setdefault(recognition, []).append(
+                (i, len(recognition), top, bottom))
+        self._finds = [(recognition, tuple(outputs))
+                       for recognition, outputs in sorted(finds.items())]
+        self._delta = None
+        if len(self._finds) > MAX_FIND_PATTERNS:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        # goto function as a list of dict, output as a list of pattern
+        # indexes found at the state
+        goto = [{}]
+        output = [[]]
+        for p, (i, recognition, top, bottom) in enumerate(self.patterns):
+            state = 0
+            for ch in recognition:
+                if ch not in goto[state]:
+                    goto.append({})
+                    output.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            output[state].append(p)
+        # failure function via breadth first search
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, child in goto[state].iteritems():
+                queue.append(child)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                output[child] = output[child] + output[fail[child]]
+        # compile goto and failure into a deterministic transition table
+        # which accept both upper and lower case. unknown characters
+        # (e.g. N) reset the automaton
+        delta = [None] * len(goto)
+        for state in [0] + queue:
+            transition = {}
+            for ch in 'ACGT':
+                if ch in goto[state]:
+                    child = goto[state][ch]
+                elif state:
+                    child = delta[fail[state]][ch]
+                else:
+                    child = 0
+                transition[ch] = transition[ch.lower()] = child
+            delta[state] = transition
+        self._delta = delta
+        # output as a tuple of (enzyme index, length, top and bottom
+        # strand cut positions)
+        patterns = [(i, len(recognition), top, bottom)
+                    for i, recognition, top, bottom in self.patterns]
+        self._output = [tuple(patterns[p] for p in out) for out in output]
+
+    def iter_cuts(self, sequence, start=0):
+        """Iterate matches found in sequence with the cuts of both strands
+
+        Args:
+            sequence - the DNA sequence (string)
+            start - the offset added to the reported positions
+
+        Yield:
+            a tuple of enzyme index, the start position of the site and
+            the top and the bottom strand cut positions (tuple(int, int,
+            int, int)). the matches are not ordered by position and the
+            cuts of Type IIS enzymes might be out of the sequence.
+        """
+        if self._delta is None:
+            for match in self._iter_finds(sequence, start):
+                yield match
+        else:
+            for match in self._iter_automaton(sequence, start):
+                yield match
+        for i, regex, length, top, bottom, site in self.degenerates:
+            for m in regex.finditer(sequence):
+                begin = m.start()
+                if site is not None and site.match(sequence, begin):
+                    # already found as the top strand site
+                    continue
+                begin += start
+                yield i, begin, begin + top, begin + bottom
+
+    def _iter_finds(self, sequence, start):
+        # the exact sequences are upper case, thus the sequence is
+        # converted once (N and the other characters never match)
+        find = sequence.upper().find
+        for recognition, outputs in self._finds:
+            end = find(recognition)
+            while end >= 0:
+                for i, length, top, bottom in outputs:
+                    begin = start + end
+                    yield i, begin, begin + top, begin + bottom
+                end = find(recognition, end + 1)
+
+    def _iter_automaton(self, sequence, start):
+        delta = self._delta
+        output = self._output
+        state = 0
+        for end, ch in enumerate(sequence):
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                for i, length, top, bottom in output[state]:
+                    begin = start + end - length + 1
+                    yield i, begin, begin + top, begin + bottom
+
+    def iter_matches(self, sequence, start=0):
+        """Iterate matches found in sequence
+
+        Args:
+            sequence - the DNA sequence (string)
+            start - the offset added to the reported positions
+
+        Yield:
+            a tuple of enzyme index, the start position of the site and
+            the top strand cut position (tuple(int, int, int)). the
+            matches are not ordered by position.
+        """
+        for i, begin, top, bottom in self.iter_cuts(sequence, start):
+            yield i, begin, top
+
+    def scan(self, sequence):
+        """Locate restriction sites in sequence
+
+        Args:
+            sequence - the DNA sequence (string)
+
+        Return:
+            a dictionary which key is the name of enzyme and value is a
+            sorted list of top strand cut positions (dict)
+        """
+        found = [[] for name in self.names]
+        for i, begin, cut in self.iter_matches(sequence):
+            found[i].append(cut)
+        return dict((name, sorted(positions))
+                    for name, positions in zip(self.names, found))
+
+    def count(self, sequence):
+        """Count restriction sites in sequence
+
+        Args:
+            sequence - the DNA sequence (string)
+
+        Return:
+            a dictionary which key is the name of enzyme and value is the
+            number of sites (dict)
+        """
+        found = [0] * len(self.names)
+        for i, begin, cut in self.iter_matches(sequence):
+            found[i] += 1
+        return dict(zip(self.names, found))
+
+_scanners = {}
+def _get_scanner(enzymes=None):
+    # scanners are cached by the names and sites of enzymes thus the
+    # automaton of a set of enzymes is compiled once
+    if enzymes is None:
+        key = None
+    else:
+        enzymes = list(enzymes)
+        key = tuple((name, enzyme.site) for name, enzyme in enzymes)
+    scanner = _scanners.get(key)
+    if scanner is None:
+        scanner = _scanners[key] = SiteScanner(enzymes)
+    return scanner
+
+def scan_sites(sequence, enzymes=None):
+    """Locate restriction sites of enzymes in DNA sequence
+
+    Args:
+        sequence - the DNA sequence (string)
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        a dictionary which key is the name of enzyme and value is a
+        sorted list of top strand cut positions (dict)
+    """
+    return _get_scanner(enzymes).scan(sequence)
+
+def count_sites(sequence, enzymes=None):
+    """Count restriction sites of enzymes in DNA sequence
+
+    The counts can be passed to calculate_unit_required as is.
+
+    Args:
+        sequence - the DNA sequence (string)
+        enzymes - a list of tuple(name, enzyme). AVARIABLE_ENZYME_LIST is
+            used when None is specified.
+
+    Return:
+        a dictionary which key is the name of enzyme and value is the
+        number of sites (dict)
+    """
+    return _get_scanner(enzymes).count(sequence)
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def _find_all(self, sequence, recognition):
+            positions = []
+            i = sequence.find(recognition)
+            while i >= 0:
+                positions.append(i)
+                i = sequence.find(recognition, i + 1)
+            return positions
+        def test_parse_site(self):
+            self.assertEquals(parse_site(r"G'AATTC"), ('GAATTC', 1))
+            self.assertEquals(parse_site(r"CTGCA'G"), ('CTGCAG', 5))
+            self.assertRaises(ValueError, parse_site, 'GAATTC')
+        def test_parse_site_degenerate(self):
+            self.assertEquals(parse_site(r"gccnnnn'nggc"), ('GCCNNNNNGGC', 7))
+            self.assertRaises(ValueError, parse_site, r"G'AAXTC")
+        def test_parse_cuts(self):
+            self.assertEquals(parse_cuts(r"CTGCA'G"), ('CTGCAG', 5, 1))
+            self.assertEquals(parse_cuts('gaagac(2/6)'), ('GAAGAC', 8, 12))
+            self.assertEquals(parse_cuts('GGTCTC(-7/-3)'), ('GGTCTC', -1, 3))
+            self.assertEquals(parse_site('GGTCTC(1/5)'), ('GGTCTC', 7))
+            self.assertRaises(ValueError, parse_cuts, 'GGTCTC(1)')
+        def test_scan_type_iis(self):
+            class BsaILike(object):
+                site = 'GGTCTC(1/5)'
+            scanner = SiteScanner((('BsaILike', BsaILike),))
+            # a part flanked with BsaI sites facing inward
+            sequence = 'GGTCTCA' 'AATG' + 'C' * 20 + 'GCTT' 'AGAGACC'
+            cuts = sorted(scanner.iter_cuts(sequence))
+            self.assertEquals(cuts, [(0, 0, 7, 11), (0, 36, 31, 35)])
+            self.assertEquals(sequence[7:11], 'AATG')
+            self.assertEquals(sequence[31:35], 'GCTT')
+            self.assertEquals(scanner.scan(sequence)['BsaILike'], [7, 31])
+        def test_reverse_complement(self):
+            self.assertEquals(reverse_complement('GGATCCA'), 'TGGATCC')
+            self.assertEquals(reverse_complement('GRCGYCN'), 'NGRCGYC')
+            self.assertEquals(reverse_complement('ACCTGCNNNN'), 'NNNNGCAGGT')
+        def test_expand_recognition(self):
+            self.assertEquals(expand_recognition('GAATTC'), ['GAATTC'])
+            self.assertEquals(len(expand_recognition('GCCNNNNNGGC')), 1024)
+            regex = compile_recognition('GCCNNNNNGGC')
+            self.assertTrue(regex is compile_recognition('GCCNNNNNGGC'))
+            self.assertEquals([m.start() for m in
+                               regex.finditer('GCCAAAAAGGCCNNNNNGGC')], [0])
+        def _scan_degenerate(self, sequence, recognition, cut):
+            # brute force scan of both strands
+            length = len(recognition)
+            top = re.compile(''.join('[%s]' % IUPAC_CODES[c]
+                                     for c in recognition), re.I)
+            bottom = re.compile(''.join('[%s]' % IUPAC_CODES[c]
+                for c in reverse_complement(recognition)), re.I)
+            positions = []
+            for begin in xrange(len(sequence) - length + 1):
+                if top.match(sequence, begin):
+                    positions.append(begin + cut)
+                elif bottom.match(sequence, begin):
+                    positions.append(begin + length - cut)
+            return sorted(positions)
+        def test_scan_sites_degenerate(self):
+            import random
+            random.seed(1)
+            sequence = ''.join(random.choice('ACGTacgt')
+                               for i in xrange(50000))
+            class BglILike(object):
+                site = r"GCCNNNN'NGGC"
+            class HaeIILike(object):
+                site = r"RGCGC'Y"
+            class BsrILike(object):
+                # non palindromic and expanded into the automaton
+                site = r"ACTGG'N"
+            class BsaXILike(object):
+                # non palindromic and matched with regex
+                site = r"ACNNNN'NCTCC"
+            enzymes = (('BglILike', BglILike), ('HaeIILike', HaeIILike),
+                       ('BsrILike', BsrILike), ('BsaXILike', BsaXILike))
+            scanner = SiteScanner(enzymes)
+            self.assertEquals(len(scanner.degenerates), 3)
+            sites = scanner.scan(sequence)
+            for name, enzyme in enzymes:
+                recognition, cut = parse_site(enzyme.site)
+                expected = self._scan_degenerate(sequence, recognition, cut)
+                self.assertTrue(expected)
+                self.assertEquals(sites[name], expected)
+            # N in sequence does not match any code
+            self.assertEquals(scanner.count('GCCNNNNNGGC')['BglILike'], 0)
+        def test_scan_sites_degenerate_palindromic_instance(self):
+            # GGATCC is an instance of both GRATCC and the reverse
+            # complement GGATYC but it is a single site
+            class Enzyme(object):
+                site = r"GR'ATCC"
+            expansion = MAX_EXPANSION
+            try:
+                for limit in (expansion, 1):
+                    globals()['MAX_EXPANSION'] = limit
+                    sites = scan_sites('AGGATCCAGAATCCA',
+                                       (('Enzyme', Enzyme),))
+                    self.assertEquals(sites['Enzyme'], [3, 10])
+            finally:
+                globals()['MAX_EXPANSION'] = expansion
+        def test_scan_sites(self):
+            sequence = 'GAATTCNNCTGCAGACTAGTTCTAGAgaattc'
+            sites = scan_sites(sequence)
+            self.assertEquals(sites['EcoRI'], [1, 27])
+            self.assertEquals(sites['PstI'], [13])
+            self.assertEquals(sites['SpeI'], [15])
+            self.assertEquals(sites['XbaI'], [21])
+        def test_scan_sites_overlapped(self):
+            # SpeI and XbaI sites share CTAG
+            sequence = 'ACTAGTCTAGA'
+            sites = scan_sites(sequence)
+            self.assertEquals(sites['SpeI'], [1])
+            self.assertEquals(sites['XbaI'], [6])
+        def test_scan_sites_non_palindromic(self):
+            class FokILike(object):
+                site = r"GGA'TG"
+            sequence = 'GGATGAACATCC'
+            sites = scan_sites(sequence, (('FokILike', FokILike),))
+            self.assertEquals(sites['FokILike'], [3, 9])
+        def test_get_scanner(self):
+            class FokILike(object):
+                site = r"GGA'TG"
+            self.assertTrue(_get_scanner() is _get_scanner())
+            enzymes = (('FokILike', FokILike),)
+            scanner = _get_scanner(enzymes)
+            self.assertTrue(_get_scanner(iter(enzymes)) is scanner)
+            self.assertEquals(scanner.names, ['FokILike'])
+            FokILike.site = r"GGA'TC"
+            self.assertFalse(_get_scanner(enzymes) is scanner)
+        def test_count_sites(self):
+            import random
+            random.seed(0)
+            sequence = ''.join(random.choice('ACGT') for i in xrange(20000))
+            counts = count_sites(sequence)
+            for name, enzyme in AVARIABLE_ENZYME_LIST:
+                recognition, cut = parse_site(enzyme.site)
+                expected = len(self._find_all(sequence, recognition))
+                self.assertEquals(counts[name], expected)
+        def test_scan_automaton(self):
+            # the automaton finds the same sites as str.find
+            global MAX_FIND_PATTERNS
+            import random
+            from registry import REGISTRY
+            random.seed(2)
+            sequence = ''.join(random.choice('ACGTacgtN')
+                               for i in xrange(20000))
+            enzymes = list(REGISTRY.items())
+            expected = SiteScanner(enzymes)
+            self.assertEquals(expected._delta, None)
+            limit, MAX_FIND_PATTERNS = MAX_FIND_PATTERNS, 0
+            try:
+                scanner = SiteScanner(enzymes)
+            finally:
+                MAX_FIND_PATTERNS = limit
+            self.assertNotEquals(scanner._delta, None)
+            self.assertEquals(sorted(scanner.iter_cuts(sequence, 10)),
+                              sorted(expected.iter_cuts(sequence, 10)))
+            self.assertEquals(scanner.scan(sequence), expected.scan(sequence))
+        def test_count_sites_unit_required(self):
+            from calculator import calculate_unit_required
+            import enzyme
+            sequence = 'GAATTC' + 'A' * 94
+            counts = count_sites(sequence)
+            unit_required = calculate_unit_required(counts['EcoRI'],
+                    len(sequence), 1, enzyme.EcoRI())
+            self.assertEquals(unit_required,
+                    calculate_unit_required(1, 100, 1, enzyme.EcoRI()))
+
+    unittest.main()
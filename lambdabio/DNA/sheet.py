@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf8 :
+"""Sample sheet module
+
+Read CSV/TSV sample sheets row by row for the batch mode of protocol
+command line interfaces. The delimiter is detected from the header line
+and the column names are normalized to lower case.
+
+Methods:
+    open_sheet - Open sample sheet ('-' for stdin)
+    iter_sheet - Iterate rows of sample sheet
+    run_sheet - Call function for each row and report errors per row
+
+
+Copyright:
+    Copyright 2011 Alisue allright reserved.
+
+License:
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unliss required by applicable law or agreed to in writing, software
+    distributed under the License is distrubuted on an "AS IS" BASICS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+__author__  = 'Alisue <lambdalisue@hashnote.net>'
+__version__ = '1.0.0'
+__date__    = '2011-05-16'
+
+import sys
+import csv
+from instrument import stage, count
+
+def open_sheet(filename):
+    """Open sample sheet ('-' for stdin)"""
+    if filename == '-':
+        return sys.stdin
+    return open(filename, 'rb')
+
+def iter_sheet(fi):
+    """Iterate rows of sample sheet
+
+    The rows are read one by one thus the sheet never sits in memory.
+    Empty cells are converted to None.
+
+    Args:
+        fi - the file like object of sample sheet
+
+    Yield:
+        a tuple of line number and row (tuple(int, dict))
+    """
+    header = fi.readline()
+    if not header:
+        return
+    dialect = csv.excel_tab if '\t' in header else csv.excel
+    columns = [c.strip().lower() for c in csv.reader([header], dialect).next()]
+    for lineno, values in enumerate(csv.reader(fi, dialect), 2):
+        with stage('input_parsing'):
+            if not values or not any(v.strip() for v in values):
+                continue
+            row = dict((column, value.strip() or None)
+                       for column, value in zip(columns, values))
+        yield lineno, row
+
+def run_sheet(rows, func, stream=sys.stderr):
+    """Call function for each row and report errors per row
+
+    An error raised in a row is written to the stream and the rest of
+    rows are processed. I/O errors (e.g. broken output pipe) abort.
+
+    Args:
+        rows - an iterable of tuple(line number, row) (see iter_sheet)
+        func - the function called with a row
+        stream - the stream where errors are written
+
+    Return:
+        a tuple of the number of succeeded and failed rows (tuple(int, int))
+    """
+    succeeded = failed = 0
+    for lineno, row in rows:
+        try:
+            func(row)
+        except EnvironmentError:
+            raise
+        except Exception, e:
+            stream.write("line %d: %s: %s\n" %
+                         (lineno, e.__class__.__name__, e))
+            failed += 1
+        else:
+            succeeded += 1
+    count('rows_succeeded', succeeded)
+    count('rows_failed', failed)
+    return succeeded, failed
+
+# --- unittest
+if __name__ == '__main__':
+    import unittest
+    class TestCase(unittest.TestCase):
+        def test_iter_sheet(self):
+            from StringIO import StringIO
+            fi = StringIO("Size, Sites\n100,1\n\n200,\n")
+            self.assertEquals(list(iter_sheet(fi)), [
+                (2, {'size': '100', 'sites': '1'}),
+                (4, {'size': '200', 'sites': None}),
+            ])
+            fi = StringIO("size\tenzyme\n100\tEcoRI\n")
+            self.assertEquals(list(iter_sheet(fi)), [
+                (2, {'size': '100', 'enzyme': 'EcoRI'}),
+            ])
+            self.assertEquals(list(iter_sheet(StringIO(""))), [])
+        def test_run_sheet(self):
+            from StringIO import StringIO
+            rows = [(2, {'size': '100'}), (3, {'size': 'x'}), (4, {})]
+            processed = []
+            def func(row):
+                processed.append(int(row['size']))
+            stream = StringIO()
+            self.assertEquals(run_sheet(rows, func, stream), (1, 2))
+            self.assertEquals(processed, [100])
+            errors = stream.getvalue().splitlines()
+            self.assertTrue(errors[0].startswith('line 3: ValueError: '))
+            self.assertEquals(errors[1], "line 4: KeyError: 'size'")
+
+    unittest.main()